@@ -0,0 +1,51 @@
+"""Time how long mask_strings and unmask_strings take on lines with
+many string literals
+
+Run from the top of the repository::
+
+    python benchmarks/mask_strings.py [--passes N]
+
+The time per line should grow in proportion to the number of strings
+in it.
+
+"""
+
+import argparse
+import time
+
+from ford.sourceform import mask_strings, unmask_strings
+
+STRING_COUNTS = [10, 100, 1000, 5000]
+
+
+def make_line(count):
+    return ", ".join(f"'string {i}'" for i in range(count))
+
+
+def mask_and_unmask(line):
+    unmask_strings(*mask_strings(line))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--passes", type=int, default=20)
+    args = parser.parse_args()
+
+    for count in STRING_COUNTS:
+        line = make_line(count)
+        # Warm up compiled regexes
+        mask_and_unmask(line)
+
+        start = time.perf_counter()
+        for _ in range(args.passes):
+            mask_and_unmask(line)
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"{count} strings {args.passes} times: {elapsed * 1000:.1f} ms "
+            f"({elapsed * 1e6 / args.passes / count:.2f} us per string)"
+        )
+
+
+if __name__ == "__main__":
+    main()
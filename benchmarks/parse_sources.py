@@ -0,0 +1,53 @@
+"""Time how long FortranSourceFile takes to parse the example project,
+the test data and the test projects
+
+Run from the top of the repository::
+
+    python benchmarks/parse_sources.py [--passes N] [FILE ...]
+
+Other files to parse instead can be given on the command line. Files
+are not preprocessed, so that only reading and parsing are timed.
+
+"""
+
+import argparse
+from copy import deepcopy
+import pathlib
+import time
+
+from ford import DEFAULT_SETTINGS
+from ford.sourceform import FortranSourceFile
+
+from read_sources import source_files
+
+
+def parse_all(files, settings):
+    for path in files:
+        fixed = path.suffix in {".f", ".F"}
+        FortranSourceFile(str(path), settings, fixed=fixed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--passes", type=int, default=20)
+    parser.add_argument("files", nargs="*", type=pathlib.Path)
+    args = parser.parse_args()
+
+    settings = deepcopy(DEFAULT_SETTINGS)
+    files = args.files or list(source_files())
+    # Warm up file system caches and compiled regexes
+    parse_all(files, settings)
+
+    start = time.perf_counter()
+    for _ in range(args.passes):
+        parse_all(files, settings)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Parsed {len(files)} files {args.passes} times: {elapsed * 1000:.0f} ms "
+        f"({elapsed * 1000 / args.passes:.1f} ms per pass)"
+    )
+
+
+if __name__ == "__main__":
+    main()
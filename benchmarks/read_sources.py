@@ -0,0 +1,64 @@
+"""Time how long FortranReader takes to read the example project, the
+test data and the test projects
+
+Run from the top of the repository::
+
+    python benchmarks/read_sources.py [--passes N]
+
+"""
+
+import argparse
+import pathlib
+import time
+
+from ford.reader import FortranReader
+
+ROOT = pathlib.Path(__file__).parent.parent
+SOURCE_DIRS = ["example", "test_data", "test/test_projects"]
+EXTENSIONS = {".f90", ".F90", ".f", ".F", ".f95", ".fpp"}
+# Deliberately invalid, so the reader rejects it
+SKIP = {"ford_issues_bad.f90"}
+DOCMARKS = [
+    dict(docmark="!", predocmark=">", docmark_alt="", predocmark_alt=""),
+    dict(docmark="!", predocmark="", docmark_alt="", predocmark_alt="|"),
+    dict(docmark="<", predocmark="", docmark_alt="", predocmark_alt=""),
+]
+
+
+def source_files():
+    for directory in SOURCE_DIRS:
+        for path in sorted((ROOT / directory).rglob("*")):
+            if path.suffix in EXTENSIONS and path.name not in SKIP:
+                yield path
+
+
+def read_all(files):
+    for path in files:
+        fixed = path.suffix in {".f", ".F"}
+        for docmarks in DOCMARKS:
+            for _ in FortranReader(str(path), fixed=fixed, **docmarks):
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--passes", type=int, default=20)
+    args = parser.parse_args()
+
+    files = list(source_files())
+    # Warm up file system caches and compiled regexes
+    read_all(files)
+
+    start = time.perf_counter()
+    for _ in range(args.passes):
+        read_all(files)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Read {len(files)} files {args.passes} times: {elapsed * 1000:.0f} ms "
+        f"({elapsed * 1000 / args.passes:.1f} ms per pass)"
+    )
+
+
+if __name__ == "__main__":
+    main()
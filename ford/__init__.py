@@ -37,10 +37,12 @@ from typing import Union
 from textwrap import dedent
 
 import ford.fortran_project
+import ford.md_convert
 import ford.sourceform
 import ford.output
 import ford.utils
 import ford.pagetree
+import ford.watch
 from ford.md_environ import EnvironExtension
 
 from importlib.metadata import version, PackageNotFoundError
@@ -126,6 +128,7 @@ DEFAULT_SETTINGS = {
     "author_description": None,
     "author_pic": None,
     "bitbucket": None,
+    "cache_dir": None,
     "coloured_edges": False,
     "copy_subdir": [],
     "creation_date": "%Y-%m-%dT%H:%M:%S.%f%z",
@@ -156,11 +159,13 @@ DEFAULT_SETTINGS = {
     "gitter_sidecar": None,
     "google_plus": None,
     "graph": False,
+    "graph_cache_size": "64",
     "graph_dir": None,
     "graph_maxdepth": "10000",
     "graph_maxnodes": "1000000000",
     "hide_undoc": False,
     "incl_src": True,
+    "incremental": False,
     "include": [],
     "license": "",
     "linkedin": None,
@@ -199,6 +204,8 @@ DEFAULT_SETTINGS = {
     "twitter": None,
     "version": None,
     "warn": False,
+    "watch": False,
+    "watch_port": 8000,
     "website": None,
     "year": date.today().year,
 }
@@ -232,7 +239,9 @@ def initialize():
     proj_docs = args.project_file.read()
     directory = os.path.dirname(args.project_file.name)
 
-    return parse_arguments(vars(args), proj_docs, directory)
+    proj_data, proj_docs, md = parse_arguments(vars(args), proj_docs, directory)
+    proj_data["project_file"] = pathlib.Path(args.project_file.name).absolute()
+    return proj_data, proj_docs, md
 
 
 def get_command_line_arguments() -> argparse.Namespace:
@@ -264,6 +273,10 @@ def get_command_line_arguments() -> argparse.Namespace:
         "--output_dir",
         help="directory in which to place output files (default: ``./doc``)",
     )
+    parser.add_argument(
+        "--cache_dir",
+        help="directory in which to cache intermediate build results between runs (default: None)",
+    )
     parser.add_argument("-s", "--css", help="custom style-sheet for the output")
     parser.add_argument(
         "-r",
@@ -317,6 +330,13 @@ def get_command_line_arguments() -> argparse.Namespace:
         default=None,
         help="generate graphs for documentation output",
     )
+    parser.add_argument(
+        "--incremental",
+        dest="incremental",
+        action="store_true",
+        default=None,
+        help="only rewrite the pages whose inputs have changed since the last run",
+    )
     parser.add_argument(
         "--no-search",
         dest="search",
@@ -332,6 +352,19 @@ def get_command_line_arguments() -> argparse.Namespace:
         default=None,
         help="suppress normal output",
     )
+    parser.add_argument(
+        "--watch",
+        dest="watch",
+        action="store_true",
+        default=None,
+        help="after building the documentation, serve it locally and rebuild it "
+        "whenever the source files, pages or project file change",
+    )
+    parser.add_argument(
+        "--watch_port",
+        type=int,
+        help="port for the local server started by ``--watch`` (default: 8000)",
+    )
     parser.add_argument(
         "-V",
         "--version",
@@ -414,7 +447,7 @@ def parse_arguments(
     md_ext.append("markdown_include.include")
     if "md_extensions" in md.Meta:
         md_ext.extend(md.Meta["md_extensions"])
-    md = markdown.Markdown(
+    md = ford.md_convert.Markdown(
         extensions=md_ext,
         output_format="html",
         extension_configs={"markdown_include.include": {"base_path": md_base}},
@@ -423,6 +456,8 @@ def parse_arguments(
     # Re-read the project file
     proj_docs = md.reset().convert(proj_docs)
     proj_data = md.Meta
+    # Keep where `{!file!}` includes are read from
+    proj_data["md_base_dir"] = md_base
 
     # Get the default options, and any over-rides, straightened out
     for option, default in DEFAULT_SETTINGS.items():
@@ -449,6 +484,7 @@ def parse_arguments(
     for var in [
         "page_dir",
         "output_dir",
+        "cache_dir",
         "graph_dir",
         "media_dir",
         "css",
@@ -561,14 +597,16 @@ def parse_arguments(
     return (proj_data, proj_docs, md)
 
 
-def main(proj_data, proj_docs, md):
+def main(proj_data, proj_docs, md, source_cache=None):
     """
     Main driver of FORD.
+
+    ``source_cache`` is passed on to `ford.fortran_project.Project`.
     """
     if proj_data["relative"]:
         proj_data["project_url"] = "."
     # Parse the files in your project
-    project = ford.fortran_project.Project(proj_data)
+    project = ford.fortran_project.Project(proj_data, source_cache)
     if len(project.files) < 1:
         print(
             "Error: No source files with appropriate extension found in specified directory."
@@ -592,6 +630,7 @@ def main(proj_data, proj_docs, md):
     # handle LateX and metadata.
     base_url = ".." if proj_data["relative"] else proj_data["project_url"]
     project.markdown(md, base_url)
+    project.highlight_sources()
     project.correlate()
     project.make_links(base_url)
 
@@ -642,6 +681,10 @@ def main(proj_data, proj_docs, md):
 def run():
     proj_data, proj_docs, md = initialize()
 
+    if proj_data["watch"]:
+        ford.watch.watch(proj_data, proj_docs, md)
+        return
+
     f = StringIO() if proj_data["quiet"] else sys.stdout
     with stdout_redirector(f):
         main(proj_data, proj_docs, md)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+#  cache.py
+#  This file is part of FORD.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import hashlib
+import json
+import os
+import pathlib
+from typing import Optional, Union
+
+
+def hash_file(filename: Union[os.PathLike, str]) -> str:
+    """Return the SHA-256 hex digest of the contents of ``filename``"""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_key(*args) -> str:
+    """Return a SHA-256 hex digest identifying ``args``, which must be
+    JSON-serialisable (paths and other objects are converted with
+    `str`)"""
+    data = json.dumps(args, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    A directory of binary blobs keyed by hex digests (see `hash_key`)
+
+    Entries are written atomically, so several processes can share a
+    cache. Failing to read or write an entry is never fatal: it just
+    means the result has to be recomputed.
+
+    Parameters
+    ----------
+    directory
+        Top-level cache directory
+    name
+        Sub-directory for this kind of entry
+    max_size
+        If given, the size in bytes that `prune` shrinks the cache to,
+        evicting the least recently used entries first
+
+    """
+
+    def __init__(
+        self,
+        directory: Union[os.PathLike, str],
+        name: str,
+        max_size: Optional[int] = None,
+    ):
+        self.directory = pathlib.Path(directory) / name
+        self.max_size = max_size
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the entry for ``key``, or None if there isn't one"""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        if self.max_size is not None:
+            # Mark the entry as recently used
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store ``data`` under ``key``"""
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not write cache file '{path}': {e}")
+
+    def prune(self) -> None:
+        """Delete the least recently used entries until the cache is no
+        bigger than ``max_size``"""
+        if self.max_size is None:
+            return
+        entries = []
+        for path in self.directory.glob("*/*"):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
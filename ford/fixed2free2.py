@@ -37,96 +37,73 @@ python fixed2free2.py file.f > file.f90
 import sys
 
 
-class FortranLine:
-    def __init__(self, line, length_limit=True):
-        self.line = line
-        self.line_conv = line
-        self.isComment = False
-        self.isContinuation = False
-        self.length_limit = length_limit
-        self.__analyse()
-
-    def __repr__(self):
-        return self.line_conv
-
-    def continueLine(self):
-        """Insert line continuation symbol at end of line."""
-
-        if not (self.isLong and self.is_regular):
-            self.line_conv = self.line_conv.rstrip() + " &\n"
-        else:
-            temp = self.line_conv[:72].rstrip() + " &"
-            self.line_conv = temp.ljust(72) + self.excess_line
-
-    def __analyse(self):
-        line = self.line
-        firstchar = line[0] if len(line) > 0 else ""
-        self.label = line[0:5].strip().lower() + " " if len(line) > 1 else ""
-        cont_char = line[5] if len(line) >= 6 else ""
-        fivechars = line[1:5] if len(line) > 1 else ""
-        self.isShort = len(line) <= 6
-        self.isLong = len(line) > 73 and self.length_limit
-
-        self.isComment = firstchar in "cC*!"
-        self.isNewComment = "!" in fivechars and not self.isComment
-        self.isOMP = self.isComment and fivechars.lower() == "$omp"
-        if self.isOMP:
-            self.isComment = False
-            self.label = ""
-        self.isCppLine = firstchar == "#"
-        self.is_regular = not (
-            self.isComment or self.isNewComment or self.isCppLine or self.isShort
-        )
-        self.isContinuation = (
-            not (cont_char.isspace() or cont_char == "0") and self.is_regular
-        )
-
-        if self.isLong and self.is_regular:
-            self.excess_line = "!" + line[72:]
-            line = line[:72] + "\n"
-        else:
-            self.excess_line = ""
-
-        self.line = line
-        self.__convert()
-
-    def __convert(self):
-        line = self.line
-        self.code = line[6:] if len(line) > 6 else "\n"
-
-        if self.isComment:
-            self.line_conv = "!" + line[1:]
-        elif self.isNewComment or self.isCppLine:
-            self.line_conv = line
-        elif self.isOMP:
-            self.line_conv = "!" + line[1:5] + " " + self.code
-        elif not self.label.isspace():
-            self.line_conv = self.label + self.code
-        else:
-            self.line_conv = self.code
-
-        if self.isLong and self.is_regular:
-            self.line_conv = self.line_conv.rstrip().ljust(72) + self.excess_line
-
-
 def convertToFree(stream, length_limit=True):
-    """Convert stream from fixed source form to free source form."""
+    """Convert stream from fixed source form to free source form.
+
+    This works on the strings directly, without building an object per
+    line, as it is in the inner loop of reading fixed form files.
+    """
+    # Converted lines since the last regular line (inclusive), which
+    # can't be output until we know whether the next regular line
+    # continues it. Only the first of these is ever continued
     linestack = []
+    # Anything beyond the line length limit on the first line in the
+    # stack, which goes after the continuation symbol
+    excess_line = None
 
     for line in stream:
-        convline = FortranLine(line, length_limit)
-
-        if convline.is_regular:
-            if convline.isContinuation and linestack:
-                linestack[0].continueLine()
-            for line_ in linestack:
-                yield str(line_)
-            linestack = []
-
-        linestack.append(convline)
+        length = len(line)
+        firstchar = line[0] if length > 0 else ""
+        fivechars = line[1:5]
+        is_omp = firstchar in "cC*!" and fivechars.lower() == "$omp"
+        is_comment = firstchar in "cC*!" and not is_omp
+        is_new_comment = not is_comment and "!" in fivechars
+        is_cpp_line = firstchar == "#"
+        is_regular = not (is_comment or is_new_comment or is_cpp_line or length <= 6)
+
+        if is_comment:
+            linestack.append("!" + line[1:])
+            continue
+        if is_new_comment or is_cpp_line:
+            linestack.append(line)
+            continue
+
+        label = "" if is_omp or length <= 1 else line[0:5].strip().lower()
+        if not is_regular:
+            # Too short to contain any code
+            if is_omp:
+                linestack.append("!" + fivechars + " \n")
+            else:
+                linestack.append(label + " \n" if label else "\n")
+            continue
+
+        excess = None
+        if length > 73 and length_limit:
+            excess = "!" + line[72:]
+            line = line[:72] + "\n"
 
-    for line in linestack:
-        yield str(line)
+        if is_omp:
+            line_conv = "!" + fivechars + " " + line[6:]
+        elif label:
+            line_conv = label + " " + line[6:]
+        else:
+            line_conv = line[6:]
+        if excess is not None:
+            line_conv = line_conv.rstrip().ljust(72) + excess
+
+        cont_char = line[5]
+        if linestack and not (cont_char.isspace() or cont_char == "0"):
+            if excess_line is None:
+                linestack[0] = linestack[0].rstrip() + " &\n"
+            else:
+                continued = linestack[0][:72].rstrip() + " &"
+                linestack[0] = continued.ljust(72) + excess_line
+
+        yield from linestack
+        linestack = [line_conv]
+        excess_line = excess
+
+    yield from linestack
 
 
 if __name__ == "__main__":
@@ -22,17 +22,30 @@
 #
 #
 
+import io
+import json
 import os
+import pickle
 import toposort
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from itertools import chain
-from typing import List
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
 
+from tqdm.contrib.concurrent import process_map
+
+import ford.cache
+import ford.highlighting
+import ford.md_convert
+import ford.reader
 import ford.utils
 import ford.sourceform
 from ford.sourceform import (
+    FortranBase,
     FortranCodeUnit,
     FortranModule,
     FortranSubmodule,
+    FortranSourceFile,
     ExternalModule,
 )
 
@@ -50,13 +63,32 @@ INTRINSIC_MODS = {
 }
 
 
+class ParsedSource(NamedTuple):
+    """A pickled `FortranSourceFile` (see `_dump_source_file`), and
+    the other files it included"""
+
+    data: bytes
+    included_files: List[str]
+
+
 class Project(object):
     """
     An object which collects and contains all of the information about the
     project which is to be documented.
+
+    Parameters
+    ----------
+    settings
+        Project settings
+    source_cache
+        Optional store of parsed files, keyed by filename. Files in it
+        aren't parsed again, and newly parsed files are added to it.
+        Entries must be removed once their files change.
     """
 
-    def __init__(self, settings):
+    def __init__(
+        self, settings, source_cache: Optional[Dict[str, ParsedSource]] = None
+    ):
         self.settings = settings
         self.name = settings["project"]
         self.external = settings["external"]
@@ -67,8 +99,6 @@ class Project(object):
         self.display = settings["display"]
         self.encoding = settings["encoding"]
 
-        html_incl_src = settings.get("incl_src", True)
-
         self.files = []
         self.modules = []
         self.programs = []
@@ -85,8 +115,11 @@ class Project(object):
         self.extInterfaces = []
         self.extTypes = []
         self.extVariables = []
+        self._symbol_table = None
+        self.procedure_index = None
 
         # Get all files within topdir, recursively
+        fortran_files = []
         srcdir_list = self.make_srcdir_list(settings["exclude_dir"])
         for curdir in srcdir_list:
             for item in [f for f in curdir.iterdir() if f.is_file()]:
@@ -97,44 +130,14 @@ class Project(object):
                 relative_path = os.path.relpath(filename)
                 extension = str(item.suffix)[1:]  # Don't include the initial '.'
                 if extension in self.extensions or extension in self.fixed_extensions:
-                    # Get contents of the file
-                    print(f"Reading file {relative_path}")
-                    if extension in settings["fpp_extensions"]:
-                        preprocessor = settings["preprocessor"]
-                    else:
-                        preprocessor = None
-                    try:
-                        self.files.append(
-                            ford.sourceform.FortranSourceFile(
-                                str(filename),
-                                settings,
-                                preprocessor,
-                                extension in self.fixed_extensions,
-                                incl_src=html_incl_src,
-                                encoding=self.encoding,
-                            )
+                    fortran_files.append(
+                        (
+                            str(filename),
+                            settings,
+                            extension in settings["fpp_extensions"],
+                            extension in self.fixed_extensions,
                         )
-                    except Exception as e:
-                        if not settings["dbg"]:
-                            raise e
-
-                        print(f"Warning: Error parsing {relative_path}.\n\t{e.args[0]}")
-                        continue
-                    for module in self.files[-1].modules:
-                        self.modules.append(module)
-                    for submod in self.files[-1].submodules:
-                        self.submodules.append(submod)
-                    for function in self.files[-1].functions:
-                        function.visible = True
-                        self.procedures.append(function)
-                    for subroutine in self.files[-1].subroutines:
-                        subroutine.visible = True
-                        self.procedures.append(subroutine)
-                    for program in self.files[-1].programs:
-                        program.visible = True
-                        self.programs.append(program)
-                    for block in self.files[-1].blockdata:
-                        self.blockdata.append(block)
+                    )
                 elif extension in self.extra_filetypes:
                     print(f"Reading file {relative_path}")
                     try:
@@ -148,6 +151,78 @@ class Project(object):
                         print(f"Warning: Error parsing {relative_path}.\n\t{e.args[0]}")
                         continue
 
+        # Include files might have moved since the last project
+        _INCLUDE_CACHE.clear()
+
+        # Run the preprocessor over everything that needs it up front,
+        # rather than one file at a time as each is read
+        preprocessed = _preprocess_files(
+            [
+                args
+                for args in fortran_files
+                if source_cache is None or args[0] not in source_cache
+            ],
+            settings,
+        )
+        fortran_files = [(*args, preprocessed.get(args[0])) for args in fortran_files]
+
+        njobs = int(settings["parallel"])
+        if source_cache is not None:
+            parsed_files = _parse_with_source_cache(
+                fortran_files, settings, source_cache
+            )
+        elif njobs > 1 and len(fortran_files) > 1:
+            # Parse in worker processes. `process_map` returns results
+            # in the same order as `fortran_files`, so the project
+            # doesn't depend on how the work was scheduled
+            parsed_files = [
+                (_load_source_file(data, settings) if data else None, error)
+                for data, error in process_map(
+                    _parse_fortran_file_pickled,
+                    fortran_files,
+                    max_workers=njobs,
+                    chunksize=max(1, len(fortran_files) // (4 * njobs)),
+                    desc="Parsing files",
+                )
+            ]
+        else:
+            parsed_files = map(_parse_fortran_file, fortran_files)
+
+        for (filename, *_), (source_file, error) in zip(fortran_files, parsed_files):
+            relative_path = os.path.relpath(filename)
+            print(f"Reading file {relative_path}")
+            if error is not None:
+                if not settings["dbg"]:
+                    raise error
+
+                print(f"Warning: Error parsing {relative_path}.\n\t{error.args[0]}")
+                continue
+
+            self.files.append(source_file)
+            for module in source_file.modules:
+                self.modules.append(module)
+            for submod in source_file.submodules:
+                self.submodules.append(submod)
+            for function in source_file.functions:
+                function.visible = True
+                self.procedures.append(function)
+            for subroutine in source_file.subroutines:
+                subroutine.visible = True
+                self.procedures.append(subroutine)
+            for program in source_file.programs:
+                program.visible = True
+                self.programs.append(program)
+            for block in source_file.blockdata:
+                self.blockdata.append(block)
+
+    @property
+    def symbol_table(self) -> ford.utils.SymbolTable:
+        """Index of the entities that can be linked to, built the first
+        time it's needed after `correlate`"""
+        if self._symbol_table is None:
+            self._symbol_table = ford.utils.SymbolTable(self)
+        return self._symbol_table
+
     def warn(self, message):
         if self.settings["warn"]:
             print(f"Warning: {message}")
@@ -192,7 +267,14 @@ class Project(object):
         # load external FORD FortranModules
         ford.utils.external(self)
 
-        # Match USE statements up with the module objects or links
+        # Match USE statements up with the module objects or links.
+        # Project modules take precedence over external ones
+        modules = self._name_index(self.modules, "module")
+        submodules = self._name_index(self.submodules, "submodule")
+        used_modules = dict(modules)
+        for module in self.extModules:
+            used_modules.setdefault(module.name.lower(), module)
+
         for entity in chain(
             self.modules,
             self.procedures,
@@ -200,7 +282,7 @@ class Project(object):
             self.submodules,
             self.blockdata,
         ):
-            find_used_modules(entity, self.modules, self.submodules, self.extModules)
+            find_used_modules(entity, used_modules, modules, submodules)
 
         def get_deps(item):
             uselist = [m[0] for m in item.uses]
@@ -250,6 +332,10 @@ class Project(object):
         ranklist.extend(self.programs)
         ranklist.extend(self.blockdata)
 
+        # Top-level procedures by name, for matching up calls. Later
+        # definitions take precedence
+        self.procedure_index = {proc.name.lower(): proc for proc in self.procedures}
+
         # Perform remaining correlations for the project
         for container in ranklist:
             if type(container) != str:
@@ -303,8 +389,26 @@ class Project(object):
         self.absint_lines = sum_lines(self.absinterfaces)
         self.prog_lines = sum_lines(self.programs)
         self.block_lines = sum_lines(self.blockdata)
+        # Entity collections have changed, so any links need re-indexing
+        self._symbol_table = None
         print()
 
+    def _name_index(self, entities, kind: str) -> dict:
+        """Index ``entities`` by lowercase name, warning about
+        duplicates. The first entity with a given name wins"""
+        index = {}
+        for entity in entities:
+            name = entity.name.lower()
+            if name in index:
+                self.warn(
+                    f"Found multiple {kind}s named '{entity.name}' "
+                    f"(in '{index[name].filename}' and '{entity.filename}'), "
+                    f"using the first"
+                )
+                continue
+            index[name] = entity
+        return index
+
     def markdown(self, md, base_url=".."):
         """
         Process the documentation with Markdown to produce HTML.
@@ -313,9 +417,51 @@ class Project(object):
         ford.sourceform.set_base_url(base_url)
         if self.settings["warn"]:
             print()
+
+        # Lots of docstrings are repeated, so only convert each once
+        md = ford.md_convert.CachedMarkdown(md, self.settings.get("cache_dir"))
+        njobs = int(self.settings["parallel"])
+        if njobs > 1:
+            # Do the bulk of the conversion up front in worker processes
+            md.convert_all(
+                (
+                    ford.sourceform.doc_markdown_source(entity.doc)
+                    for entity in chain.from_iterable(
+                        map(_walk_entities, self.allfiles)
+                    )
+                    if isinstance(entity.doc, list) and entity.doc
+                ),
+                njobs,
+            )
+
         for src in self.allfiles:
             src.markdown(md, self)
 
+    def highlight_sources(self):
+        """
+        Highlight the source code of the files, if there are pages
+        showing it, and of any entities with ``source: true``. This is
+        done using several processes if ``parallel`` is set, and the
+        results are cached.
+        """
+        highlighter = ford.highlighting.CachedHighlighter(
+            self.settings.get("cache_dir")
+        )
+        jobs = []
+        if self.settings.get("incl_src", True):
+            jobs.extend((src, src.highlight_job) for src in self.files)
+        for entity in chain.from_iterable(map(_walk_entities, self.files)):
+            if entity.source_code is not None:
+                jobs.append(
+                    (entity, ford.highlighting.HighlightJob(entity.source_code))
+                )
+
+        highlighter.highlight_all(
+            (job for _, job in jobs), int(self.settings["parallel"])
+        )
+        for entity, job in jobs:
+            entity._src = highlighter.get(job)
+
     def make_links(self, base_url=".."):
         """
         Substitute intrasite links to documentation for other parts of
@@ -351,9 +497,9 @@ class Project(object):
 
 def find_used_modules(
     entity: FortranCodeUnit,
-    modules: List[FortranModule],
-    submodules: List[FortranSubmodule],
-    external_modules: List[ExternalModule],
+    used_modules: Dict[str, FortranModule],
+    modules: Dict[str, FortranModule],
+    submodules: Dict[str, FortranSubmodule],
 ) -> None:
     """Find the module objects (or links to intrinsic/external
     module) for all of the ``USED``d names in ``entity``
@@ -362,39 +508,379 @@ def find_used_modules(
     ----------
     entity
         A program, module, submodule or procedure
+    used_modules
+        Modules that can be ``USE``d, including intrinsic and external
+        modules, indexed by lowercase name
     modules
-        Known Fortran modules
-    intrinsic_modules
-        Known intrinsic Fortran modules
+        Known Fortran modules, indexed by lowercase name
     submodules
-        Known Fortran submodules
-    external_modules
-        Known external Fortran modules
+        Known Fortran submodules, indexed by lowercase name
 
     """
     # Find the modules that this entity uses
     for dependency in entity.uses:
-        dependency_name = dependency[0].lower()
-        for candidate in chain(modules, external_modules):
-            if dependency_name == candidate.name.lower():
-                dependency[0] = candidate
-                break
+        dependency[0] = used_modules.get(dependency[0].lower(), dependency[0])
 
     # Find the ancestor of this submodule (if entity is one)
     if getattr(entity, "parent_submodule", None):
-        parent_submodule_name = entity.parent_submodule.lower()
-        for submod in submodules:
-            if parent_submodule_name == submod.name.lower():
-                entity.parent_submodule = submod
-                break
+        entity.parent_submodule = submodules.get(
+            entity.parent_submodule.lower(), entity.parent_submodule
+        )
 
     if hasattr(entity, "ancestor_module"):
-        ancestor_module_name = entity.ancestor_module.lower()
-        for mod in modules:
-            if ancestor_module_name == mod.name.lower():
-                entity.ancestor_module = mod
-                break
+        entity.ancestor_module = modules.get(
+            entity.ancestor_module.lower(), entity.ancestor_module
+        )
 
     # Find the modules that this entity's procedures use
     for procedure in entity.routines:
-        find_used_modules(procedure, modules, submodules, external_modules)
+        find_used_modules(procedure, used_modules, modules, submodules)
+
+
+# Settings which affect how a file is parsed, and so must be part of
+# its parse cache key
+_PARSE_SETTINGS = (
+    "docmark",
+    "predocmark",
+    "docmark_alt",
+    "predocmark_alt",
+    "display",
+    "encoding",
+    "extra_vartypes",
+    "fixed_length_limit",
+    "incl_src",
+    "include",
+    "lower",
+    "macro",
+)
+
+
+def _walk_entities(entity: FortranBase) -> Iterable[FortranBase]:
+    """Yield ``entity`` and all its descendants, in the same order as
+    `FortranBase.markdown` visits them"""
+    yield entity
+    for child in entity.children:
+        if isinstance(child, FortranBase):
+            yield from _walk_entities(child)
+
+
+# Files included by the files parsed in this process. Worker processes
+# each have their own, which is kept for as long as the worker is
+_INCLUDE_CACHE = ford.reader.IncludeCache()
+
+# Filename, project settings, whether or not the file should be
+# preprocessed, whether or not it is in fixed-form, and its preprocessed
+# text if that has already been done (see `_preprocess_files`)
+_FileArgs = Tuple[str, dict, bool, bool, Optional[str]]
+
+
+def _parse_fortran_file(
+    args: _FileArgs,
+) -> Tuple[Optional[FortranSourceFile], Optional[Exception]]:
+    """Parse a single Fortran file, returning either the
+    `FortranSourceFile` or the exception raised while reading it
+
+    Parameters
+    ----------
+    args
+        Tuple of the filename, project settings, whether or not the
+        file should be preprocessed, whether or not it is in
+        fixed-form, and the preprocessed text, if already known
+
+    """
+    settings = args[1]
+    if settings.get("cache_dir"):
+        data, error = _parse_fortran_file_pickled(args)
+        if error is not None:
+            return None, error
+        return _load_source_file(data, settings), None
+
+    return _read_fortran_file(args)
+
+
+def _parse_fortran_file_pickled(
+    args: _FileArgs,
+) -> Tuple[Optional[bytes], Optional[Exception]]:
+    """As `_parse_fortran_file`, but returns the pickled
+    `FortranSourceFile` (see `_dump_source_file`). This is used by the
+    worker processes when parsing in parallel, and is where the parse
+    cache is read and written"""
+    filename, settings, *_ = args
+    cache_dir = settings.get("cache_dir")
+    if cache_dir:
+        cache = ford.cache.DiskCache(cache_dir, "parse")
+        try:
+            cache_key = _parse_cache_key(args)
+        except OSError as e:
+            return None, e
+        data = _read_parse_cache(cache, cache_key)
+        if data is not None:
+            return data, None
+
+    source_file, error = _read_fortran_file(args)
+    if error is not None:
+        return None, error
+    data = _dump_source_file(source_file, settings)
+
+    if cache_dir:
+        try:
+            included_files = {
+                name: ford.cache.hash_file(name) for name in source_file.included_files
+            }
+        except OSError:
+            # An included file vanished while we were reading it, so
+            # don't cache this result
+            return data, None
+        entry = {"included_files": included_files, "source_file": data}
+        cache.put(cache_key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+    return data, None
+
+
+def _read_fortran_file(
+    args: _FileArgs,
+) -> Tuple[Optional[FortranSourceFile], Optional[Exception]]:
+    """Actually parse a Fortran file, see `_parse_fortran_file`"""
+    filename, settings, preprocess, fixed, preprocessed = args
+    try:
+        return (
+            FortranSourceFile(
+                filename,
+                settings,
+                settings["preprocessor"] if preprocess else None,
+                fixed,
+                incl_src=settings.get("incl_src", True),
+                encoding=settings["encoding"],
+                preprocessed=preprocessed,
+                include_cache=_INCLUDE_CACHE,
+            ),
+            None,
+        )
+    except Exception as e:
+        return None, e
+
+
+def _parse_with_source_cache(
+    fortran_files: List[_FileArgs],
+    settings: dict,
+    source_cache: Dict[str, ParsedSource],
+) -> Iterable[Tuple[Optional[FortranSourceFile], Optional[Exception]]]:
+    """Parse the files in ``fortran_files`` which aren't already in
+    ``source_cache``, add them to it, and yield the results for all of
+    them in the same way as `_parse_fortran_file`"""
+    to_parse = [args for args in fortran_files if args[0] not in source_cache]
+    njobs = int(settings["parallel"])
+    if njobs > 1 and len(to_parse) > 1:
+        results = process_map(
+            _parse_fortran_file_pickled,
+            to_parse,
+            max_workers=njobs,
+            chunksize=max(1, len(to_parse) // (4 * njobs)),
+            desc="Parsing files",
+        )
+    else:
+        results = map(_parse_fortran_file_pickled, to_parse)
+
+    errors = {}
+    for (filename, *_), (data, error) in zip(to_parse, results):
+        if error is not None:
+            errors[filename] = error
+        else:
+            source_cache[filename] = ParsedSource(data, [])
+
+    for filename, *_ in fortran_files:
+        if filename in errors:
+            yield None, errors[filename]
+            continue
+        data = source_cache[filename].data
+        source_file = _load_source_file(data, settings)
+        source_cache[filename] = ParsedSource(data, source_file.included_files)
+        yield source_file, None
+
+
+def _parse_cache_key(args: _FileArgs) -> str:
+    """Return the parse cache key for a file: a hash of its contents,
+    how it is read, and the FORD version"""
+    filename, settings, preprocess, fixed, *_ = args
+    return ford.cache.hash_key(
+        ford.__version__,
+        filename,
+        ford.cache.hash_file(filename),
+        fixed,
+        settings["preprocessor"] if preprocess else None,
+        {name: settings.get(name) for name in _PARSE_SETTINGS},
+    )
+
+
+def _read_parse_cache(cache: ford.cache.DiskCache, key: str) -> Optional[bytes]:
+    """Return the pickled `FortranSourceFile` stored under ``key``, if
+    none of the files it included have changed since"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    try:
+        entry = pickle.loads(entry)
+        for name, file_hash in entry["included_files"].items():
+            if ford.cache.hash_file(name) != file_hash:
+                return None
+        return entry["source_file"]
+    except Exception:
+        # Missing included file, or a corrupt or outdated cache entry
+        return None
+
+
+def _has_parse_cache_entry(args: _FileArgs) -> bool:
+    """Is there an up-to-date parse cache entry for this file?"""
+    cache = ford.cache.DiskCache(args[1]["cache_dir"], "parse")
+    try:
+        return _read_parse_cache(cache, _parse_cache_key(args)) is not None
+    except OSError:
+        return False
+
+
+def _preprocess_files(fortran_files: List[_FileArgs], settings: dict) -> Dict[str, str]:
+    """Run the preprocessor on each file in ``fortran_files`` that
+    needs it, using a pool of ``parallel`` threads, and return the
+    output for each file
+
+    The output is cached in ``cache_dir``, if it is set, and files that
+    won't need parsing again because they're in the parse cache are
+    skipped. If preprocessing a file fails, its contents are returned
+    unchanged.
+    """
+    cache_dir = settings.get("cache_dir")
+    filenames = [
+        args[0]
+        for args in fortran_files
+        if args[2] and not (cache_dir and _has_parse_cache_entry(args))
+    ]
+    if not filenames:
+        return {}
+
+    cache = ford.cache.DiskCache(cache_dir, "preprocess") if cache_dir else None
+    njobs = max(1, int(settings["parallel"]))
+    with ThreadPoolExecutor(max_workers=njobs) as executor:
+        texts = executor.map(
+            partial(_preprocess_file, settings=settings, cache=cache), filenames
+        )
+        return {
+            filename: text
+            for filename, text in zip(filenames, texts)
+            if text is not None
+        }
+
+
+def _preprocess_file(
+    filename: str, settings: dict, cache: Optional[ford.cache.DiskCache]
+) -> Optional[str]:
+    """Preprocess a single file for `_preprocess_files`"""
+    key = None
+    if cache is not None:
+        command = ford.reader.preprocessor_command(
+            settings["preprocessor"], settings["macro"], settings["include"], filename
+        )
+        try:
+            key = ford.cache.hash_key(
+                ford.__version__,
+                command,
+                settings["encoding"],
+                ford.cache.hash_file(filename),
+            )
+        except OSError:
+            pass
+        else:
+            text = _read_preprocess_cache(cache, key)
+            if text is not None:
+                return text
+
+    text = ford.reader.preprocess(
+        filename,
+        settings["preprocessor"],
+        settings["macro"],
+        settings["include"],
+        settings["encoding"],
+    )
+    if text is None:
+        print("Reverting to unpreprocessed file")
+        try:
+            with open(filename, "r", encoding=settings["encoding"]) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    if key is not None:
+        included_files = {
+            ford.reader.linemarker_file(line, filename)
+            for line in text.splitlines()
+            if line.lstrip().startswith("#")
+        }
+        included_files.discard(None)
+        try:
+            entry = {
+                "included_files": {
+                    name: ford.cache.hash_file(name) for name in included_files
+                },
+                "text": text,
+            }
+        except OSError:
+            return text
+        cache.put(key, json.dumps(entry).encode("utf-8"))
+    return text
+
+
+def _read_preprocess_cache(cache: ford.cache.DiskCache, key: str) -> Optional[str]:
+    """Return the preprocessor output stored under ``key``, if none of
+    the files it included have changed since"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    try:
+        entry = json.loads(entry)
+        for name, file_hash in entry["included_files"].items():
+            if ford.cache.hash_file(name) != file_hash:
+                return None
+        return entry["text"]
+    except Exception:
+        # Missing included file, or a corrupt cache entry
+        return None
+
+
+class _SettingsPickler(pickle.Pickler):
+    """Pickler that stores a reference to the project settings instead
+    of a copy of them"""
+
+    def __init__(self, file, settings: dict):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.settings = settings
+
+    def persistent_id(self, obj):
+        if obj is self.settings:
+            return "settings"
+        return None
+
+
+class _SettingsUnpickler(pickle.Unpickler):
+    """Unpickler that restores references to the project settings
+    stored by `_SettingsPickler`"""
+
+    def __init__(self, file, settings: dict):
+        super().__init__(file)
+        self.settings = settings
+
+    def persistent_load(self, pid):
+        if pid == "settings":
+            return self.settings
+        raise pickle.UnpicklingError(f"Unsupported persistent object '{pid}'")
+
+
+def _dump_source_file(source_file: FortranSourceFile, settings: dict) -> bytes:
+    """Pickle a parsed source file, without a copy of the settings
+    dict that every entity refers to"""
+    buffer = io.BytesIO()
+    _SettingsPickler(buffer, settings).dump(source_file)
+    return buffer.getvalue()
+
+
+def _load_source_file(data: bytes, settings: dict) -> FortranSourceFile:
+    """Unpickle a source file pickled by `_dump_source_file`, with its
+    entities pointing at ``settings``"""
+    return _SettingsUnpickler(io.BytesIO(data), settings).load()
@@ -27,17 +27,35 @@ from __future__ import annotations
 import colorsys
 import copy
 import itertools
+from array import array
+import multiprocessing
 import os
 import pathlib
 import re
-from typing import Dict, Iterable, List, Optional, Set, Tuple, Type, Union, cast
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
 import warnings
 
+import graphviz
 from graphviz import Digraph, ExecutableNotFound
 from graphviz import version as graphviz_version
 from tqdm import tqdm
 from tqdm.contrib.concurrent import process_map
 
+import ford.cache
 from ford.sourceform import (
     ExternalFunction,
     ExternalInterface,
@@ -60,9 +78,10 @@ from ford.sourceform import (
 )
 
 try:
-    graphviz_version()
+    _graphviz_version = graphviz_version()
     graphviz_installed = True
 except ExecutableNotFound:
+    _graphviz_version = None
     graphviz_installed = False
 
 
@@ -72,6 +91,44 @@ HYPERLINK_RE = re.compile(
 WIDTH_RE = re.compile('width="(.*?)pt"', re.IGNORECASE)
 HEIGHT_RE = re.compile('height="(.*?)pt"', re.IGNORECASE)
 EM_RE = re.compile("<em>(.*)</em>", re.IGNORECASE)
+# Each graph `dot` is given produces a complete SVG document
+SVG_START_RE = re.compile(r"(?=<\?xml\s)")
+
+#: Number of graphs to give to each `dot` process
+GRAPHS_PER_BATCH = 100
+
+
+def _render_batch(sources: Sequence[str]) -> List[str]:
+    """Render several DOT graphs to SVG with a single call to `dot`"""
+    output = graphviz.pipe("dot", "svg", "\n".join(sources).encode("utf-8"))
+    svgs = [svg for svg in SVG_START_RE.split(output.decode("utf-8")) if svg]
+    if len(svgs) == len(sources):
+        return svgs
+    # Couldn't tell where each graph's output starts, so fall back to
+    # rendering them one at a time
+    return [
+        graphviz.pipe("dot", "svg", source.encode("utf-8")).decode("utf-8")
+        for source in sources
+    ]
+
+
+def render_svgs(sources: Sequence[str], njobs: int = 0) -> List[str]:
+    """Render each of the DOT graphs in ``sources`` to SVG
+
+    Rather than starting a `dot` process for every graph, they are
+    passed to `dot` in batches of `GRAPHS_PER_BATCH`, with up to
+    ``njobs`` batches being rendered at once.
+    """
+    batches = [
+        sources[i : i + GRAPHS_PER_BATCH]
+        for i in range(0, len(sources), GRAPHS_PER_BATCH)
+    ]
+    if njobs > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=njobs) as executor:
+            results = list(executor.map(_render_batch, batches))
+    else:
+        results = list(map(_render_batch, batches))
+    return list(itertools.chain.from_iterable(results))
 
 
 def newdict(old, key, val):
@@ -130,6 +187,19 @@ class GraphData:
 
     """
 
+    #: Relations between nodes, as ``(forward, reverse)`` names
+    RELATIONS = {
+        "uses": ("uses", "used_by"),
+        "extends": ("ancestor", "children"),
+        "component": ("comp_types", "comp_of"),
+        "calls": ("calls", "called_by"),
+        "interfaces": ("interfaces", "interfaced_by"),
+        "depends": ("efferent", "afferent"),
+    }
+    #: Relations whose neighbours are kept in the order the edges were
+    #: added, rather than sorted by ``ident``
+    ORDERED_RELATIONS = {"component"}
+
     def __init__(self, parent_dir: str, coloured_edges: bool, show_proc_parent: bool):
         self.submodules: NodeCollection = {}
         self.modules: NodeCollection = {}
@@ -142,6 +212,18 @@ class GraphData:
         self.coloured_edges = coloured_edges
         self.show_proc_parent = show_proc_parent
 
+        # Every distinct node (by type and ``ident``) is numbered, and
+        # the edges of each relation are stored as pairs of node
+        # numbers, along with any label
+        self.nodes: List[BaseNode] = []
+        self._node_numbers: Dict[Tuple[type, str], int] = {}
+        self._edges: Dict[str, Dict[Tuple[int, int], Optional[str]]] = {
+            relation: {} for relation in self.RELATIONS
+        }
+        # Compressed sparse row form of each direction of each
+        # relation, built from ``_edges`` when first needed
+        self._adjacency: Dict[str, Tuple[array, array, List[Optional[str]]]] = {}
+
     def _get_collection_and_node_type(
         self, obj: FortranContainer
     ) -> Tuple[NodeCollection, Type["BaseNode"]]:
@@ -216,6 +298,105 @@ class GraphData:
 
         return collection[obj]
 
+    def number(self, node: BaseNode) -> int:
+        """Return the number of ``node``, numbering it if it is new.
+        Nodes of the same type with the same ``ident`` have the same
+        number. Nodes made from names alone use the name as their
+        ``ident``, so the type keeps, say, a module and a procedure of
+        the same name apart."""
+        key = (type(node), node.ident)
+        if (number := self._node_numbers.get(key)) is None:
+            number = self._node_numbers[key] = len(self.nodes)
+            self.nodes.append(node)
+            # The adjacency lists only cover the nodes they were built for
+            self._adjacency.clear()
+        return number
+
+    def add_edge(
+        self, relation: str, tail: BaseNode, head: BaseNode, label: Optional[str] = None
+    ) -> None:
+        """Add an edge from ``tail`` to ``head`` to ``relation``. Labels
+        of repeated edges are joined together."""
+        edges = self._edges[relation]
+        key = (tail.number, head.number)
+        if key in edges and label is not None:
+            label = f"{edges[key]}, {label}"
+        edges[key] = label
+        self._adjacency.clear()
+
+    def build_adjacency(self) -> None:
+        """Build the adjacency lists of every relation, in both
+        directions, so they are ready before making any graphs"""
+        for forward, reverse in self.RELATIONS.values():
+            self._get_adjacency(forward)
+            self._get_adjacency(reverse)
+
+    def _get_adjacency(self, name: str) -> Tuple[array, array, List[Optional[str]]]:
+        """Return the offsets, neighbours and labels of relation
+        ``name``: the neighbours of node ``i`` are
+        ``neighbours[offsets[i]:offsets[i + 1]]``"""
+        if (adjacency := self._adjacency.get(name)) is not None:
+            return adjacency
+
+        relation, reverse = next(
+            (relation, name == names[1])
+            for relation, names in self.RELATIONS.items()
+            if name in names
+        )
+        edges = self._edges[relation]
+        pairs = [(head, tail) if reverse else (tail, head) for tail, head in edges]
+
+        # Counting sort of the edges by their first node, keeping the
+        # order they were added in
+        counts = [0] * (len(self.nodes) + 1)
+        for first, _ in pairs:
+            counts[first + 1] += 1
+        offsets = array("l", itertools.accumulate(counts))
+        neighbours = array("l", bytes(len(pairs) * offsets.itemsize))
+        labels: List[Optional[str]] = [None] * len(pairs)
+        position = list(offsets[:-1])
+        for (first, second), label in zip(pairs, edges.values()):
+            neighbours[position[first]] = second
+            labels[position[first]] = label
+            position[first] += 1
+
+        if relation not in self.ORDERED_RELATIONS:
+            # None of these have labels
+            rank = [0] * len(self.nodes)
+            for i, number in enumerate(
+                sorted(range(len(self.nodes)), key=lambda n: self.nodes[n].ident)
+            ):
+                rank[number] = i
+            for start, end in zip(offsets[:-1], offsets[1:]):
+                if end - start > 1:
+                    neighbours[start:end] = array(
+                        "l", sorted(neighbours[start:end], key=rank.__getitem__)
+                    )
+
+        adjacency = self._adjacency[name] = (offsets, neighbours, labels)
+        return adjacency
+
+    def neighbours(self, node: BaseNode, name: str) -> List[BaseNode]:
+        """Return the neighbours of ``node`` in relation ``name``, which
+        is one of the directions in `RELATIONS`"""
+        offsets, neighbours, _ = self._get_adjacency(name)
+        number = node.number
+        return [
+            self.nodes[n] for n in neighbours[offsets[number] : offsets[number + 1]]
+        ]
+
+    def labelled_neighbours(
+        self, node: BaseNode, name: str
+    ) -> List[Tuple[BaseNode, Optional[str]]]:
+        """Return the neighbours of ``node`` in relation ``name``, along
+        with the label of the edge to each"""
+        offsets, neighbours, labels = self._get_adjacency(name)
+        start, end = offsets[node.number], offsets[node.number + 1]
+        return [
+            (self.nodes[n], labels[i])
+            for i, n in zip(range(start, end), neighbours[start:end])
+        ]
+
     def get_module_node(self, mod: Union[FortranModule, str]) -> ModNode:
         if isinstance(mod, str):
             # Most likely a third-party module
@@ -309,6 +490,9 @@ class BaseNode:
                 self.attribs["URL"] = graph_data.parent_dir + self.url
         self.afferent = 0
         self.efferent = 0
+        #: Index of this node in ``graph_data.nodes``, which is shared
+        #: by nodes of the same type with the same ``ident``
+        self.number = graph_data.number(self)
 
     def __eq__(self, other):
         return self.ident == other.ident
@@ -330,16 +514,12 @@ class ModNode(BaseNode):
 
     def __init__(self, obj, gd, hist=None):
         super().__init__(obj, gd)
-        self.uses = set()
-        self.used_by = set()
-        self.children = set()
         if self.fromstr:
             return
         for u in obj.uses:
             n = gd.get_module_node(u)
-            n.used_by.add(self)
+            gd.add_edge("uses", self, n)
             n.afferent += 1
-            self.uses.add(n)
             self.efferent += n.efferent
 
 
@@ -348,16 +528,15 @@ class SubmodNode(ModNode):
 
     def __init__(self, obj, gd, hist=None):
         super().__init__(obj, gd)
-        del self.used_by
         if self.fromstr:
             return
         if obj.parent_submodule:
-            self.ancestor = gd.get_node(obj.parent_submodule)
+            ancestor = gd.get_node(obj.parent_submodule)
         else:
-            self.ancestor = gd.get_module_node(obj.ancestor_module)
-        self.ancestor.children.add(self)
+            ancestor = gd.get_module_node(obj.ancestor_module)
+        gd.add_edge("extends", self, ancestor)
         self.efferent += 1
-        self.ancestor.afferent += 1
+        ancestor.afferent += 1
 
 
 class TypeNode(BaseNode):
@@ -365,10 +544,6 @@ class TypeNode(BaseNode):
 
     def __init__(self, obj, gd, hist=None):
         super().__init__(obj, gd)
-        self.ancestor = None
-        self.children = set()
-        self.comp_types = dict()
-        self.comp_of = dict()
         if self.fromstr:
             return
 
@@ -379,9 +554,9 @@ class TypeNode(BaseNode):
             return
 
         if obj.extends:
-            self.ancestor = gd.get_type_node(obj.extends, hist)
-            self.ancestor.children.add(self)
-            self.ancestor.visible = getattr(obj.extends, "visible", True)
+            ancestor = gd.get_type_node(obj.extends, hist)
+            gd.add_edge("extends", self, ancestor)
+            ancestor.visible = getattr(obj.extends, "visible", True)
 
         for var in obj.local_variables:
             if var.vartype not in ["type", "class"]:
@@ -394,14 +569,7 @@ class TypeNode(BaseNode):
             node = gd.get_type_node(proto, hist)
 
             node.visible = getattr(proto, "visible", True)
-            if self in node.comp_of:
-                node.comp_of[self] += ", " + var.name
-            else:
-                node.comp_of[self] = var.name
-            if node in self.comp_types:
-                self.comp_types[node] += ", " + var.name
-            else:
-                self.comp_types[node] = var.name
+            gd.add_edge("component", self, node, var.name)
 
 
 class ProcNode(BaseNode):
@@ -426,27 +594,17 @@ class ProcNode(BaseNode):
             binding_label = ""
         self.attribs["label"] = f"{parent_label}{binding_label}{self.name}"
 
-        self.uses = set()
-        self.calls = set()
-        self.called_by = set()
-        self.interfaces = set()
-        self.interfaced_by = set()
-
         if self.fromstr:
             return
 
         hist = newdict(hist or {}, obj, self)
 
         for u in getattr(obj, "uses", []):
-            n = gd.get_module_node(u)
-            n.used_by.add(self)
-            self.uses.add(n)
+            gd.add_edge("uses", self, gd.get_module_node(u))
 
         for c in getattr(obj, "calls", []):
             if getattr(c, "visible", True):
-                n = gd.get_procedure_node(c, hist)
-                n.called_by.add(self)
-                self.calls.add(n)
+                gd.add_edge("calls", self, gd.get_procedure_node(c, hist))
 
         if obj.proctype.lower() != "interface":
             return
@@ -454,8 +612,7 @@ class ProcNode(BaseNode):
         for m in getattr(obj, "modprocs", []):
             if m.procedure and getattr(m.procedure, "visible", True):
                 n = gd.get_procedure_node(m.procedure, hist)
-                n.interfaced_by.add(self)
-                self.interfaces.add(n)
+                gd.add_edge("interfaces", self, n)
 
         if (
             hasattr(obj, "procedure")
@@ -464,8 +621,7 @@ class ProcNode(BaseNode):
             and getattr(obj.procedure.module, "visible", True)
         ):
             n = gd.get_procedure_node(obj.procedure.module, hist)
-            n.interfaced_by.add(self)
-            self.interfaces.add(n)
+            gd.add_edge("interfaces", self, n)
 
 
 class ProgNode(BaseNode):
@@ -473,21 +629,15 @@ class ProgNode(BaseNode):
 
     def __init__(self, obj, gd, hist=None):
         super().__init__(obj, gd)
-        self.uses = set()
-        self.calls = set()
         if self.fromstr:
             return
         for u in obj.uses:
-            n = gd.get_module_node(u)
-            n.used_by.add(self)
-            self.uses.add(n)
+            gd.add_edge("uses", self, gd.get_module_node(u))
 
         for c in obj.calls:
             if not getattr(c, "visible", False):
                 continue
-            n = gd.get_procedure_node(c, {})
-            n.called_by.add(self)
-            self.calls.add(n)
+            gd.add_edge("calls", self, gd.get_procedure_node(c, {}))
 
 
 class BlockNode(BaseNode):
@@ -495,13 +645,10 @@ class BlockNode(BaseNode):
 
     def __init__(self, obj, gd, hist=None):
         super().__init__(obj, gd)
-        self.uses = set()
         if self.fromstr:
             return
         for u in obj.uses:
-            n = gd.get_module_node(u)
-            n.used_by.add(self)
-            self.uses.add(n)
+            gd.add_edge("uses", self, gd.get_module_node(u))
 
 
 class FileNode(BaseNode):
@@ -509,8 +656,6 @@ class FileNode(BaseNode):
 
     def __init__(self, obj, gd, hist=None):
         super().__init__(obj, gd)
-        self.afferent = set()  # Things depending on this file
-        self.efferent = set()  # Things this file depends on
 
         if self.fromstr:
             return
@@ -530,8 +675,8 @@ class FileNode(BaseNode):
                 if sourcefile == obj:
                     continue
                 n = hist.get(sourcefile, gd.get_node(sourcefile, hist))
-                n.afferent.add(self)
-                self.efferent.add(n)
+                # This file depends on ``n``
+                gd.add_edge("depends", self, n)
 
 
 def _edge(
@@ -581,7 +726,7 @@ if graphviz_installed:
     _sourcefile = gd.get_node(ExternalSourceFile("Source File"))
 
     def _make_legend(entities):
-        """Make a legend containing a collection of entities"""
+        """Make the DOT source for a legend containing a collection of entities"""
         dot = Digraph(
             "Graph Key",
             graph_attr={"size": "8.90625,1000.0", "concentrate": "false"},
@@ -599,12 +744,16 @@ if graphviz_installed:
         for entity in entities:
             dot.node(entity.name, **entity.attribs)
         dot.node("This Page's Entity")
-        return dot.pipe().decode("utf-8")
-
-    mod_svg = _make_legend([_module, _submodule, _subroutine, _function, _program])
-    type_svg = _make_legend([_type])
-    call_svg = _make_legend([_subroutine, _function, _interface, _unknown, _program])
-    file_svg = _make_legend([_sourcefile])
+        return dot.source
+
+    mod_svg, type_svg, call_svg, file_svg = render_svgs(
+        [
+            _make_legend([_module, _submodule, _subroutine, _function, _program]),
+            _make_legend([_type]),
+            _make_legend([_subroutine, _function, _interface, _unknown, _program]),
+            _make_legend([_sourcefile]),
+        ]
+    )
 else:
     mod_svg = ""
     type_svg = ""
@@ -661,6 +810,19 @@ del type_svg
 del mod_svg
 
 
+class GraphResult(NamedTuple):
+    """A graph built and rendered in a worker process, with nodes
+    referred to by their ``ident``"""
+
+    body: List[str]
+    added: List[str]
+    hop_nodes: List[str]
+    hop_edges: List[Tuple[str, str, Dict]]
+    truncated: int
+    svg_src: Optional[str]
+    scaled: bool
+
+
 class FortranGraph:
     """Graph of some relationship for a given entity
 
@@ -675,6 +837,8 @@ class FortranGraph:
         for saved files. If there are multiple entities in ``root``,
         and ``ident`` isn't given, it is set from the first entity in
         ``root``
+    build:
+        If false, don't add any nodes to the graph until `build` is called
 
     Attributes
     ----------
@@ -706,6 +870,7 @@ class FortranGraph:
         root: Union[FortranContainer, Iterable[FortranContainer]],
         data: GraphData,
         ident: Optional[str] = None,
+        build: bool = True,
     ):
         self.root = []
         self.data = data
@@ -749,32 +914,100 @@ class FortranGraph:
             format="svg",
             engine="dot",
         )
-        # add root nodes to the graph
+        # The SVG is only produced when it's first needed, unless
+        # `render_graphs` has already attached it
+        self._svg_src: Optional[str] = None
+        self._scaled = False
+
+        if build:
+            self.build()
+
+    def build(self):
+        """Add the root nodes, and the nodes and edges depending on
+        them, to the graph"""
         for n in sorted(self.root):
             if len(self.root) == 1:
                 self.dot.node(n.ident, label=n.attribs["label"])
             else:
                 self.dot.node(n.ident, **n.attribs)
             self.added.add(n)
-        # add nodes and edges depending on the root nodes to the graph
         self.add_nodes(self.root)
 
-        if graphviz_installed:
-            self.svg_src = self.dot.pipe().decode("utf-8")
-            self.svg_src = self.svg_src.replace(
-                "<svg ", '<svg id="' + re.sub(r"[^\w]", "", self.ident) + '" '
-            )
-            if match := WIDTH_RE.search(self.svg_src):
-                width = int(match.group(1))
-            else:
-                width = 0
-            if isinstance(self, (ModuleGraph, CallGraph, TypeGraph)):
-                self.scaled = width >= 855
-            else:
-                self.scaled = width >= 641
+    def _export(self) -> GraphResult:
+        """Return what was built and rendered for this graph, in a form
+        that can be sent back from a worker process"""
+        return GraphResult(
+            body=self.dot.body,
+            added=[node.ident for node in self.added],
+            hop_nodes=[node.ident for node in self.hop_nodes],
+            hop_edges=[
+                (edge["tail_node"].ident, edge["head_node"].ident, edge["edge"])
+                for edge in self.hop_edges
+            ],
+            truncated=self.truncated,
+            svg_src=self._svg_src,
+            scaled=self._scaled,
+        )
+
+    def _load(self, result: GraphResult, nodes: Dict[str, BaseNode]):
+        """Take the result of building this graph in a worker process,
+        using the nodes in ``nodes`` to stand in for the worker's"""
+        self.dot.body = result.body
+        self.added = {nodes[ident] for ident in result.added}
+        self.hop_nodes = [nodes[ident] for ident in result.hop_nodes]
+        self.hop_edges = [
+            {"tail_node": nodes[tail], "head_node": nodes[head], "edge": edge}
+            for tail, head, edge in result.hop_edges
+        ]
+        self.truncated = result.truncated
+        self._svg_src = result.svg_src
+        self._scaled = result.scaled
+
+    def set_svg(self, svg_src: str):
+        """Attach the SVG rendered from this graph's DOT source"""
+        self._svg_src = svg_src.replace(
+            "<svg ", '<svg id="' + re.sub(r"[^\w]", "", self.ident) + '" '
+        )
+        if match := WIDTH_RE.search(self._svg_src):
+            width = int(match.group(1))
+        else:
+            width = 0
+        if isinstance(self, (ModuleGraph, CallGraph, TypeGraph)):
+            self._scaled = width >= 855
         else:
-            self.svg_src = ""
-            self.scaled = False
+            self._scaled = width >= 641
+
+    @property
+    def svg_src(self) -> str:
+        """The graph rendered as SVG"""
+        if self._svg_src is None:
+            if graphviz_installed:
+                self.set_svg(self.dot.pipe().decode("utf-8"))
+            else:
+                self._svg_src = ""
+        return self._svg_src
+
+    @property
+    def scaled(self) -> bool:
+        """True if the SVG is wide enough to need zoom controls"""
+        # Make sure the SVG has been rendered
+        self.svg_src
+        return self._scaled
+
+    @property
+    def graph_as_table(self) -> bool:
+        """True if the graph is shown as a table instead of as an SVG,
+        because its first hop was too large"""
+        return len(self.hop_nodes) > 0 and len(self.root) == 1
+
+    @property
+    def shows_svg(self) -> bool:
+        """True if the HTML for this graph includes its SVG"""
+        if self.graph_as_table or len(self.added) <= 1:
+            return False
+        if len(self.added) > self.max_nodes and self.warn:
+            return False
+        return len(self.added) >= len(self.root) or not self.warn
 
     def add_to_graph(self, nodes, edges, nesting):
         """
@@ -810,7 +1043,7 @@ class FortranGraph:
         the rendering in browsers.
         """
 
-        graph_as_table = len(self.hop_nodes) > 0 and len(self.root) == 1
+        graph_as_table = self.graph_as_table
 
         # Do not render empty graphs
         if len(self.added) <= 1 and not graph_as_table:
@@ -998,15 +1231,15 @@ class ModuleGraph(FortranGraph):
     _legend = MOD_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for nu in sorted(node.uses):
+        for nu in self.data.neighbours(node, "uses"):
             if nu not in self.added:
                 hop_nodes.add(nu)
             hop_edges.append(_dashed_edge(node, nu, colour))
 
-        if hasattr(node, "ancestor"):
-            if node.ancestor not in self.added:
-                hop_nodes.add(node.ancestor)
-            hop_edges.append(_solid_edge(node, node.ancestor, colour))
+        for ancestor in self.data.neighbours(node, "ancestor"):
+            if ancestor not in self.added:
+                hop_nodes.add(ancestor)
+            hop_edges.append(_solid_edge(node, ancestor, colour))
 
     def _extra_attributes(self):
         self.dot.attr("graph", size="11.875,1000.0")
@@ -1019,15 +1252,15 @@ class UsesGraph(FortranGraph):
     _legend = MOD_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for nu in sorted(node.uses):
+        for nu in self.data.neighbours(node, "uses"):
             if nu not in self.added:
                 hop_nodes.add(nu)
             hop_edges.append(_dashed_edge(node, nu, colour))
 
-        if hasattr(node, "ancestor"):
-            if node.ancestor not in self.added:
-                hop_nodes.add(node.ancestor)
-            hop_edges.append(_solid_edge(node, node.ancestor, colour))
+        for ancestor in self.data.neighbours(node, "ancestor"):
+            if ancestor not in self.added:
+                hop_nodes.add(ancestor)
+            hop_edges.append(_solid_edge(node, ancestor, colour))
 
 
 class UsedByGraph(FortranGraph):
@@ -1037,11 +1270,11 @@ class UsedByGraph(FortranGraph):
     _legend = MOD_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for nu in sorted(getattr(node, "used_by", [])):
+        for nu in self.data.neighbours(node, "used_by"):
             if nu not in self.added:
                 hop_nodes.add(nu)
             hop_edges.append(_dashed_edge(nu, node, colour))
-        for c in sorted(getattr(node, "children", [])):
+        for c in self.data.neighbours(node, "children"):
             if c not in self.added:
                 hop_nodes.add(c)
             hop_edges.append(_solid_edge(c, node, colour))
@@ -1053,7 +1286,7 @@ class FileGraph(FortranGraph):
     _legend = FILE_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for ne in sorted(node.efferent):
+        for ne in self.data.neighbours(node, "efferent"):
             if ne not in self.added:
                 hop_nodes.add(ne)
             hop_edges.append(_solid_edge(ne, node, colour))
@@ -1066,7 +1299,7 @@ class EfferentGraph(FortranGraph):
     _legend = FILE_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for ne in sorted(node.efferent):
+        for ne in self.data.neighbours(node, "efferent"):
             if ne not in self.added:
                 hop_nodes.add(ne)
             hop_edges.append(_dashed_edge(node, ne, colour))
@@ -1079,7 +1312,7 @@ class AfferentGraph(FortranGraph):
     _legend = FILE_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for na in sorted(node.afferent):
+        for na in self.data.neighbours(node, "afferent"):
             if na not in self.added:
                 hop_nodes.add(na)
             hop_edges.append(_dashed_edge(na, node, colour))
@@ -1091,17 +1324,14 @@ class TypeGraph(FortranGraph):
     _legend = TYPE_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for keys in node.comp_types.keys():
-            if keys not in self.added:
-                hop_nodes.add(keys)
-        for c in node.comp_types:
+        for c, label in self.data.labelled_neighbours(node, "comp_types"):
             if c not in self.added:
                 hop_nodes.add(c)
-            hop_edges.append(_dashed_edge(node, c, colour, node.comp_types[c]))
-        if node.ancestor:
-            if node.ancestor not in self.added:
-                hop_nodes.add(node.ancestor)
-            hop_edges.append(_solid_edge(node, node.ancestor, colour))
+            hop_edges.append(_dashed_edge(node, c, colour, label))
+        for ancestor in self.data.neighbours(node, "ancestor"):
+            if ancestor not in self.added:
+                hop_nodes.add(ancestor)
+            hop_edges.append(_solid_edge(node, ancestor, colour))
 
     def _extra_attributes(self):
         self.dot.attr("graph", size="11.875,1000.0")
@@ -1114,14 +1344,14 @@ class InheritsGraph(FortranGraph):
     _legend = TYPE_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for c in node.comp_types:
+        for c, label in self.data.labelled_neighbours(node, "comp_types"):
             if c not in self.added:
                 hop_nodes.add(c)
-            hop_edges.append(_dashed_edge(node, c, colour, node.comp_types[c]))
-        if node.ancestor:
-            if node.ancestor not in self.added:
-                hop_nodes.add(node.ancestor)
-            hop_edges.append(_solid_edge(node, node.ancestor, colour))
+            hop_edges.append(_dashed_edge(node, c, colour, label))
+        for ancestor in self.data.neighbours(node, "ancestor"):
+            if ancestor not in self.added:
+                hop_nodes.add(ancestor)
+            hop_edges.append(_solid_edge(node, ancestor, colour))
 
 
 class InheritedByGraph(FortranGraph):
@@ -1131,11 +1361,11 @@ class InheritedByGraph(FortranGraph):
     _legend = TYPE_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for c in node.comp_of:
+        for c, label in self.data.labelled_neighbours(node, "comp_of"):
             if c not in self.added:
                 hop_nodes.add(c)
-            hop_edges.append(_dashed_edge(c, node, colour, node.comp_of[c]))
-        for c in node.children:
+            hop_edges.append(_dashed_edge(c, node, colour, label))
+        for c in self.data.neighbours(node, "children"):
             if c not in self.added:
                 hop_nodes.add(c)
             hop_edges.append(_solid_edge(c, node, colour))
@@ -1151,11 +1381,11 @@ class CallGraph(FortranGraph):
     _legend = CALL_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for p in sorted(node.calls):
+        for p in self.data.neighbours(node, "calls"):
             if p not in hop_nodes:
                 hop_nodes.add(p)
             hop_edges.append(_solid_edge(node, p, colour))
-        for p in sorted(getattr(node, "interfaces", [])):
+        for p in self.data.neighbours(node, "interfaces"):
             if p not in hop_nodes:
                 hop_nodes.add(p)
             hop_edges.append(_dashed_edge(node, p, colour))
@@ -1173,11 +1403,11 @@ class CallsGraph(FortranGraph):
     _legend = CALL_GRAPH_KEY
 
     def _add_node(self, hop_nodes, hop_edges, node, colour):
-        for p in sorted(node.calls):
+        for p in self.data.neighbours(node, "calls"):
             if p not in self.added:
                 hop_nodes.add(p)
             hop_edges.append(_solid_edge(node, p, colour))
-        for p in sorted(getattr(node, "interfaces", [])):
+        for p in self.data.neighbours(node, "interfaces"):
             if p not in self.added:
                 hop_nodes.add(p)
             hop_edges.append(_dashed_edge(node, p, colour))
@@ -1196,11 +1426,11 @@ class CalledByGraph(FortranGraph):
     def _add_node(self, hop_nodes, hop_edges, node, colour):
         if isinstance(node, ProgNode):
             return
-        for p in sorted(node.called_by):
+        for p in self.data.neighbours(node, "called_by"):
             if p not in self.added:
                 hop_nodes.add(p)
             hop_edges.append(_solid_edge(p, node, colour))
-        for p in sorted(getattr(node, "interfaced_by", [])):
+        for p in self.data.neighbours(node, "interfaced_by"):
             if p not in self.added:
                 hop_nodes.add(p)
             hop_edges.append(_dashed_edge(p, node, colour))
@@ -1222,6 +1452,66 @@ class BadType(Exception):
         return repr(self.value)
 
 
+def render_graphs(
+    graphs: Iterable[FortranGraph],
+    njobs: int = 0,
+    cache: Optional[ford.cache.DiskCache] = None,
+):
+    """Render all of ``graphs`` to SVG in batches (see `render_svgs`),
+    and attach the results to them. Graphs whose SVG isn't shown (see
+    `FortranGraph.shows_svg`), or which already have one, are skipped.
+
+    If ``cache`` is given, SVGs are stored there keyed by a hash of
+    their DOT source, and only graphs that aren't already in the cache
+    are rendered.
+    """
+    if not graphviz_installed:
+        return
+    graphs = [
+        graph
+        for graph in dict.fromkeys(graphs)
+        if graph._svg_src is None and graph.shows_svg
+    ]
+
+    graph_sources = [graph.dot.source for graph in graphs]
+    sources = list(dict.fromkeys(graph_sources))
+    svgs: Dict[str, str] = {}
+    keys: Dict[str, str] = {}
+    if cache is not None:
+        for source in sources:
+            key = keys[source] = ford.cache.hash_key(_graphviz_version, source)
+            if (entry := cache.get(key)) is not None:
+                svgs[source] = entry.decode("utf-8")
+
+    missing = [source for source in sources if source not in svgs]
+    for source, svg in zip(missing, render_svgs(missing, njobs)):
+        svgs[source] = svg
+        if cache is not None:
+            cache.put(keys[source], svg.encode("utf-8"))
+
+    for graph, source in zip(graphs, graph_sources):
+        graph.set_svg(svgs[source])
+
+
+# Building graphs in worker processes relies on them being forked, so
+# that they already have all the graphs and nodes
+_CAN_FORK = (
+    "fork" in multiprocessing.get_all_start_methods() and sys.platform != "darwin"
+)
+_WORKER_GRAPHS: List[FortranGraph] = []
+
+
+def _build_graphs(
+    indices: range, cache: Optional[ford.cache.DiskCache]
+) -> List[GraphResult]:
+    """Build and render some of `_WORKER_GRAPHS` in a worker process"""
+    graphs = [_WORKER_GRAPHS[i] for i in indices]
+    for graph in graphs:
+        graph.build()
+    render_graphs(graphs, cache=cache)
+    return [graph._export() for graph in graphs]
+
+
 def outputFuncWrap(args):
     """Wrapper function for output graphs -- needed to allow multiprocessing to
     pickle the function (must be at top level)"""
@@ -1261,6 +1551,10 @@ class GraphManager:
     save_graphs:
         If true, save graphs as separate files, as well as embedding
         them in the HTML
+    cache_dir:
+        Directory in which to cache rendered graphs between runs
+    cache_size:
+        Maximum size of the graph cache, in megabytes
     """
 
     def __init__(
@@ -1272,6 +1566,8 @@ class GraphManager:
         coloured_edges: bool,
         show_proc_parent: bool,
         save_graphs: bool = False,
+        cache_dir: Optional[os.PathLike] = None,
+        cache_size: int = 64,
     ):
         self.graph_objs: List[FortranContainer] = []
         self.modules: Set[FortranContainer] = set()
@@ -1287,6 +1583,11 @@ class GraphManager:
         self.callgraph = None
         self.filegraph = None
         self.data = GraphData(parentdir, coloured_edges, show_proc_parent)
+        self.cache = None
+        if cache_dir:
+            self.cache = ford.cache.DiskCache(
+                cache_dir, "graphs", cache_size * 1024 * 1024
+            )
 
     def register(self, obj: FortranContainer):
         """Register ``obj`` as a node to be used in graphs"""
@@ -1294,34 +1595,44 @@ class GraphManager:
             self.data.register(obj)
             self.graph_objs.append(obj)
 
-    def graph_all(self):
-        """Create all graphs"""
-        for obj in tqdm(sorted(self.graph_objs), unit="", desc="Generating graphs"):
+    def graph_all(self, njobs: int = 0):
+        """Create all graphs, building and rendering them in ``njobs``
+        worker processes if there is more than one, or taking them from
+        the cache"""
+        for obj in sorted(self.graph_objs):
             if is_module(obj):
-                obj.usesgraph = UsesGraph(obj, self.data)
-                obj.usedbygraph = UsedByGraph(obj, self.data)
+                obj.usesgraph = UsesGraph(obj, self.data, build=False)
+                obj.usedbygraph = UsedByGraph(obj, self.data, build=False)
                 self.modules.add(obj)
             elif is_type(obj):
-                obj.inhergraph = InheritsGraph(obj, self.data)
-                obj.inherbygraph = InheritedByGraph(obj, self.data)
+                obj.inhergraph = InheritsGraph(obj, self.data, build=False)
+                obj.inherbygraph = InheritedByGraph(obj, self.data, build=False)
                 self.types.add(obj)
             elif is_proc(obj):
-                obj.callsgraph = CallsGraph(obj, self.data)
-                obj.calledbygraph = CalledByGraph(obj, self.data)
-                obj.usesgraph = UsesGraph(obj, self.data)
+                obj.callsgraph = CallsGraph(obj, self.data, build=False)
+                obj.calledbygraph = CalledByGraph(obj, self.data, build=False)
+                obj.usesgraph = UsesGraph(obj, self.data, build=False)
                 self.procedures.add(obj)
             elif is_program(obj):
-                obj.usesgraph = UsesGraph(obj, self.data)
-                obj.callsgraph = CallsGraph(obj, self.data)
+                obj.usesgraph = UsesGraph(obj, self.data, build=False)
+                obj.callsgraph = CallsGraph(obj, self.data, build=False)
                 self.programs.add(obj)
             elif is_sourcefile(obj):
-                obj.afferentgraph = AfferentGraph(obj, self.data)
-                obj.efferentgraph = EfferentGraph(obj, self.data)
+                obj.afferentgraph = AfferentGraph(obj, self.data, build=False)
+                obj.efferentgraph = EfferentGraph(obj, self.data, build=False)
                 self.sourcefiles.add(obj)
             elif is_blockdata(obj):
-                obj.usesgraph = UsesGraph(obj, self.data)
+                obj.usesgraph = UsesGraph(obj, self.data, build=False)
                 self.blockdata.add(obj)
 
+        graphs = list(dict.fromkeys(self._entity_graphs()))
+        self.data.build_adjacency()
+        if njobs > 1 and len(graphs) > 1 and _CAN_FORK:
+            self._build_in_workers(graphs, njobs)
+        else:
+            for graph in tqdm(graphs, unit="", desc="Generating graphs"):
+                graph.build()
+
         usenodes = sorted(list(self.modules))
         callnodes = sorted(list(self.procedures))
         for p in sorted(self.programs):
@@ -1340,6 +1651,61 @@ class GraphManager:
         self.callgraph = CallGraph(callnodes, self.data, "call~~graph")
         self.filegraph = FileGraph(self.sourcefiles, self.data, "file~~graph")
 
+        render_graphs(
+            itertools.chain(
+                graphs, [self.usegraph, self.typegraph, self.callgraph, self.filegraph]
+            ),
+            njobs,
+            self.cache,
+        )
+        if self.cache is not None:
+            self.cache.prune()
+
+    def _entity_graphs(self) -> Iterable[FortranGraph]:
+        """The graphs of each of the registered entities"""
+        for obj in sorted(self.graph_objs):
+            for attribute in (
+                "usesgraph",
+                "usedbygraph",
+                "inhergraph",
+                "inherbygraph",
+                "callsgraph",
+                "calledbygraph",
+                "afferentgraph",
+                "efferentgraph",
+            ):
+                graph = getattr(obj, attribute, None)
+                if isinstance(graph, FortranGraph):
+                    yield graph
+
+    def _build_in_workers(self, graphs: List[FortranGraph], njobs: int):
+        """Build and render ``graphs`` in ``njobs`` forked worker
+        processes. The nodes stay in this process: the workers send back
+        the DOT source, SVG and the idents of the nodes in each graph"""
+        global _WORKER_GRAPHS
+
+        nodes = {node.ident: node for node in self.data.nodes}
+        chunks = [
+            range(i, min(i + GRAPHS_PER_BATCH, len(graphs)))
+            for i in range(0, len(graphs), GRAPHS_PER_BATCH)
+        ]
+
+        _WORKER_GRAPHS = graphs
+        try:
+            with ProcessPoolExecutor(
+                max_workers=njobs, mp_context=multiprocessing.get_context("fork")
+            ) as executor:
+                results = executor.map(
+                    _build_graphs, chunks, itertools.repeat(self.cache)
+                )
+                with tqdm(total=len(graphs), unit="", desc="Generating graphs") as bar:
+                    for chunk, chunk_results in zip(chunks, results):
+                        for i, result in zip(chunk, chunk_results):
+                            graphs[i]._load(result, nodes)
+                        bar.update(len(chunk))
+        finally:
+            _WORKER_GRAPHS = []
+
     def output_graphs(self, njobs=0):
         """Save graphs to file"""
 
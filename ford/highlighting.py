@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+#  highlighting.py
+#  This file is part of FORD.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+"""
+Syntax highlighting of Fortran source code in bulk: caching the
+results, and using several processes
+"""
+
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import pygments
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import FortranFixedLexer, FortranLexer
+from tqdm.contrib.concurrent import process_map
+
+import ford
+import ford.cache
+
+
+class HighlightJob(NamedTuple):
+    """Some source code and how to highlight it"""
+
+    code: str
+    #: Use the fixed-form lexer
+    fixed: bool = False
+    #: Highlight a whole file, with line anchors, rather than a snippet
+    whole_file: bool = False
+
+
+def highlight_fortran(job: HighlightJob) -> str:
+    """Return the HTML for ``job``"""
+    lexer = FortranFixedLexer() if job.fixed else FortranLexer()
+    if job.whole_file:
+        formatter = HtmlFormatter(lineanchors="ln", cssclass="hl")
+    else:
+        formatter = HtmlFormatter()
+    return highlight(job.code, lexer, formatter)
+
+
+class CachedHighlighter:
+    """
+    Highlights each distinct piece of source code only once
+
+    Results can also be stored in ``cache_dir``, so that they can be
+    reused by later runs.
+
+    Parameters
+    ----------
+    cache_dir
+        Directory to store results in between runs
+
+    """
+
+    def __init__(self, cache_dir: Optional[os.PathLike] = None):
+        self.results: Dict[HighlightJob, str] = {}
+        self.disk_cache = None
+        if cache_dir:
+            self.disk_cache = ford.cache.DiskCache(cache_dir, "highlight")
+
+    @staticmethod
+    def _disk_key(job: HighlightJob) -> str:
+        return ford.cache.hash_key(
+            ford.__version__, pygments.__version__, job.fixed, job.whole_file, job.code
+        )
+
+    def get(self, job: HighlightJob) -> Optional[str]:
+        """Return the HTML for ``job``, if it is cached"""
+        if (html := self.results.get(job)) is not None:
+            return html
+        if self.disk_cache is None:
+            return None
+        if (entry := self.disk_cache.get(self._disk_key(job))) is None:
+            return None
+        html = self.results[job] = entry.decode("utf-8")
+        return html
+
+    def update(self, results: Dict[HighlightJob, str]) -> None:
+        """Add already highlighted code to the cache"""
+        self.results.update(results)
+        if self.disk_cache is None:
+            return
+        for job, html in results.items():
+            self.disk_cache.put(self._disk_key(job), html.encode("utf-8"))
+
+    def highlight(self, job: HighlightJob) -> str:
+        """Return the HTML for ``job``, highlighting it if it isn't
+        already cached"""
+        if (html := self.get(job)) is None:
+            html = highlight_fortran(job)
+            self.update({job: html})
+        return html
+
+    def highlight_all(self, jobs: Iterable[HighlightJob], njobs: int) -> None:
+        """Highlight any of ``jobs`` not already in the cache, using
+        ``njobs`` worker processes if there is more than one"""
+        missing: List[HighlightJob] = [
+            job for job in dict.fromkeys(jobs) if self.get(job) is None
+        ]
+        if njobs > 1 and len(missing) > 1:
+            results = process_map(
+                highlight_fortran,
+                missing,
+                max_workers=njobs,
+                chunksize=max(1, len(missing) // (4 * njobs)),
+                desc="Highlighting source",
+            )
+        else:
+            results = map(highlight_fortran, missing)
+        self.update(dict(zip(missing, results)))
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+#
+#  md_convert.py
+#  This file is part of FORD.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+"""
+Converting documentation from Markdown in bulk: caching the results,
+and using several processes
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import markdown
+import pygments
+from tqdm.contrib.concurrent import process_map
+
+import ford
+import ford.cache
+
+# Converted HTML and the metadata found by the ``meta`` extension
+MarkdownResult = Tuple[str, Dict[str, List[str]]]
+# A text, or a text along with the texts converted before it since the
+# last reset (which can define references and footnotes it uses)
+MarkdownKey = Union[str, Tuple[str, ...]]
+
+
+class Markdown(markdown.Markdown):
+    """
+    A `markdown.Markdown` which remembers the arguments it was made
+    with, so that identical converters can be made in worker processes
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.init_kwargs = kwargs
+
+
+class CachedMarkdown:
+    """
+    Stands in for a Markdown converter, converting each distinct text
+    only once
+
+    Conversions are cached along with the texts converted before them
+    since the last `reset`, as the result may depend on those (for
+    example, through reference-style links). Nothing is cached before
+    the first reset, as the converter's state is unknown. Results can
+    also be stored in ``cache_dir``, so that they can be reused by
+    later runs, if ``md`` is a `Markdown` (otherwise we can't tell
+    whether it has been set up the same way as before).
+
+    Parameters
+    ----------
+    md
+        Markdown converter
+    cache_dir
+        Directory to store results in between runs
+
+    """
+
+    def __init__(self, md: markdown.Markdown, cache_dir: Optional[os.PathLike] = None):
+        self.md = md
+        self.results: Dict[MarkdownKey, MarkdownResult] = {}
+        self.Meta: Dict[str, List[str]] = {}
+        # Texts converted since the last reset, and those that ``md``
+        # has actually converted since it was last reset (which may be
+        # behind, if results came from the cache)
+        self._history: Optional[List[str]] = None
+        self._md_history: List[str] = []
+
+        self.disk_cache = None
+        if cache_dir and (config := _pickled_config(md)) is not None:
+            self.disk_cache = ford.cache.DiskCache(cache_dir, "markdown")
+            self._config_key = ford.cache.hash_key(
+                ford.__version__,
+                markdown.__version__,
+                pygments.__version__,
+                hashlib.sha256(config).hexdigest(),
+            )
+
+    def reset(self):
+        self.md.reset()
+        self._history = []
+        self._md_history = []
+        return self
+
+    def convert(self, text: str) -> str:
+        if self._history is None:
+            html = self.md.convert(text)
+            self.Meta = getattr(self.md, "Meta", {})
+            return html
+
+        previous = self._history
+        key: MarkdownKey = (*previous, text) if previous else text
+        self._history = [*previous, text]
+        result = self.get(key)
+        if result is None:
+            if self._md_history != previous:
+                # Bring the converter up to date with what came before
+                self.md.reset()
+                for previous_text in previous:
+                    self.md.convert(previous_text)
+            html = self.md.convert(text)
+            self._md_history = list(self._history)
+            result = (html, getattr(self.md, "Meta", {}))
+            self.update({key: result})
+
+        html, meta = result
+        # Callers modify the metadata they're given
+        self.Meta = {key: list(value) for key, value in meta.items()}
+        return html
+
+    def _disk_key(self, key: MarkdownKey) -> Optional[str]:
+        texts = (key,) if isinstance(key, str) else key
+        # Included files and environment variables might have changed
+        # since the last run, so these are only cached in memory
+        if self.disk_cache is None or any(
+            "{!" in text or "${" in text for text in texts
+        ):
+            return None
+        return ford.cache.hash_key(self._config_key, *texts)
+
+    def get(self, key: MarkdownKey) -> Optional[MarkdownResult]:
+        """Return the result of converting ``key``, if it is cached"""
+        if (result := self.results.get(key)) is not None:
+            return result
+        if (disk_key := self._disk_key(key)) is None:
+            return None
+        if (entry := self.disk_cache.get(disk_key)) is None:
+            return None
+        try:
+            html, meta = json.loads(entry)
+        except ValueError:
+            return None
+        result = self.results[key] = (html, meta)
+        return result
+
+    def update(self, results: Dict[MarkdownKey, MarkdownResult]) -> None:
+        """Add already converted texts to the cache"""
+        self.results.update(results)
+        for text, result in results.items():
+            if (key := self._disk_key(text)) is not None:
+                self.disk_cache.put(key, json.dumps(result).encode("utf-8"))
+
+    def convert_all(self, texts: Iterable[str], njobs: int) -> None:
+        """Convert any of ``texts`` not already in the cache, using
+        ``njobs`` worker processes if there is more than one"""
+        missing = [text for text in dict.fromkeys(texts) if self.get(text) is None]
+        if njobs > 1 and len(missing) > 1:
+            self.update(convert_in_parallel(self.md, missing, njobs))
+
+
+def _pickled_config(md: markdown.Markdown) -> Optional[bytes]:
+    """Return the pickled arguments ``md`` was made with, or None if it
+    isn't a `Markdown` or they can't be pickled"""
+    try:
+        return pickle.dumps(md.init_kwargs)
+    except (AttributeError, TypeError, pickle.PicklingError):
+        return None
+
+
+# Converters made in this (worker) process, keyed by their pickled
+# arguments
+_WORKER_CONVERTERS: Dict[bytes, markdown.Markdown] = {}
+
+
+def _convert_chunk(args: Tuple[bytes, List[str]]) -> List[MarkdownResult]:
+    config, texts = args
+    md = _WORKER_CONVERTERS.get(config)
+    if md is None:
+        md = _WORKER_CONVERTERS[config] = markdown.Markdown(**pickle.loads(config))
+    return [(md.reset().convert(text), getattr(md, "Meta", {})) for text in texts]
+
+
+def convert_in_parallel(
+    md: markdown.Markdown, texts: Iterable[str], njobs: int
+) -> Dict[str, MarkdownResult]:
+    """Convert each of ``texts`` with a copy of ``md`` in one of
+    ``njobs`` worker processes
+
+    Each distinct text is only converted once. Nothing is converted if
+    ``md`` can't be copied to other processes (that is, it isn't a
+    `Markdown`, or some of its extensions can't be pickled), in which
+    case an empty dict is returned.
+
+    Returns
+    -------
+    dict
+        The HTML and metadata for each text
+    """
+    config = _pickled_config(md)
+    if config is None:
+        return {}
+
+    texts = list(dict.fromkeys(texts))
+    chunksize = max(1, len(texts) // (4 * njobs))
+    chunks = [
+        (config, texts[start : start + chunksize])
+        for start in range(0, len(texts), chunksize)
+    ]
+    results = process_map(
+        _convert_chunk,
+        chunks,
+        max_workers=njobs,
+        desc="Converting documentation",
+    )
+    return dict(zip(texts, chain.from_iterable(results)))
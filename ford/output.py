@@ -24,15 +24,19 @@
 
 import sys
 import os
+import json
 import shutil
 import traceback
+from collections import ChainMap
 from itertools import chain
 import pathlib
 
 import jinja2
+from markdown_include.include import INC_SYNTAX
 
 from tqdm import tqdm
 
+import ford.cache
 import ford.sourceform
 import ford.tipue_search
 import ford.utils
@@ -55,6 +59,34 @@ env.tests["more_than_one"] = is_more_than_one
 
 USER_WRITABLE_ONLY = 0o755
 
+# Records which pages were written, and from what, for incremental builds
+MANIFEST_FILE = ".ford-manifest.json"
+MANIFEST_VERSION = 1
+
+# Attributes that `GraphManager` sets on the entities it draws graphs for
+GRAPH_ATTRIBUTES = (
+    "usesgraph",
+    "usedbygraph",
+    "inhergraph",
+    "inherbygraph",
+    "callsgraph",
+    "calledbygraph",
+    "afferentgraph",
+    "efferentgraph",
+)
+
+# Project-wide statement counts that every entity page quotes
+LINE_TOTALS = (
+    "mod_lines",
+    "proc_lines",
+    "file_lines",
+    "type_lines",
+    "type_lines_all",
+    "absint_lines",
+    "prog_lines",
+    "block_lines",
+)
+
 
 class Documentation(object):
     """
@@ -142,6 +174,8 @@ class Documentation(object):
             self.data["coloured_edges"],
             self.data["show_proc_parent"],
             save_graphs=bool(self.data.get("graph_dir", False)),
+            cache_dir=self.data.get("cache_dir"),
+            cache_size=int(self.data["graph_cache_size"]),
         )
 
         if graphviz_installed and data["graph"]:
@@ -158,7 +192,7 @@ class Documentation(object):
                 for item in entity_list:
                     self.graphs.register(item)
 
-            self.graphs.graph_all()
+            self.graphs.graph_all(self.njobs)
             project.callgraph = self.graphs.callgraph
             project.typegraph = self.graphs.typegraph
             project.usegraph = self.graphs.usegraph
@@ -169,6 +203,14 @@ class Documentation(object):
             project.usegraph = ""
             project.filegraph = ""
 
+        self.incremental = self.data["incremental"]
+        self.manifest = {}
+        self.fingerprints = {}
+        self.search_nodes = {}
+        if self.incremental:
+            self.manifest = self._read_manifest()
+            self.fingerprints = self._page_fingerprints(proj_docs)
+
         if data["search"]:
             url = "" if data["relative"] else data["project_url"]
             self.tipue = ford.tipue_search.Tipue_Search_JSON_Generator(
@@ -182,21 +224,156 @@ class Documentation(object):
                 unit="",
                 desc="Creating search index",
             ):
-                self.tipue.create_node(p.html, p.loc, p.meta)
+                loc = _manifest_key(p)
+                node = self.manifest.get(loc, {}).get("search")
+                if node is not None and self._is_unchanged(p):
+                    self.tipue.json_nodes.append(node)
+                else:
+                    self.tipue.create_node(p.html, p.loc, p.meta)
+                    node = self.tipue.json_nodes[-1]
+                self.search_nodes[loc] = node
             print("")
 
+    def _read_manifest(self) -> dict:
+        """Read the manifest of pages written by a previous incremental
+        build, or return an empty dict if there isn't a usable one"""
+        manifest_path = self.data["output_dir"] / MANIFEST_FILE
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest.get("pages", {})
+
+    def _write_manifest(self):
+        pages = {
+            loc: {"fingerprint": fingerprint, "search": self.search_nodes.get(loc)}
+            for loc, fingerprint in self.fingerprints.items()
+        }
+        manifest_path = self.data["output_dir"] / MANIFEST_FILE
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "pages": pages}, f)
+
+    def _is_unchanged(self, page) -> bool:
+        """Is ``page`` already on disk, written from the same inputs?"""
+        loc = _manifest_key(page)
+        previous = self.manifest.get(loc, {}).get("fingerprint")
+        return previous == self.fingerprints.get(loc) and page.outfile.is_file()
+
+    def _page_fingerprints(self, proj_docs: str) -> dict:
+        """Work out a fingerprint of the inputs of each entity and
+        static page, so that incremental builds can skip those which
+        haven't changed.
+
+        An entity page depends on the source file the entity is in,
+        the source files of any entities it refers to (for example,
+        through ``uses``, ``calls`` or ``extends``), any Markdown files
+        included in those with ``{!file!}``, and its graphs. All
+        pages also depend on the settings, the project's entities and
+        their locations (for the navigation and links), and the
+        project-wide statement counts.
+        """
+        file_digests = {}
+        md_base_dir = self.data.get("md_base_dir", self.data["base_dir"])
+
+        def file_digest(entity) -> str:
+            path = _source_path(entity)
+            if path is None:
+                return f"external:{entity.name}"
+            if path not in file_digests:
+                try:
+                    included = getattr(_source_root(entity), "included_files", [])
+                    sources = [path, *included]
+                    file_digests[path] = ford.cache.hash_key(
+                        [ford.cache.hash_file(name) for name in sources],
+                        [
+                            _hash_or_missing(name)
+                            for name in _markdown_includes(
+                                sources, md_base_dir, self.data["encoding"]
+                            )
+                        ],
+                    )
+                except OSError:
+                    file_digests[path] = "missing"
+            return file_digests[path]
+
+        shape = set()
+        page_inputs = {}
+        for page in self.docs:
+            subtree, dependencies = _entity_dependencies(page.obj)
+            graphs = []
+            for entity in subtree:
+                shape.add(_entity_location(entity))
+                for attribute in GRAPH_ATTRIBUTES:
+                    graph = getattr(entity, attribute, None)
+                    if graph is not None and hasattr(graph, "dot"):
+                        graphs.append(graph.dot.source)
+                        graphs.extend(node.ident for node in graph.hop_nodes)
+            for dependency in dependencies:
+                shape.add(_entity_location(dependency))
+            page_inputs[_manifest_key(page)] = (
+                type(page).__name__,
+                file_digest(page.obj),
+                sorted({file_digest(entity) for entity in dependencies}),
+                graphs,
+            )
+
+        page_tree = [(str(page.loc), page.obj.title) for page in self.pagetree]
+        for page in self.pagetree:
+            node = page.obj
+            page_inputs[_manifest_key(page)] = (
+                page_tree,
+                node.title,
+                node.author,
+                node.date,
+                node.contents,
+                node.copy_subdir,
+                node.files,
+            )
+
+        # Static pages are accounted for above
+        ignored_settings = ["pages"]
+        if self.data["relative"]:
+            ignored_settings.append("project_url")
+        if str(self.data.get("print_creation_date", "")).lower() != "true":
+            ignored_settings.append("creation_date")
+        settings = {
+            key: value
+            for key, value in self.data.items()
+            if key not in ignored_settings
+        }
+        global_digest = ford.cache.hash_key(
+            ford.__version__,
+            settings,
+            proj_docs,
+            sorted(shape),
+            [getattr(self.project, total, None) for total in LINE_TOTALS],
+        )
+
+        return {
+            loc: ford.cache.hash_key(global_digest, inputs)
+            for loc, inputs in page_inputs.items()
+        }
+
     def writeout(self):
         out_dir: pathlib.Path = self.data["output_dir"]
         print(f"Writing documentation to '{out_dir}'...")
         # Remove any existing file/directory. This avoids errors coming from
         # `shutils.copytree` for Python < 3.8, where we can't explicitly ignore them
-        if out_dir.is_file():
+        # In incremental mode, keep what's there if it came from a
+        # previous build
+        incremental = bool(self.manifest) and out_dir.is_dir()
+        if incremental:
+            pass
+        elif out_dir.is_file():
             out_dir.unlink()
         else:
             shutil.rmtree(out_dir, ignore_errors=True)
 
         try:
-            out_dir.mkdir(USER_WRITABLE_ONLY, parents=True)
+            out_dir.mkdir(USER_WRITABLE_ONLY, parents=True, exist_ok=incremental)
         except Exception as e:
             print(f"Error: Could not create output directory. {e.args[0]}")
 
@@ -211,19 +388,23 @@ class Documentation(object):
             "src",
             "blockdata",
         ]:
-            (out_dir / directory).mkdir(USER_WRITABLE_ONLY)
+            (out_dir / directory).mkdir(USER_WRITABLE_ONLY, exist_ok=incremental)
 
         for directory in ["css", "fonts", "js"]:
-            copytree(loc / directory, out_dir / directory)
+            copytree(loc / directory, out_dir / directory, dirs_exist_ok=incremental)
 
         if self.data["graph"]:
             self.graphs.output_graphs(self.njobs)
         if self.data["search"]:
-            copytree(loc / "tipuesearch", out_dir / "tipuesearch")
+            copytree(
+                loc / "tipuesearch", out_dir / "tipuesearch", dirs_exist_ok=incremental
+            )
             self.tipue.print_output()
 
         try:
-            copytree(self.data["media_dir"], out_dir / "media")
+            copytree(
+                self.data["media_dir"], out_dir / "media", dirs_exist_ok=incremental
+            )
         except OSError as e:
             print(
                 f"Warning: error copying media directory {self.data['media_dir']}, {e}"
@@ -253,9 +434,27 @@ class Documentation(object):
                 mathjax_path / os.path.basename(self.data["mathjax_config"]),
             )
 
-        for p in chain(self.docs, self.lists, self.pagetree, [self.index, self.search]):
+        written = 0
+        for p in chain(self.docs, self.pagetree):
+            if incremental and self._is_unchanged(p):
+                if isinstance(p, PagetreePage):
+                    p.copy_files()
+                continue
+            p.writeout()
+            written += 1
+
+        for p in chain(self.lists, [self.index, self.search]):
             p.writeout()
 
+        if incremental:
+            print(f"Rewrote {written} of {len(self.docs) + len(self.pagetree)} pages")
+            # Remove pages for things that no longer exist
+            for stale in set(self.manifest) - set(self.fingerprints):
+                (out_dir / stale).unlink(missing_ok=True)
+
+        if self.incremental:
+            self._write_manifest()
+
         print(f"\nBrowse the generated documentation: file://{out_dir}/index.html")
 
 
@@ -511,11 +710,18 @@ class PagetreePage(BasePage):
         if self.obj.filename == "index":
             (self.page_dir / self.obj.location).mkdir(USER_WRITABLE_ONLY, exist_ok=True)
         super(PagetreePage, self).writeout()
+        self.copy_files()
 
+    def copy_files(self):
+        """Copy any extra files and directories alongside this page"""
         for item in self.obj.copy_subdir:
             item_path = self.data["page_dir"] / self.obj.location / item
             try:
-                copytree(item_path, self.page_dir / self.obj.location / item)
+                copytree(
+                    item_path,
+                    self.page_dir / self.obj.location / item,
+                    dirs_exist_ok=True,
+                )
             except Exception as e:
                 print(
                     f"Warning: could not copy directory '{item_path}'. Error: {e.args[0]}"
@@ -529,11 +735,135 @@ class PagetreePage(BasePage):
                 print(f"Warning: could not copy file '{item_path}'. Error: {e.args[0]}")
 
 
-def copytree(src: pathlib.Path, dst: pathlib.Path) -> None:
+def copytree(src: pathlib.Path, dst: pathlib.Path, dirs_exist_ok: bool = False) -> None:
     """Wrapper around `shutil.copytree` that:
     a) doesn't try to set xattrs; and
     b) ensures modification time is time of current FORD run
     """
-    shutil.copytree(src, dst, copy_function=shutil.copy)
+    shutil.copytree(src, dst, copy_function=shutil.copy, dirs_exist_ok=dirs_exist_ok)
     for file in dst.rglob("*"):
         file.touch()
+
+
+def _manifest_key(page) -> str:
+    """Key for ``page`` in the incremental build manifest: its
+    location relative to the output directory"""
+    return pathlib.Path(page.loc).as_posix()
+
+
+def _source_root(entity):
+    """Return the source file (or other top-level object) containing
+    ``entity``"""
+    while getattr(entity, "parent", None) is not None:
+        entity = entity.parent
+    return entity
+
+
+def _source_path(entity):
+    """Return the path of the source file containing ``entity``, or
+    None for external entities"""
+    root = _source_root(entity)
+    if isinstance(root, ford.sourceform.ExternalSourceFile):
+        return None
+    return getattr(root, "path", None)
+
+
+def _markdown_includes(paths, base_dir, encoding) -> list:
+    """Find the files included with ``{!file!}`` in the docstrings in
+    ``paths``, and any files that those include in turn"""
+    found = set()
+    pending = list(paths)
+    while pending:
+        try:
+            with open(pending.pop(), "r", encoding=encoding, errors="replace") as f:
+                text = f.read()
+        except OSError:
+            continue
+        for match in INC_SYNTAX.finditer(text):
+            filename = os.path.expanduser(match[1])
+            if not os.path.isabs(filename):
+                filename = os.path.normpath(os.path.join(base_dir, filename))
+            if filename not in found:
+                found.add(filename)
+                pending.append(filename)
+    return sorted(found)
+
+
+def _hash_or_missing(filename) -> str:
+    try:
+        return ford.cache.hash_file(filename)
+    except OSError:
+        return "missing"
+
+
+def _entity_location(entity) -> tuple:
+    """Where links to ``entity`` point to"""
+    return tuple(
+        str(item)
+        for item in (type(entity).__name__, entity.name, entity.get_dir(), entity.ident)
+    )
+
+
+def _is_descendant(entity, ancestor) -> bool:
+    while entity is not None:
+        entity = getattr(entity, "parent", None)
+        if entity is ancestor:
+            return True
+    return False
+
+
+def _entity_dependencies(entity):
+    """Find the entities that might appear on the page for ``entity``
+
+    Returns a list of ``entity`` and all its descendants, and a list of
+    the other entities that any of those refer to (through ``uses``,
+    ``calls``, ``extends``, variable types, and so on). Parent types
+    are followed all the way up, as their components are inherited.
+    """
+    subtree = []
+    dependencies = {}
+    seen = {id(entity)}
+    seen_collections = set()
+    stack = [entity]
+
+    def entities_in(value):
+        if isinstance(value, ford.sourceform.FortranBase):
+            return [value]
+        if isinstance(value, ChainMap):
+            # Scopes share most of their maps, so visit each only once
+            return [item for mapping in value.maps for item in entities_in(mapping)]
+        if isinstance(value, (list, tuple, set, dict)):
+            if id(value) in seen_collections:
+                return []
+            seen_collections.add(id(value))
+            items = value.values() if isinstance(value, dict) else value
+            return [
+                item for item in items if isinstance(item, ford.sourceform.FortranBase)
+            ]
+        return []
+
+    while stack:
+        current = stack.pop()
+        subtree.append(current)
+        for value in vars(current).values():
+            for item in entities_in(value):
+                if id(item) in seen:
+                    continue
+                seen.add(id(item))
+                if _is_descendant(item, entity):
+                    stack.append(item)
+                else:
+                    dependencies[id(item)] = item
+
+    for dependency in list(dependencies.values()):
+        parent_type = getattr(dependency, "extends", None)
+        ancestors = set()
+        while (
+            isinstance(parent_type, ford.sourceform.FortranBase)
+            and id(parent_type) not in ancestors
+        ):
+            ancestors.add(id(parent_type))
+            dependencies[id(parent_type)] = parent_type
+            parent_type = getattr(parent_type, "extends", None)
+
+    return subtree, list(dependencies.values())
@@ -25,6 +25,8 @@
 
 import sys
 import re
+from collections import deque
+from typing import NamedTuple
 import ford.utils
 import subprocess
 
@@ -36,43 +38,229 @@ import os.path
 
 from ford.fixed2free2 import convertToFree
 
+QUOTE_RE = re.compile(r"['\"]")
+COMMENT_OR_QUOTE_RE = re.compile(r"[!'\"]")
+
+
+class _QuoteState:
+    """
+    Tracks whether the text fed to it so far ends inside a string
+    literal. Only the quote characters are looked at, so this is cheap
+    to update as a line gets longer.
+    """
+
+    __slots__ = ("current_quote", "previous_char")
+
+    def __init__(self):
+        self.current_quote = None
+        self.previous_char = None
+
+    @property
+    def in_quote(self) -> bool:
+        return self.current_quote is not None
+
+    def feed(self, text: str):
+        for match in QUOTE_RE.finditer(text):
+            char = match.group()
+            start = match.start()
+            previous_char = text[start - 1] if start > 0 else self.previous_char
+            # Doubling-up a quote character doesn't make us leave a quote
+            if char == previous_char:
+                continue
+            # If the current character is the same as the starting quote character
+            # then we have left the quote (as we've dealt with doubled-quotes)
+            if char == self.current_quote:
+                self.current_quote = None
+            # If we weren't in a quote before, we are now
+            elif self.current_quote is None:
+                self.current_quote = char
+        if text:
+            self.previous_char = text[-1]
+
 
 def _contains_unterminated_string(string: str) -> bool:
     """Return True if `string` contains an unterminated quote"""
-    in_quote = False
-    current_quote = None
-    previous_char = None
-    for char in string:
-        # Non-quote characters don't bother us
-        if not (char == "'" or char == '"'):
-            previous_char = char
-            continue
-        # Doubling-up a quote character doesn't make us leave a quote
-        if char == previous_char:
-            previous_char = char
-            continue
-        # If the current character is the same as the starting quote character
-        # then we have left the quote (as we've dealt with doubled-quotes)
-        if char == current_quote:
-            in_quote = False
-            current_quote = None
-            previous_char = char
-            continue
-        # If we weren't in a quote before, we are now
-        if not in_quote:
-            current_quote = char
-            in_quote = True
-        previous_char = char
-    return in_quote
-
-
-def _match_docmark(docmark, line: str, in_quote: bool):
-    """If docmark exists, and we're not in a string literal, try to match it"""
-    if in_quote:
+    state = _QuoteState()
+    state.feed(string)
+    return state.in_quote
+
+
+def _comment_start(line: str) -> int:
+    """Return the index of the first `!` in `line` that isn't in a string
+    literal, or -1 if there isn't one (or there is an unterminated
+    string before it)"""
+    if "!" not in line:
+        return -1
+    position = 0
+    while match := COMMENT_OR_QUOTE_RE.search(line, position):
+        char = match.group()
+        if char == "!":
+            return match.start()
+        # Skip to the end of the string literal
+        position = line.find(char, match.end()) + 1
+        if position == 0:
+            return -1
+    return -1
+
+
+def _match_docmark(docmark: str, line: str, comment: int, in_quote: bool):
+    """If docmark exists, we're not in a string literal, and the comment
+    starting at index ``comment`` of ``line`` starts with it, return
+    the comment"""
+    if in_quote or not docmark or comment < 0:
+        return None
+    if not line.startswith(docmark, comment + 1):
+        return None
+    return line[comment:].rstrip("\n")
+
+
+def linemarker_file(line, filename):
+    """
+    If `line` is a preprocessor line marker naming a file other than
+    `filename`, return the absolute path of that file, if it exists
+    """
+    match = FortranReader.LINEMARKER_RE.match(line.strip())
+    if not match:
         return None
-    if not docmark:
+    name = os.path.abspath(match.group(2))
+    if name != os.path.abspath(filename) and os.path.isfile(name):
+        return name
+    return None
+
+
+def preprocessor_command(preprocessor, macros, inc_dirs, filename):
+    """Return the command line to preprocess ``filename`` with"""
+    # Populate the macro definition and include directory path from
+    # the input lists.  To define a macro we prepend '-D' and for an
+    # include path we prepend '-I'.  It's important that we do not
+    # prepend to an empty string as 'cpp ... -D file.F90' doesn't do
+    # what is desired; use filter to remove these.
+    macros = ["-D" + mac.strip() for mac in filter(None, macros)]
+    incdirs = [f"-I{d}" for d in inc_dirs]
+    return preprocessor + macros + incdirs + [filename]
+
+
+def preprocess(filename, preprocessor, macros=[], inc_dirs=[], encoding="utf-8"):
+    """Run ``preprocessor`` on ``filename``, returning the output, or
+    None if it failed"""
+    preprocessor = preprocessor_command(preprocessor, macros, inc_dirs, filename)
+    command = " ".join(preprocessor)
+    print(f"Preprocessing {filename}")
+    try:
+        out = subprocess.run(
+            preprocessor, encoding=encoding, check=True, capture_output=True
+        )
+    except subprocess.CalledProcessError as err:
+        print(f"Warning: error when preprocessing {filename}:\n{command}\n{err.stderr}")
+        return None
+    if out.stderr:
+        print(f"Warning when preprocessing {filename}:\n{command}\n{out.stderr}")
+    return out.stdout
+
+
+class SourceSpan(NamedTuple):
+    """The lines of a file that something was read from"""
+
+    path: str
+    #: Number of the first line, counting from one
+    first_line: int
+    #: Number of the last line, inclusive
+    last_line: int
+
+
+class IncludeCache:
+    """
+    The files included by Fortran `include` statements, so that each one
+    is only searched for and read once, however many files include it.
+    One of these can be shared by all the readers in a project.
+    """
+
+    def __init__(self):
+        # Path found for each (search directories, name)
+        self._paths = {}
+        # Lines read from each file, keyed by the path, its modification
+        # time and the reader settings, along with the modification
+        # times of any files it included in turn
+        self._lines = {}
+
+    def clear(self):
+        self._paths.clear()
+        self._lines.clear()
+
+    def find(self, name, search_dirs):
+        """Return the absolute path of the include file ``name`` in the
+        first of ``search_dirs`` that contains it, or None"""
+        key = (tuple(search_dirs), name)
+        if key not in self._paths:
+            self._paths[key] = None
+            for directory in search_dirs:
+                path = os.path.abspath(
+                    os.path.expanduser(os.path.join(directory, name))
+                )
+                if os.path.isfile(path):
+                    self._paths[key] = path
+                    break
+        return self._paths[key]
+
+    def read(self, path, reader):
+        """Return an iterator over the lines of the file ``path``, read
+        with the same settings as ``reader``, and the `SourceSpan` each
+        came from. Files it includes are added to
+        ``reader.included_files`` once they are known."""
+        try:
+            key = (
+                path,
+                os.stat(path).st_mtime_ns,
+                reader.docmark,
+                reader.predocmark,
+                reader.docmark_alt,
+                reader.predocmark_alt,
+                reader.fixed,
+                reader.length_limit,
+                tuple(reader.inc_dirs),
+                reader.encoding,
+            )
+        except OSError:
+            key = None
+
+        cached = self._lines.get(key)
+        if cached is not None and all(
+            _mtime(name) == mtime for name, mtime in cached[1].items()
+        ):
+            lines, included_files = cached
+            reader.included_files.update(included_files)
+            return iter(lines)
+
+        included = FortranReader(
+            path,
+            reader.docmark,
+            reader.predocmark,
+            reader.docmark_alt,
+            reader.predocmark_alt,
+            reader.fixed,
+            reader.length_limit,
+            inc_dirs=reader.inc_dirs,
+            encoding=reader.encoding,
+            include_cache=self,
+        )
+        return self._record(key, included, reader)
+
+    def _record(self, key, included, reader):
+        lines = []
+        for line in included:
+            lines.append((line, included.statement_span))
+            yield lines[-1]
+        reader.included_files.update(included.included_files)
+        if key is not None:
+            included_files = {name: _mtime(name) for name in included.included_files}
+            self._lines[key] = (tuple(lines), included_files)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
         return None
-    return docmark.match(line)
 
 
 class FortranReader(object):
@@ -93,11 +281,13 @@ class FortranReader(object):
     """
 
     # Regexes
-    COM_RE = re.compile(r"^([^\"'!]|('[^']*')|(\"[^\"]*\"))*(!.*)$")
     SC_RE = re.compile(r"^([^;]*);(.*)$")
     # DECL_RE = re.compile(r"^(.*)\:\:.*(.*&)(.*$)")
     # DECL_RE = re.compile(r"^(.*)\:\: *(([a-zA-Z].*),)?(.*&)(.*$)")
     DECL_RE = re.compile(r"^(.*)\:\: *([a-zA-Z].*)?( *&)(.*$)")
+    CONTINUED_DECL_RE = re.compile(r", *&")
+    # Preprocessor line markers, e.g. '# 1 "include.h"'
+    LINEMARKER_RE = re.compile(r'^#\s*(?:line\s+)?(\d+)\s+"([^"]+)"')
 
     def __init__(
         self,
@@ -112,6 +302,8 @@ class FortranReader(object):
         macros=[],
         inc_dirs=[],
         encoding="utf-8",
+        preprocessed=None,
+        include_cache=None,
     ):
         self.name = filename
 
@@ -129,34 +321,22 @@ class FortranReader(object):
         if predocmark == predocmark_alt != "":
             raise Exception("Error: predocmark and predocmark_alt are the same.")
 
-        if preprocessor:
-            # Populate the macro definition and include directory path from
-            # the input lists.  To define a macro we prepend '-D' and for an
-            # include path we prepend '-I'.  It's important that we do not
-            # prepend to an empty string as 'cpp ... -D file.F90' doesn't do
-            # what is desired; use filter to remove these.
-            macros = ["-D" + mac.strip() for mac in filter(None, macros)]
-            incdirs = [f"-I{d}" for d in inc_dirs]
-            preprocessor = preprocessor + macros + incdirs + [filename]
-            command = " ".join(preprocessor)
-            print(f"Preprocessing {filename}")
-            try:
-                out = subprocess.run(
-                    preprocessor, encoding=encoding, check=True, capture_output=True
-                )
-                if out.stderr:
-                    print(
-                        f"Warning when preprocessing {filename}:\n{command}\n{out.stderr}"
-                    )
-                self.reader = StringIO(out.stdout)
-            except subprocess.CalledProcessError as err:
-                print(
-                    f"Warning: error when preprocessing {filename}:\n{command}\n{err.stderr}"
-                )
+        # Contents of the file as read from disk, kept so that they don't
+        # need reading again for the source pages. None if we only read
+        # the preprocessor's output
+        self.raw_src = None
+        if preprocessor and preprocessed is None:
+            preprocessed = preprocess(
+                filename, preprocessor, macros, inc_dirs, encoding
+            )
+            if preprocessed is None:
                 print("Reverting to unpreprocessed file")
-                self.reader = open(filename, "r", encoding=encoding)
+        if preprocessor and preprocessed is not None:
+            self.reader = StringIO(preprocessed)
         else:
-            self.reader = open(filename, "r", encoding=encoding)
+            with open(filename, "r", encoding=encoding) as f:
+                self.raw_src = f.read()
+            self.reader = StringIO(self.raw_src)
 
         if fixed:
             self.reader = convertToFree(self.reader, length_limit)
@@ -166,50 +346,36 @@ class FortranReader(object):
         self.fixed = fixed
         self.length_limit = length_limit
         self.inc_dirs = inc_dirs
-        self.docbuffer = []
-        self.pending = []
+        self.include_cache = (
+            include_cache if include_cache is not None else IncludeCache()
+        )
+        self.docbuffer = deque()
+        # Lines waiting to be returned, and readers for included files
+        # whose lines come before any that follow them
+        self.pending = deque()
+        # Other files whose contents were read, through either Fortran
+        # or preprocessor includes
+        self.included_files = set()
         self.prevdoc = False
         self.reading_alt = 0
         self.docmark = docmark
-        self.doc_re = re.compile(
-            r"^([^\"'!]|('[^']*')|(\"[^\"]*\"))*(!{}.*)$".format(re.escape(docmark))
-        )
         self.predocmark = predocmark
         self.encoding = encoding
-        if len(self.predocmark) != 0:
-            self.predoc_re = re.compile(
-                r"^([^\"'!]|('[^']*')|(\"[^\"]*\"))*(!{}.*)$".format(
-                    re.escape(predocmark)
-                )
-            )
-        else:
-            self.predoc_re = None
         self.docmark_alt = docmark_alt
-        if len(self.docmark_alt) != 0:
-            self.doc_alt_re = re.compile(
-                r"^([^\"'!]|('[^']*')|(\"[^\"]*\"))*(!{}.*)$".format(
-                    re.escape(docmark_alt)
-                )
-            )
-        else:
-            self.doc_alt_re = None
         self.predocmark_alt = predocmark_alt
-        if len(self.predocmark_alt) != 0:
-            self.predoc_alt_re = re.compile(
-                r"^([^\"'!]|('[^']*')|(\"[^\"]*\"))*(!{}.*)$".format(
-                    re.escape(predocmark_alt)
-                )
-            )
-        else:
-            self.predoc_alt_re = None
 
+        # Where the statement most recently returned was read from. Line
+        # numbers follow any preprocessor line markers, so may be in
+        # another file (see `_record_linemarker`)
+        self.statement_span = None
         self.line_number = 0
+        self._current_file = filename
 
     def __iter__(self):
         return self
 
     def pass_back(self, line):
-        self.pending.insert(0, line)
+        self.pending.appendleft(line)
 
     # for Python 2:
     def next(self):
@@ -217,15 +383,14 @@ class FortranReader(object):
 
     def __next__(self):  # Python 3
         # If there are any lines waiting to be returned, return them
-        if len(self.pending) != 0:
-            self.include()
+        if (line := self._next_pending()) is not None:
             self.prevdoc = False
-            return self.pending.pop(0)
+            return line
         # If there are any documentation lines waiting to be returned, return them.
         # This can happen for inline and preceding docs
         elif len(self.docbuffer) != 0:
             self.prevdoc = True
-            return self.docbuffer.pop(0)
+            return self.docbuffer.popleft()
 
         # Loop through the source code until you have a complete line (including
         # all line continuations), or a complete preceding doc block
@@ -234,29 +399,36 @@ class FortranReader(object):
         reading_predoc = False
         reading_predoc_alt = 0
         linebuffer = ""
+        first_line = None
+        # Whether `linebuffer` ends inside a string literal
+        quotes = _QuoteState()
 
         while not done:
             line = next(self.reader)
 
             self.line_number += 1
 
-            in_quote = _contains_unterminated_string(linebuffer)
+            in_quote = quotes.in_quote
 
             if len(line.strip()) > 0 and line.strip()[0] == "#":
+                self._record_linemarker(line)
                 continue
 
+            # Find where any comment starts, so that we only have to
+            # scan the line once to find all of the different docmarks
+            comment = _comment_start(line)
+
             # Capture any preceding documentation comments
-            match = _match_docmark(self.predoc_re, line, in_quote)
-            if match:
+            doc = _match_docmark(self.predocmark, line, comment, in_quote)
+            if doc:
                 # Switch to predoc: following comment lines are predoc until the end of the block
                 reading_predoc = True
                 self.reading_alt = 0
                 reading_predoc_alt = 0
                 # Substitute predocmark with docmark
-                tmp = match.group(4)
-                tmp = tmp[:1] + self.docmark + tmp[1 + len(self.predocmark) :]
+                tmp = doc[:1] + self.docmark + doc[1 + len(self.predocmark) :]
                 self.docbuffer.append(tmp)
-                if len(line[0 : match.start(4)].strip()) > 0:
+                if len(line[0:comment].strip()) > 0:
                     raise Exception(
                         "Preceding documentation lines can not be inline: {}".format(
                             line
@@ -264,36 +436,34 @@ class FortranReader(object):
                     )
 
             # Check for alternate preceding documentation
-            match = _match_docmark(self.predoc_alt_re, line, in_quote)
-            if match:
+            doc = _match_docmark(self.predocmark_alt, line, comment, in_quote)
+            if doc:
                 # Switch to doc_alt: following comment lines are documentation until end of the block
                 reading_predoc_alt = 1
                 self.reading_alt = 0
                 reading_predoc = False
                 # Substitute predocmark_alt with docmark
-                tmp = match.group(4)
-                tmp = tmp[:1] + self.docmark + tmp[1 + len(self.predocmark_alt) :]
+                tmp = doc[:1] + self.docmark + doc[1 + len(self.predocmark_alt) :]
                 self.docbuffer.append(tmp)
-                if len(line[0 : match.start(4)].strip()) > 0:
+                if len(line[0:comment].strip()) > 0:
                     raise RuntimeError(
-                        f"In file {self.name}\n{self.line_number}|  {line.strip()}\n"
-                        f"{'^':>{len(str(self.line_number)) + match.start(4) + 4}}\n"
+                        f"In file {self._current_file}\n{self.line_number}|  {line.strip()}\n"
+                        f"{'^':>{len(str(self.line_number)) + comment + 4}}\n"
                         f"Preceding alternate documentation lines can not be inline\n"
                         f"Use the docmark '!{self.docmark}' instead"
                     )
 
             # Check for alternate succeeding documentation
-            match = _match_docmark(self.doc_alt_re, line, in_quote)
-            if match:
+            doc = _match_docmark(self.docmark_alt, line, comment, in_quote)
+            if doc:
                 # Switch to doc_alt: following comment lines are documentation until end of the block
                 self.reading_alt = 1
                 reading_predoc = False
                 reading_predoc_alt = 0
                 # Substitute predocmark_alt with docmark
-                tmp = match.group(4)
-                tmp = tmp[:1] + self.docmark + tmp[1 + len(self.docmark_alt) :]
+                tmp = doc[:1] + self.docmark + doc[1 + len(self.docmark_alt) :]
                 self.docbuffer.append(tmp)
-                if len(line[0 : match.start(4)].strip()) > 0:
+                if len(line[0:comment].strip()) > 0:
                     raise Exception(
                         "Alternate documentation lines can not be inline: {}".format(
                             line
@@ -301,12 +471,16 @@ class FortranReader(object):
                     )
 
             # print(line)
-            match = self.DECL_RE.match(line)
+            # Only lines with both of these can be continued declarations
+            if "::" in line and "&" in line:
+                match = self.DECL_RE.match(line)
+            else:
+                match = None
             if match and not line.strip().startswith("!"):
                 # print('DDD ',match.groups())
                 tmp = match.group(1)
-                if len(tmp.strip()) > 0 and not re.search(
-                    "^!|^PROCEDURE|^GENERIC", tmp.strip()
+                if len(tmp.strip()) > 0 and not tmp.strip().startswith(
+                    ("!", "PROCEDURE", "GENERIC")
                 ):
                     self.continued_decl = True
                     self.decl_type = tmp.strip()
@@ -320,6 +494,7 @@ class FortranReader(object):
                             "",
                             line.strip(),
                         )
+                        comment = _comment_start(line)
                     else:
                         self.docbuffer.append("!" + self.docmark)
                         continue
@@ -327,12 +502,13 @@ class FortranReader(object):
                     # continue
 
             # Capture any documentation comments
-            match = _match_docmark(self.doc_re, line, in_quote)
-            if match:
+            doc = _match_docmark(self.docmark, line, comment, in_quote)
+            if doc:
                 self.reading_alt = 0
                 reading_predoc_alt = 0
-                self.docbuffer.append(match.group(4))
-                line = line[0 : match.start(4)]
+                self.docbuffer.append(doc)
+                line = line[0:comment]
+                comment = -1
 
             if len(line.strip()) == 0 or line.strip()[0] != "!":
                 self.reading_alt = 0
@@ -341,21 +517,20 @@ class FortranReader(object):
                 reading_predoc_alt = 0
 
             # Remove any regular comments, unless following an alternative (pre)docmark
-            match = _match_docmark(self.COM_RE, line, in_quote)
-            if match:
+            if not in_quote and comment >= 0:
                 if (reading_predoc_alt > 1 or self.reading_alt > 1) and len(
-                    line[0 : match.start(4)].strip()
+                    line[0:comment].strip()
                 ) == 0:
-                    tmp = match.group(4)
+                    tmp = line[comment:].rstrip("\n")
                     tmp = tmp[:1] + self.docmark + tmp[1:]
                     self.docbuffer.append(tmp)
-                line = line[0 : match.start(4)]
+                line = line[0:comment]
             line = line.strip()
 
             if self.decl_type != "":
                 # print("BBB " + line.strip())
-                if re.search("^&( *!)?", line.strip()):
-                    line = re.sub("^&", "", line.strip())
+                if line.strip().startswith("&"):
+                    line = line.strip()[1:]
                     # continue
                 # print(line)
                 # if len(line.strip()) > 0 and line.strip()[0] == "&":
@@ -367,11 +542,11 @@ class FortranReader(object):
                         #   continue
                     if self.continued_decl:
                         # continued = False
-                        if re.search(", *&", line):
+                        if self.CONTINUED_DECL_RE.search(line):
                             line = (
                                 self.decl_type
                                 + " :: "
-                                + re.sub(", *&", "", line.strip())
+                                + self.CONTINUED_DECL_RE.sub("", line.strip())
                             )
                         else:
                             line = self.decl_type + " :: " + line.strip()
@@ -389,6 +564,8 @@ class FortranReader(object):
                     # ~ self.prevdoc = False
                     self.docbuffer.append("!" + self.docmark)
             else:
+                if first_line is None:
+                    first_line = self.line_number
                 reading_predoc = False
                 reading_predoc_alt = 0
                 self.reading_alt = 0
@@ -414,6 +591,7 @@ class FortranReader(object):
                         )
                 else:
                     linebuffer = linebuffer.strip() + " "
+                    quotes.previous_char = " "
                 # Check if line will be continued
                 if line[-1] == "&":
                     continued = True
@@ -429,6 +607,7 @@ class FortranReader(object):
 
             # Add this line to the buffer then check whether we're done here
             linebuffer += line
+            quotes.feed(line)
             # ~ print(((len(self.docbuffer) > 0) or (len(linebuffer) > 0)), not continued, not reading_predoc, (reading_predoc_alt == 0))
             done = (
                 ((len(self.docbuffer) > 0) or (len(linebuffer) > 0))
@@ -437,60 +616,93 @@ class FortranReader(object):
                 and (reading_predoc_alt == 0)
             )
 
+        if first_line is not None:
+            self.statement_span = SourceSpan(
+                self._current_file, first_line, self.line_number
+            )
+        else:
+            self.statement_span = None
+
         # Split buffer with semicolons
         # ~ print(count,linebuffer,len(linebuffer))
         frags = ford.utils.quote_split(";", linebuffer)
         self.pending.extend([s.strip() for s in frags if len(s) > 0])
 
         # Return the line
-        if len(self.pending) > 0:
-            self.include()
+        if (line := self._next_pending()) is not None:
             self.prevdoc = False
-            return self.pending.pop(0)
+            return line
+        elif len(self.docbuffer) == 0:
+            # Nothing to return yet, e.g. the line included an empty file
+            return next(self)
         else:
-            tmp = self.docbuffer.pop(0)
+            tmp = self.docbuffer.popleft()
             if tmp != "!" + self.docmark:
                 self.prevdoc = True
             return tmp
 
+    def _next_pending(self):
+        """
+        Remove and return the next line from the pending buffer, reading
+        it from an included file if need be. Returns None if there are
+        no pending lines.
+        """
+        while len(self.pending) != 0:
+            item = self.pending[0]
+            if not isinstance(item, str):
+                # Lines of an included file
+                try:
+                    line, self.statement_span = next(item)
+                    return line
+                except StopIteration:
+                    self.pending.popleft()
+                    continue
+            if not self.include():
+                return self.pending.popleft()
+        return None
+
     def include(self):
         """
-        If the next line is an include statement, inserts the contents
-        of the included file into the pending buffer.
+        If the next line is an include statement, replaces it in the
+        pending buffer with the lines of the included file, which are
+        read as they are needed. Returns True if it did so.
         """
-        if len(self.pending) == 0 or not self.pending[0].lower().startswith("include "):
-            return
-        curpending = self.pending.pop(0)
+        if len(self.pending) == 0 or not isinstance(self.pending[0], str):
+            return False
+        if not self.pending[0].lower().startswith("include "):
+            return False
+        curpending = self.pending.popleft()
         name = curpending[8:].strip()[1:-1]
-        for b in [os.path.dirname(self.name)] + self.inc_dirs:
-            pname = os.path.abspath(os.path.expanduser(os.path.join(b, name)))
-            if os.path.isfile(pname):
-                name = pname
-                break
-        else:
+        path = self.include_cache.find(
+            name, [os.path.dirname(self.name)] + self.inc_dirs
+        )
+        if path is None:
             msg = 'Can not find include file "{}".'.format(name)
             if name.endswith(".h"):
                 print("WARNING:", msg)
                 # undo pop and return
-                self.pending = [curpending] + self.pending
-                return
+                self.pending.appendleft(curpending)
+                return False
             raise FileNotFoundError(msg)
-        self.pending = (
-            list(
-                FortranReader(
-                    name,
-                    self.docmark,
-                    self.predocmark,
-                    self.docmark_alt,
-                    self.predocmark_alt,
-                    self.fixed,
-                    self.length_limit,
-                    inc_dirs=self.inc_dirs,
-                    encoding=self.encoding,
-                )
-            )
-            + self.pending
-        )
+        self.pending.appendleft(self.include_cache.read(path, self))
+        self.included_files.add(path)
+        return True
+
+    def _record_linemarker(self, line):
+        """
+        If `line` is a preprocessor line marker, the following lines
+        came from the file and line it names. Other files are added to
+        `included_files`.
+        """
+        if not (match := self.LINEMARKER_RE.match(line.strip())):
+            return
+        self.line_number = int(match.group(1)) - 1
+        if os.path.abspath(match.group(2)) == os.path.abspath(self.name):
+            self._current_file = self.name
+        else:
+            self._current_file = match.group(2)
+            if (name := linemarker_file(line, self.name)) is not None:
+                self.included_files.add(name)
 
 
 if __name__ == "__main__":
@@ -22,14 +22,14 @@
 #
 #
 
-from collections import defaultdict
+from collections import ChainMap, defaultdict
 from dataclasses import dataclass
 import sys
 import re
 import os.path
 import copy
 import textwrap
-from typing import List, Tuple, Optional, Union, Sequence, Dict
+from typing import List, Tuple, Optional, Union, Sequence, Dict, FrozenSet, Set
 from itertools import chain
 
 # Python 2 or 3:
@@ -40,9 +40,10 @@ else:
 
 import toposort
 from pygments import highlight
-from pygments.lexers import FortranLexer, FortranFixedLexer, guess_lexer_for_filename
+from pygments.lexers import guess_lexer_for_filename
 from pygments.formatters import HtmlFormatter
 
+import ford.highlighting
 import ford.reader
 import ford.utils
 from ford.intrinsics import INTRINSICS
@@ -65,6 +66,37 @@ PARA_CAPTURE_RE = re.compile(r"<p>.*?</p>", re.IGNORECASE | re.DOTALL)
 COMMA_RE = re.compile(r",(?!\s)")
 NBSP_RE = re.compile(r" (?= )|(?<= ) ")
 DIM_RE = re.compile(r"^\w+\s*(\(.*\))\s*$")
+# What `mask_strings` replaces string literals with (either quote is
+# accepted when putting them back)
+STRING_PLACEHOLDER_RE = re.compile(r"([\"'])(\d+)\1")
+
+
+def mask_strings(line: str) -> Tuple[str, List[str]]:
+    """Replace each string literal in ``line`` with a placeholder
+    giving its index in the returned list of literals, to make parsing
+    the rest of the line simpler
+
+    Returns
+    -------
+    tuple
+        The masked line, and the string literals taken out of it
+
+    """
+    strings: List[str] = []
+
+    def placeholder(match: re.Match) -> str:
+        strings.append(match.group())
+        return f'"{len(strings) - 1}"'
+
+    return QUOTES_RE.sub(placeholder, line), strings
+
+
+def unmask_strings(text: str, strings: Sequence[str]) -> str:
+    """Put the string literals in ``strings`` back in place of the
+    placeholders left in ``text`` by `mask_strings`"""
+    if '"' not in text and "'" not in text:
+        return text
+    return STRING_PLACEHOLDER_RE.sub(lambda match: strings[int(match[2])], text)
 
 
 base_url = ""
@@ -80,7 +112,12 @@ class FortranBase:
 
     POINTS_TO_RE = re.compile(r"\s*=>\s*", re.IGNORECASE)
     SPLIT_RE = re.compile(r"\s*,\s*", re.IGNORECASE)
-    SRC_CAPTURE_STR = r"^[ \t]*([\w(),*: \t]+?[ \t]+)?{0}([\w(),*: \t]+?)?[ \t]+{1}[ \t\n,(].*?end[ \t]*{0}[ \t]+{1}[ \t]*?(!.*?)?$"
+    # Where this entity was read from, if known
+    source_span: Optional["ford.reader.SourceSpan"] = None
+    # Source code to show for this entity, if it has `source: true`
+    source_code: Optional[str] = None
+    # Highlighted `source_code`; see `src`
+    _src: Optional[str] = None
 
     # ~ this regex is not working for the LINK and DOUBLE_LINK types
 
@@ -102,6 +139,7 @@ class FortranBase:
         self.visible = False
         self.permission = inherited_permission.lower()
         self.strings = strings
+        self.source_span = getattr(source, "statement_span", None)
         self.parent = parent
         if self.parent:
             self.parobj = self.parent.obj
@@ -226,6 +264,37 @@ class FortranBase:
         """Return a string suitable for an HTML anchor link"""
         return f"{self.obj}-{quote(self.ident)}"
 
+    @property
+    def src(self) -> Optional[str]:
+        """The entity's `source_code` highlighted as HTML, if it has any.
+        Normally done in bulk by `Project.highlight_sources`"""
+        if self._src is None and self.source_code is not None:
+            self._src = ford.highlighting.highlight_fortran(
+                ford.highlighting.HighlightJob(self.source_code)
+            )
+        return self._src
+
+    @property
+    def location(self) -> str:
+        """Where this entity is in the source code, for messages"""
+        if self.source_span is None:
+            return self.filename
+        path, first_line, _ = self.source_span
+        return f"{os.path.basename(path)}:{first_line}"
+
+    @property
+    def source_url(self) -> Optional[str]:
+        """Link to where this entity starts on its file's page, if
+        there is one"""
+        if self.source_span is None or not self.hierarchy:
+            return None
+        source_file = self.hierarchy[0]
+        if self.source_span.path != getattr(source_file, "path", None):
+            return None
+        if (url := source_file.get_url()) is None:
+            return None
+        return f"{url}#ln-{self.source_span.first_line}"
+
     def __str__(self):
         url = self.get_url()
         if url and getattr(self, "visible", True):
@@ -256,27 +325,7 @@ class FortranBase:
         Process the documentation with Markdown to produce HTML.
         """
         if len(self.doc) > 0:
-            # Remove any common leading whitespace from the docstring
-            # so that the markdown conversion is a bit more robust
-            self.doc = textwrap.dedent("\n".join(self.doc)).splitlines()
-
-            if len(self.doc) == 1 and ":" in self.doc[0]:
-                words = self.doc[0].split(":")[0].strip()
-                if words.lower() not in [
-                    "author",
-                    "date",
-                    "license",
-                    "version",
-                    "category",
-                    "summary",
-                    "deprecated",
-                    "display",
-                    "graph",
-                ]:
-                    self.doc.insert(0, "")
-                self.doc.append("")
-            self.doc = "\n".join(self.doc)
-            self.doc = md.reset().convert(self.doc)
+            self.doc = md.reset().convert(doc_markdown_source(self.doc))
             self.meta = md.Meta
         else:
             if (
@@ -284,11 +333,8 @@ class FortranBase:
                 and self.obj != "sourcefile"
                 and self.obj != "genericsource"
             ):
-                # TODO: Add ability to print line number where this item is in file
                 print(
-                    "Warning: Undocumented {} {} in file {}".format(
-                        self.obj, self.name, self.hierarchy[0].name
-                    )
+                    f"Warning: Undocumented {self.obj} {self.name} in {self.location}"
                 )
             self.doc = ""
             self.meta = {}
@@ -355,24 +401,16 @@ class FortranBase:
         if self.obj in ["proc", "type", "program"]:
             self._ensure_meta_key_set("source", ford.utils.str_to_bool)
             if self.meta["source"]:
-                if self.obj == "proc":
-                    obj = self.proctype.lower()
-                else:
-                    obj = self.obj
-                regex = re.compile(
-                    self.SRC_CAPTURE_STR.format(obj, self.name),
-                    re.IGNORECASE | re.DOTALL | re.MULTILINE,
-                )
-                if match := regex.search(self.hierarchy[0].raw_src):
-                    self.src = highlight(match.group(), FortranLexer(), HtmlFormatter())
-                else:
-                    self.src = ""
-                    if self.settings["warn"]:
-                        print(
-                            "Warning: Could not extract source code for {} {} in file {}".format(
-                                self.obj, self.name, self.hierarchy[0].name
-                            )
-                        )
+                span = self.source_span
+                if span is not None and span.path == self.hierarchy[0].path:
+                    self.source_code = self.hierarchy[0].get_lines(
+                        span.first_line, span.last_line
+                    )
+                elif self.settings["warn"]:
+                    print(
+                        f"Warning: Could not extract source code for {self.obj} "
+                        f"{self.name} in {self.location}"
+                    )
 
         if self.obj == "proc":
             self._ensure_meta_key_set("proc_internals", ford.utils.str_to_bool)
@@ -597,6 +635,51 @@ class FortranContainer(FortranBase):
         r"procedure|enumerator{})\s*((?:\(|\s\w|[:,*]).*)$"
     )
 
+    # The kinds of statement each of the regexes above matches that
+    # can start with a given keyword (see `_statement_kinds`)
+    STATEMENT_KEYWORDS: Dict[str, FrozenSet[str]] = {
+        **dict.fromkeys(
+            [
+                "asynchronous",
+                "allocatable",
+                "bind",
+                "data",
+                "dimension",
+                "external",
+                "intent",
+                "optional",
+                "parameter",
+                "pointer",
+                "private",
+                "protected",
+                "public",
+                "save",
+                "target",
+                "value",
+                "volatile",
+            ],
+            frozenset({"attrib"}),
+        ),
+        **dict.fromkeys(
+            ["integer", "real", "character", "complex", "logical", "class"],
+            frozenset({"variable"}),
+        ),
+        "enumerator": frozenset({"variable"}),
+        "module": frozenset({"modproc", "module"}),
+        "procedure": frozenset({"modproc", "boundproc", "variable"}),
+        "submodule": frozenset({"submodule"}),
+        "program": frozenset({"program"}),
+        "type": frozenset({"type", "variable"}),
+        "abstract": frozenset({"interface"}),
+        "interface": frozenset({"interface"}),
+        "enum": frozenset({"enum"}),
+        "common": frozenset({"common"}),
+        "final": frozenset({"final"}),
+        "use": frozenset({"use"}),
+    }
+    WORD_RE = re.compile(r"\w*")
+    LATER_KEYWORDS_RE = re.compile("block|associate|subroutine|function")
+
     def __init__(
         self, source, first_line, parent=None, inherited_permission="public", strings=[]
     ):
@@ -640,14 +723,7 @@ class FortranContainer(FortranBase):
                 self.num_lines += 1
 
             # Temporarily replace all strings to make the parsing simpler
-            self.strings = []
-            search_from = 0
-            while quote := QUOTES_RE.search(line[search_from:]):
-                self.strings.append(quote.group())
-                line = line[0:search_from] + QUOTES_RE.sub(
-                    '"{}"'.format(len(self.strings) - 1), line[search_from:], count=1
-                )
-                search_from += QUOTES_RE.search(line[search_from:]).end(0)
+            line, self.strings = mask_strings(line)
 
             # Cache the lowercased line
             line_lower = line.lower()
@@ -655,7 +731,9 @@ class FortranContainer(FortranBase):
             if self.settings["lower"]:
                 line = line_lower
 
-            # Check the various possibilities for what is on this line
+            # Check the various possibilities for what is on this line,
+            # only trying the regexes for statements it could be
+            kinds = self._statement_kinds(line_lower)
             if line_lower == "contains":
                 if not incontains and isinstance(self, _can_have_contains):
                     incontains = True
@@ -672,10 +750,14 @@ class FortranContainer(FortranBase):
             elif line_lower == "sequence":
                 if type(self) == FortranType:
                     self.sequence = True
-            elif self.FORMAT_RE.match(line):
+            elif "format" in kinds and self.FORMAT_RE.match(line):
                 # There's nothing interesting for us in a format statement
                 continue
-            elif (match := self.ATTRIB_RE.match(line)) and blocklevel == 0:
+            elif (
+                "attrib" in kinds
+                and (match := self.ATTRIB_RE.match(line))
+                and blocklevel == 0
+            ):
                 attr = match.group(1).lower().replace(" ", "")
                 if len(attr) >= 4 and attr[0:4].lower() == "bind":
                     attr = attr.replace(",", ", ")
@@ -700,15 +782,7 @@ class FortranContainer(FortranBase):
                         if attr == "parameter":
                             stmnt = stmnt[1:-1].strip()
                         names = ford.utils.paren_split(",", stmnt)
-                        search_from = 0
-                        while QUOTES_RE.search(attr[search_from:]):
-                            num = int(
-                                QUOTES_RE.search(attr[search_from:]).group()[1:-1]
-                            )
-                            attr = attr[0:search_from] + QUOTES_RE.sub(
-                                self.strings[num], attr[search_from:], count=1
-                            )
-                            search_from += QUOTES_RE.search(attr[search_from:]).end(0)
+                        attr = unmask_strings(attr, self.strings)
                         for name in names:
                             if attr == "parameter":
                                 split = ford.utils.paren_split("=", name)
@@ -725,7 +799,7 @@ class FortranContainer(FortranBase):
                 else:
                     self.print_error(line, f"Unexpected {attr.upper()} statement")
 
-            elif match := self.END_RE.match(line):
+            elif "end" in kinds and (match := self.END_RE.match(line)):
                 if isinstance(self, FortranSourceFile):
                     self.print_error(
                         line,
@@ -738,10 +812,16 @@ class FortranContainer(FortranBase):
                 elif endtype and endtype.lower() == "associate":
                     associatelevel -= 1
                 else:
+                    # Extend the span of the opening statement to the end
+                    end = getattr(source, "statement_span", None)
+                    if self.source_span and end and end.path == self.source_span.path:
+                        self.source_span = self.source_span._replace(
+                            last_line=end.last_line
+                        )
                     self._cleanup()
                     return
 
-            elif (match := self.MODPROC_RE.match(line)) and (
+            elif ("modproc" in kinds and (match := self.MODPROC_RE.match(line))) and (
                 match.group(1) or isinstance(self, FortranInterface)
             ):
                 if hasattr(self, "modprocs"):
@@ -756,31 +836,31 @@ class FortranContainer(FortranBase):
                 else:
                     self.print_error(line, "Unexpected MODULE PROCEDURE")
 
-            elif match := self.BLOCK_DATA_RE.match(line):
+            elif "blockdata" in kinds and (match := self.BLOCK_DATA_RE.match(line)):
                 if hasattr(self, "blockdata"):
                     self.blockdata.append(FortranBlockData(source, match, self))
                     self.num_lines += self.blockdata[-1].num_lines - 1
                 else:
                     self.print_error(line, "Unexpected BLOCK DATA")
-            elif self.BLOCK_RE.match(line):
+            elif "block" in kinds and self.BLOCK_RE.match(line):
                 blocklevel += 1
-            elif self.ASSOCIATE_RE.match(line):
+            elif "associate" in kinds and self.ASSOCIATE_RE.match(line):
                 associatelevel += 1
-            elif match := self.MODULE_RE.match(line):
+            elif "module" in kinds and (match := self.MODULE_RE.match(line)):
                 if hasattr(self, "modules"):
                     self.modules.append(FortranModule(source, match, self))
                     self.num_lines += self.modules[-1].num_lines - 1
                 else:
                     self.print_error(line, "Unexpected MODULE")
 
-            elif match := self.SUBMODULE_RE.match(line):
+            elif "submodule" in kinds and (match := self.SUBMODULE_RE.match(line)):
                 if hasattr(self, "submodules"):
                     self.submodules.append(FortranSubmodule(source, match, self))
                     self.num_lines += self.submodules[-1].num_lines - 1
                 else:
                     self.print_error(line, "Unexpected SUBMODULE")
 
-            elif match := self.PROGRAM_RE.match(line):
+            elif "program" in kinds and (match := self.PROGRAM_RE.match(line)):
                 if hasattr(self, "programs"):
                     self.programs.append(FortranProgram(source, match, self))
                     self.num_lines += self.programs[-1].num_lines - 1
@@ -793,7 +873,7 @@ class FortranContainer(FortranBase):
                         describe_object=False,
                     )
 
-            elif match := self.SUBROUTINE_RE.match(line):
+            elif "subroutine" in kinds and (match := self.SUBROUTINE_RE.match(line)):
                 if isinstance(self, FortranCodeUnit) and not incontains:
                     self.print_error(line, "Unexpected SUBROUTINE")
                 elif hasattr(self, "subroutines"):
@@ -804,7 +884,7 @@ class FortranContainer(FortranBase):
                 else:
                     self.print_error(line, "Unexpected SUBROUTINE")
 
-            elif match := self.FUNCTION_RE.match(line):
+            elif "function" in kinds and (match := self.FUNCTION_RE.match(line)):
                 if isinstance(self, FortranCodeUnit) and not incontains:
                     self.print_error(line, "Unexpected FUNCTION")
                 elif hasattr(self, "functions"):
@@ -815,14 +895,22 @@ class FortranContainer(FortranBase):
                 else:
                     self.print_error(line, "Unexpected FUNCTION")
 
-            elif (match := self.TYPE_RE.match(line)) and blocklevel == 0:
+            elif (
+                "type" in kinds
+                and (match := self.TYPE_RE.match(line))
+                and blocklevel == 0
+            ):
                 if hasattr(self, "types"):
                     self.types.append(FortranType(source, match, self, self.permission))
                     self.num_lines += self.types[-1].num_lines - 1
                 else:
                     self.print_error(line, "Unexpected derived TYPE")
 
-            elif (match := self.INTERFACE_RE.match(line)) and blocklevel == 0:
+            elif (
+                "interface" in kinds
+                and (match := self.INTERFACE_RE.match(line))
+                and blocklevel == 0
+            ):
                 if hasattr(self, "interfaces"):
                     intr = FortranInterface(source, match, self, self.permission)
                     self.num_lines += intr.num_lines - 1
@@ -835,14 +923,22 @@ class FortranContainer(FortranBase):
                 else:
                     self.print_error(line, "Unexpected INTERFACE")
 
-            elif (match := self.ENUM_RE.match(line)) and blocklevel == 0:
+            elif (
+                "enum" in kinds
+                and (match := self.ENUM_RE.match(line))
+                and blocklevel == 0
+            ):
                 if hasattr(self, "enums"):
                     self.enums.append(FortranEnum(source, match, self, self.permission))
                     self.num_lines += self.enums[-1].num_lines - 1
                 else:
                     self.print_error(line, "Unexpected ENUM")
 
-            elif (match := self.BOUNDPROC_RE.match(line)) and incontains:
+            elif (
+                "boundproc" in kinds
+                and (match := self.BOUNDPROC_RE.match(line))
+                and incontains
+            ):
                 if not hasattr(self, "boundprocs"):
                     self.print_error(line, "Unexpected type-bound procedure")
                     continue
@@ -867,7 +963,7 @@ class FortranContainer(FortranBase):
                         )
                     )
 
-            elif match := self.COMMON_RE.match(line):
+            elif "common" in kinds and (match := self.COMMON_RE.match(line)):
                 if hasattr(self, "common"):
                     split = self.COMMON_SPLIT_RE.split(line)
                     if len(split) > 1:
@@ -898,18 +994,24 @@ class FortranContainer(FortranBase):
                 else:
                     self.print_error(line, "Unexpected COMMON statement")
 
-            elif (match := self.FINAL_RE.match(line)) and incontains:
+            elif (
+                "final" in kinds and (match := self.FINAL_RE.match(line)) and incontains
+            ):
                 if hasattr(self, "finalprocs"):
                     procedures = self.SPLIT_RE.split(match.group(1).strip())
                     finprocs = [
                         FortranFinalProc(proc, self) for proc in procedures[:-1]
                     ]
                     finprocs.append(FortranFinalProc(procedures[-1], self, source))
+                    for proc in finprocs[:-1]:
+                        proc.source_span = finprocs[-1].source_span
                     self.finalprocs.extend(finprocs)
                 else:
                     self.print_error(line, "Unexpected finalization procedure")
 
-            elif self.VARIABLE_RE.match(line) and blocklevel == 0:
+            elif (
+                "variable" in kinds and self.VARIABLE_RE.match(line) and blocklevel == 0
+            ):
                 if hasattr(self, "variables"):
                     self.variables.extend(
                         line_to_variables(source, line, child_permission, self)
@@ -917,7 +1019,7 @@ class FortranContainer(FortranBase):
                 else:
                     self.print_error(line, "Unexpected variable")
 
-            elif match := self.USE_RE.match(line):
+            elif "use" in kinds and (match := self.USE_RE.match(line)):
                 if hasattr(self, "uses"):
                     self.uses.append(list(match.groups()))
                 else:
@@ -954,6 +1056,32 @@ class FortranContainer(FortranBase):
         if not isinstance(self, FortranSourceFile):
             raise Exception("File ended while still nested.")
 
+    def _statement_kinds(self, line_lower: str) -> Set[str]:
+        """Return the kinds of statement ``line_lower`` could be, going
+        by its first word and a few keywords which can come later"""
+        keyword = self.WORD_RE.match(line_lower).group()
+        kinds = set(self.STATEMENT_KEYWORDS.get(keyword, ()))
+
+        # Keywords which can run into the next word
+        if keyword.startswith("end"):
+            kinds.add("end")
+        elif keyword.startswith("block"):
+            kinds.add("blockdata")
+        elif keyword.startswith(("procedure", "generic")):
+            kinds.add("boundproc")
+        elif keyword.startswith("double"):
+            kinds.add("variable")
+        elif keyword.isdigit():
+            kinds.add("format")
+
+        # Statements which can have a label or attributes first
+        kinds.update(self.LATER_KEYWORDS_RE.findall(line_lower))
+
+        # User-defined types could be anything
+        if self.settings["extra_vartypes"]:
+            kinds.add("variable")
+        return kinds
+
     def _cleanup(self):
         raise NotImplementedError()
 
@@ -974,29 +1102,43 @@ class FortranCodeUnit(FortranContainer):
     """
 
     def correlate(self, project):
-        # Add procedures, interfaces and types from parent to our lists
-        if hasattr(self.parent, "all_procs"):
-            self.all_procs.update(self.parent.all_procs)
-        self.all_absinterfaces = getattr(self.parent, "all_absinterfaces", {})
-        for ai in self.absinterfaces:
-            self.all_absinterfaces[ai.name.lower()] = ai
-        self.all_types = getattr(self.parent, "all_types", {})
-        for dt in self.types:
-            self.all_types[dt.name.lower()] = dt
-        self.all_vars = getattr(self.parent, "all_vars", {})
-        for var in self.variables:
-            self.all_vars[var.name.lower()] = var
+        # Add procedures, interfaces and types from parent to our
+        # lists. These are chained rather than copied, with the maps
+        # searched first taking precedence
+        def scope(own: dict, outer: str) -> ChainMap:
+            return ChainMap(own, getattr(self.parent, outer, {}))
+
+        self.all_procs = ChainMap(getattr(self.parent, "all_procs", {}), self.all_procs)
+        self.all_absinterfaces = scope(
+            {ai.name.lower(): ai for ai in self.absinterfaces}, "all_absinterfaces"
+        )
+        self.all_types = scope({dt.name.lower(): dt for dt in self.types}, "all_types")
+        self.all_vars = scope(
+            {var.name.lower(): var for var in self.variables}, "all_vars"
+        )
+
+        def add_scope(procs, absints, types, variables=None):
+            """Put the given names in front of all those we can already see"""
+            self.all_procs = self.all_procs.new_child(procs)
+            self.all_absinterfaces = self.all_absinterfaces.new_child(absints)
+            self.all_types = self.all_types.new_child(types)
+            if variables is not None:
+                self.all_vars = self.all_vars.new_child(variables)
 
         if type(getattr(self, "ancestor", "")) not in [str, type(None)]:
             self.ancestor.descendants.append(self)
-            self.all_procs.update(self.parent_submodule.all_procs)
-            self.all_absinterfaces.update(self.parent_submodule.all_absinterfaces)
-            self.all_types.update(self.parent_submodule.all_types)
+            add_scope(
+                self.parent_submodule.all_procs,
+                self.parent_submodule.all_absinterfaces,
+                self.parent_submodule.all_types,
+            )
         elif type(getattr(self, "ancestor_module", "")) not in [str, type(None)]:
             self.ancestor_module.descendants.append(self)
-            self.all_procs.update(self.ancestor_module.all_procs)
-            self.all_absinterfaces.update(self.ancestor_module.all_absinterfaces)
-            self.all_types.update(self.ancestor_module.all_types)
+            add_scope(
+                self.ancestor_module.all_procs,
+                self.ancestor_module.all_absinterfaces,
+                self.ancestor_module.all_types,
+            )
 
         # Module procedures will be missing (some/all?) metadata, so
         # now we copy it from the interface
@@ -1040,10 +1182,7 @@ class FortranCodeUnit(FortranContainer):
                 self.pub_absints.update(filter_public(absints))
                 self.pub_types.update(filter_public(types))
                 self.pub_vars.update(filter_public(variables))
-            self.all_procs.update(procs)
-            self.all_absinterfaces.update(absints)
-            self.all_types.update(types)
-            self.all_vars.update(variables)
+            add_scope(procs, absints, types, variables)
         self.uses = set([m[0] for m in self.uses])
 
         typelist = {}
@@ -1074,13 +1213,20 @@ class FortranCodeUnit(FortranContainer):
                     tmplst.append(call)
             self.calls = tmplst
 
-            procedures = (
-                {proc.name.lower(): proc for proc in self.parent.routines}
-                if self.parobj == "sourcefile"
-                else {}
-            )
-            procedures.update({proc.name.lower(): proc for proc in project.procedures})
-            procedures.update(self.all_procs)
+            # Look in our own scope first, then the whole project
+            project_procedures = getattr(project, "procedure_index", None)
+            procedures = ChainMap(self.all_procs)
+            if project_procedures is not None:
+                # This already includes all the procedures in our parent file
+                procedures.maps.append(project_procedures)
+            else:
+                procedures.maps.append(
+                    {proc.name.lower(): proc for proc in project.procedures}
+                )
+                if self.parobj == "sourcefile":
+                    procedures.maps.append(
+                        {proc.name.lower(): proc for proc in self.parent.routines}
+                    )
 
             for i, call in enumerate(self.calls):
                 try:
@@ -1275,16 +1421,50 @@ class FortranSourceFile(FortranContainer):
             settings["macro"],
             settings["include"],
             settings["encoding"],
+            kwargs.get("preprocessed"),
+            kwargs.get("include_cache"),
         )
 
         super().__init__(source, "")
-        with open(self.path, "r", encoding=settings["encoding"]) as readobj:
-            self.raw_src = readobj.read()
+        self.included_files = sorted(source.included_files)
+        # Only hang on to the source if there will be a page showing it
+        self._raw_src = source.raw_src if self.visible else None
+        self._src = None
+        # Offsets of the start of each line in `raw_src`; see `get_lines`
+        self._line_starts = None
 
-        lexer = FortranFixedLexer() if self.fixed else FortranLexer()
-        self.src = highlight(
-            self.raw_src, lexer, HtmlFormatter(lineanchors="ln", cssclass="hl")
-        )
+    @property
+    def raw_src(self) -> str:
+        """Contents of the file, read on first use if they weren't kept
+        from parsing it"""
+        if self._raw_src is None:
+            with open(self.path, "r", encoding=self.settings["encoding"]) as f:
+                self._raw_src = f.read()
+        return self._raw_src
+
+    @property
+    def src(self) -> str:
+        """Contents of the file highlighted as HTML, made on first use
+        if not done by `Project.highlight_sources`"""
+        if self._src is None:
+            self._src = ford.highlighting.highlight_fortran(self.highlight_job)
+        return self._src
+
+    @property
+    def highlight_job(self) -> ford.highlighting.HighlightJob:
+        """How to highlight the whole file"""
+        return ford.highlighting.HighlightJob(self.raw_src, self.fixed, True)
+
+    def get_lines(self, first: int, last: int) -> str:
+        """Return lines ``first`` to ``last`` (counting from one) of
+        the file"""
+        if self._line_starts is None:
+            starts = [0]
+            starts.extend(match.end() for match in re.finditer("\n", self.raw_src))
+            self._line_starts = starts
+        starts = self._line_starts
+        end = starts[last] if last < len(starts) else len(self.raw_src)
+        return self.raw_src[starts[first - 1] : end]
 
 
 class FortranModule(FortranCodeUnit):
@@ -1508,17 +1688,7 @@ class FortranProcedure(FortranCodeUnit):
 
         # Now we have to replace any quoted text that has previously
         # been removed
-        search_from = 0
-        while quote := QUOTES_RE.search(self.bindC[search_from:]):
-            num = int(quote.group()[1:-1])
-            self.bindC = self.bindC[0:search_from] + QUOTES_RE.sub(
-                self.parent.strings[num], self.bindC[search_from:], count=1
-            )
-            if not (next_match := QUOTES_RE.search(self.bindC[search_from:])):
-                raise ValueError(
-                    f"Unexpected missing quotes in '{self.bindC[search_from:]}'"
-                )
-            search_from += next_match.end(0)
+        self.bindC = unmask_strings(self.bindC, self.parent.strings)
 
     @property
     def is_interface_procedure(self) -> bool:
@@ -1989,6 +2159,7 @@ class FortranFinalProc(FortranBase):
         self.display = self.parent.display
         self.settings = self.parent.settings
         self.doc = []
+        self.source_span = getattr(source, "statement_span", None)
         if source:
             line = source.__next__()
             while line[0:2] == "!" + self.settings["docmark"]:
@@ -2261,24 +2432,20 @@ class FortranBlockData(FortranContainer):
 
     def correlate(self, project):
         # Add procedures, interfaces and types from parent to our lists
-        self.all_types = {}
-        for dt in self.types:
-            self.all_types[dt.name.lower()] = dt
-        self.all_vars = {}
-        for var in self.variables:
-            self.all_vars[var.name.lower()] = var
-        self.all_absinterfaces = {}
-        self.all_procs = {}
+        self.all_types = ChainMap({dt.name.lower(): dt for dt in self.types})
+        self.all_vars = ChainMap({var.name.lower(): var for var in self.variables})
+        self.all_absinterfaces = ChainMap()
+        self.all_procs = ChainMap()
 
         # Add procedures and types from USED modules to our lists
         for mod, extra in self.uses:
             if type(mod) is str:
                 continue
             procs, absints, types, variables = mod.get_used_entities(extra)
-            self.all_procs.update(procs)
-            self.all_absinterfaces.update(absints)
-            self.all_types.update(types)
-            self.all_vars.update(variables)
+            self.all_procs = self.all_procs.new_child(procs)
+            self.all_absinterfaces = self.all_absinterfaces.new_child(absints)
+            self.all_types = self.all_types.new_child(types)
+            self.all_vars = self.all_vars.new_child(variables)
         self.uses = [m[0] for m in self.uses]
 
         typelist = {}
@@ -2454,7 +2621,7 @@ class GenericSource(FortranBase):
             import pygments.lexers
 
             lexer = getattr(pygments.lexers, self.lexer_str)
-        self.src = highlight(
+        self._src = highlight(
             self.raw_src, lexer, HtmlFormatter(lineanchors="ln", cssclass="hl")
         )
         com_re = re.compile(
@@ -2617,6 +2784,7 @@ def line_to_variables(source, line, inherit_permission, parent):
         declarestr = ATTRIBSPLIT2_RE.match(parsed_type.rest).group(2)
     declarations = ford.utils.paren_split(",", declarestr)
 
+    source_span = getattr(source, "statement_span", None)
     doc = []
     docmark = f"!{parent.settings['docmark']}"
     while (docline := next(source)).startswith(docmark):
@@ -2641,16 +2809,9 @@ def line_to_variables(source, line, inherit_permission, parent):
 
         if initial:
             initial = COMMA_RE.sub(", ", initial)
-            # TODO: pull out into standalone function?
-            search_from = 0
-            while quote := QUOTES_RE.search(initial[search_from:]):
-                num = int(quote.group()[1:-1])
-                string = NBSP_RE.sub("&nbsp;", parent.strings[num])
-                string = string.replace("\\", "\\\\")
-                initial = initial[0:search_from] + QUOTES_RE.sub(
-                    string, initial[search_from:], count=1
-                )
-                search_from += QUOTES_RE.search(initial[search_from:]).end(0)
+            initial = unmask_strings(
+                initial, [NBSP_RE.sub("&nbsp;", string) for string in parent.strings]
+            )
 
         varlist.append(
             FortranVariable(
@@ -2670,6 +2831,7 @@ def line_to_variables(source, line, inherit_permission, parent):
                 initial,
             )
         )
+        varlist[-1].source_span = source_span
 
     return varlist
 
@@ -2778,9 +2940,7 @@ def parse_type(
 
             if kind is None and (kind_match := KIND_RE.match(arg)):
                 kind = kind_match.group(1)
-                if match := QUOTES_RE.search(kind):
-                    num = int(match.group()[1:-1])
-                    kind = QUOTES_RE.sub(capture_strings[num], kind)
+                kind = unmask_strings(kind, capture_strings)
                 continue
 
             if length is None:
@@ -2801,12 +2961,37 @@ def parse_type(
     return ParsedType(vartype, rest, kind=kind)
 
 
+def doc_markdown_source(doc: List[str]) -> str:
+    """Return the Markdown text to convert for the docstring lines ``doc``"""
+    # Remove any common leading whitespace from the docstring
+    # so that the markdown conversion is a bit more robust
+    doc = textwrap.dedent("\n".join(doc)).splitlines()
+
+    if len(doc) == 1 and ":" in doc[0]:
+        words = doc[0].split(":")[0].strip()
+        if words.lower() not in [
+            "author",
+            "date",
+            "license",
+            "version",
+            "category",
+            "summary",
+            "deprecated",
+            "display",
+            "graph",
+        ]:
+            doc.insert(0, "")
+        doc.append("")
+    return "\n".join(doc)
+
+
 def set_base_url(url):
     FortranBase.base_url = url
 
 
 def get_mod_procs(source, line, parent):
     inherit_permission = parent.permission
+    source_span = getattr(source, "statement_span", None)
     retlist = []
     SPLIT_RE = re.compile(r"\s*,\s*", re.IGNORECASE)
     splitlist = SPLIT_RE.split(line.group(2))
@@ -2825,6 +3010,8 @@ def get_mod_procs(source, line, parent):
         docline = source.__next__()
     source.pass_back(docline)
     retlist[-1].doc = doc
+    for proc in retlist:
+        proc.source_span = source_span
 
     return retlist
 
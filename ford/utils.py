@@ -30,7 +30,7 @@ import ford.sourceform
 from urllib.request import urlopen, URLError
 from urllib.parse import urljoin
 import pathlib
-from typing import Union
+from typing import Optional, Union
 
 
 NOTE_TYPE = {
@@ -178,6 +178,108 @@ def quote_split(sep, string):
     return retlist
 
 
+LINK_TYPES = {
+    "module": "modules",
+    "extmodule": "extModules",
+    "type": "types",
+    "exttype": "extTypes",
+    "procedure": "procedures",
+    "extprocedure": "extProcedures",
+    "subroutine": "procedures",
+    "extsubroutine": "extProcedures",
+    "function": "procedures",
+    "extfunction": "extProcedures",
+    "proc": "procedures",
+    "extproc": "extProcedures",
+    "file": "allfiles",
+    "interface": "absinterfaces",
+    "extinterface": "extInterfaces",
+    "absinterface": "absinterfaces",
+    "extabsinterface": "extInterfaces",
+    "program": "programs",
+    "block": "blockdata",
+}
+
+SUBLINK_TYPES = {
+    "variable": "variables",
+    "type": "types",
+    "constructor": "constructor",
+    "interface": "interfaces",
+    "absinterface": "absinterfaces",
+    "subroutine": "subroutines",
+    "function": "functions",
+    "final": "finalprocs",
+    "bound": "boundprocs",
+    "modproc": "modprocs",
+    "common": "common",
+}
+
+
+class SymbolTable:
+    """
+    Index of the entities in a project that can be linked to with
+    `sub_links`, by lowercase name, both overall and for each of the
+    classifications in `LINK_TYPES`. Indexes of the children of
+    entities (see `SUBLINK_TYPES`) are built the first time they're
+    needed.
+
+    Where several entities share a name, the first one found wins,
+    searching the project collections in the order of `LINK_TYPES` and
+    the children in the order of `SUBLINK_TYPES`.
+    """
+
+    def __init__(self, project):
+        self.by_kind = {}
+        self.names = {}
+        collections = {}
+        for kind, collection in LINK_TYPES.items():
+            if collection not in collections:
+                collections[collection] = self._index(getattr(project, collection))
+            self.by_kind[kind] = collections[collection]
+            for name, entity in collections[collection].items():
+                self.names.setdefault(name, entity)
+        self._children = {}
+
+    @staticmethod
+    def _index(entities) -> dict:
+        index = {}
+        for entity in entities:
+            name = getattr(entity, "name", None)
+            if name:
+                index.setdefault(name.lower(), entity)
+        return index
+
+    def find(self, name: str, kind: Optional[str] = None):
+        """Return the entity called ``name`` (of the given kind, if
+        any), or None"""
+        index = self.names if kind is None else self.by_kind[kind]
+        return index.get(name.lower())
+
+    def find_child(self, parent, name: str, kind: Optional[str] = None):
+        """Return the child of ``parent`` called ``name`` (of the given
+        kind, if any), or None"""
+        key = id(parent)
+        if key not in self._children:
+            by_kind = {}
+            for child_kind, attribute in SUBLINK_TYPES.items():
+                if attribute == "constructor":
+                    constructor = getattr(parent, "constructor", None)
+                    children = [constructor] if constructor else []
+                else:
+                    children = getattr(parent, attribute, [])
+                by_kind[child_kind] = self._index(children)
+            names = {}
+            for index in by_kind.values():
+                for child_name, child in index.items():
+                    names.setdefault(child_name, child)
+            # Keep a reference to the parent so its id can't be reused
+            self._children[key] = (parent, names, by_kind)
+
+        _, names, by_kind = self._children[key]
+        index = names if kind is None else by_kind[kind]
+        return index.get(name.lower())
+
+
 def sub_links(string, project):
     """
     Replace links to different parts of the program, formatted as
@@ -186,109 +288,39 @@ def sub_links(string, project):
     [[parent-name:name]]. The object type can be placed in parentheses
     for either or both of these parts.
     """
-    LINK_TYPES = {
-        "module": "modules",
-        "extmodule": "extModules",
-        "type": "types",
-        "exttype": "extTypes",
-        "procedure": "procedures",
-        "extprocedure": "extProcedures",
-        "subroutine": "procedures",
-        "extsubroutine": "extProcedures",
-        "function": "procedures",
-        "extfunction": "extProcedures",
-        "proc": "procedures",
-        "extproc": "extProcedures",
-        "file": "allfiles",
-        "interface": "absinterfaces",
-        "extinterface": "extInterfaces",
-        "absinterface": "absinterfaces",
-        "extabsinterface": "extInterfaces",
-        "program": "programs",
-        "block": "blockdata",
-    }
-
-    SUBLINK_TYPES = {
-        "variable": "variables",
-        "type": "types",
-        "constructor": "constructor",
-        "interface": "interfaces",
-        "absinterface": "absinterfaces",
-        "subroutine": "subroutines",
-        "function": "functions",
-        "final": "finalprocs",
-        "bound": "boundprocs",
-        "modproc": "modprocs",
-        "common": "common",
-    }
+    symbol_table = project.symbol_table
 
     def convert_link(match):
         ERR = "Warning: Could not substitute link {}. {}"
         url = ""
         name = ""
         found = False
-        searchlist = []
         item = None
         # [name,obj,subname,subobj]
-        if not match.group(2):
-            for key, val in LINK_TYPES.items():
-                searchlist.extend(getattr(project, val))
-        else:
-            if match.group(2).lower() in LINK_TYPES:
-                searchlist.extend(getattr(project, LINK_TYPES[match.group(2).lower()]))
-            else:
-                print(
-                    ERR.format(
-                        match.group(),
-                        'Unrecognized classification "{}".'.format(match.group(2)),
-                    )
+        kind = match.group(2).lower() if match.group(2) else None
+        if kind is not None and kind not in LINK_TYPES:
+            print(
+                ERR.format(
+                    match.group(),
+                    'Unrecognized classification "{}".'.format(match.group(2)),
                 )
-                return match.group()
-
-        for obj in searchlist:
-            if match.group(1).lower() == obj.name.lower():
-                url = obj.get_url()
-                name = obj.name
-                found = True
-                item = obj
-                break
+            )
+            return match.group()
+
+        item = symbol_table.find(match.group(1), kind)
+        if item is not None:
+            url = item.get_url()
+            name = item.name
+            found = True
         else:
             print(ERR.format(match.group(), '"{}" not found.'.format(match.group(1))))
             url = ""
             name = match.group(1)
 
         if found and match.group(3):
-            searchlist = []
-            if not match.group(4):
-                for key, val in SUBLINK_TYPES.items():
-                    if val == "constructor":
-                        if getattr(item, "constructor", False):
-                            searchlist.append(item.constructor)
-                        else:
-                            continue
-                    else:
-                        searchlist.extend(getattr(item, val, []))
-            else:
-                if match.group(4).lower() in SUBLINK_TYPES:
-                    if hasattr(item, SUBLINK_TYPES[match.group(4).lower()]):
-                        if match.group(4).lower() == "constructor":
-                            if item.constructor:
-                                searchlist.append(item.constructor)
-                        else:
-                            searchlist.extend(
-                                getattr(item, SUBLINK_TYPES[match.group(4).lower()])
-                            )
-                    else:
-                        print(
-                            ERR.format(
-                                match.group(),
-                                '"{}" can not be contained in "{}"'.format(
-                                    match.group(4), item.obj
-                                ),
-                            )
-                        )
-                        return match.group()
-                else:
+            child_kind = match.group(4).lower() if match.group(4) else None
+            if child_kind is not None:
+                if child_kind not in SUBLINK_TYPES:
                     print(
                         ERR.format(
                             match.group(),
@@ -296,13 +328,22 @@ def sub_links(string, project):
                         )
                     )
                     return match.group()
+                if not hasattr(item, SUBLINK_TYPES[child_kind]):
+                    print(
+                        ERR.format(
+                            match.group(),
+                            '"{}" can not be contained in "{}"'.format(
+                                match.group(4), item.obj
+                            ),
+                        )
+                    )
+                    return match.group()
 
-            for obj in searchlist:
-                if match.group(3).lower() == obj.name.lower():
-                    url = str(url) + "#" + obj.anchor
-                    name = obj.name
-                    item = obj
-                    break
+            child = symbol_table.find_child(item, match.group(3), child_kind)
+            if child is not None:
+                url = str(url) + "#" + child.anchor
+                name = child.name
+                item = child
             else:
                 print(
                     ERR.format(
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+#
+#  watch.py
+#  This file is part of FORD.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+"""
+Watch mode: rebuild the documentation whenever its inputs change, and
+serve it locally with pages that reload themselves after each rebuild
+"""
+
+import copy
+import http.server
+import os
+import sys
+import threading
+import time
+import traceback
+from functools import partial
+from io import StringIO
+from typing import Dict, List, Set, Tuple
+
+import ford
+
+# Polled by served pages to find out when to reload
+RELOAD_PATH = "/__ford_reload__"
+RELOAD_SCRIPT = f"""\
+<script>
+  (function () {{
+    var build = null;
+    setInterval(function () {{
+      fetch("{RELOAD_PATH}", {{cache: "no-store"}})
+        .then(function (response) {{ return response.text(); }})
+        .then(function (text) {{
+          if (build !== null && text !== build) {{ location.reload(); }}
+          build = text;
+        }})
+        .catch(function () {{}});
+    }}, 1000);
+  }})();
+</script>
+"""
+
+
+class Watcher:
+    """
+    Builds the documentation for a project, keeping the parsed source
+    files in memory between builds so that only files which have
+    changed (or whose included files have changed) are parsed again.
+    Builds after the first are incremental, so only the affected pages
+    are rewritten.
+
+    Everything after parsing is still done from scratch for each build:
+    correlating the project links entities in different files to each
+    other in place, so the entities of unchanged files can't be reused
+    once another file has changed. The Markdown and graph caches in
+    ``cache_dir`` save repeating most of that work.
+
+    Parameters
+    ----------
+    proj_data
+        Project settings, as returned by `ford.initialize`
+    proj_docs
+        Project file documentation
+    md
+        Markdown converter
+
+    Attributes
+    ----------
+    build_number
+        Number of builds finished so far
+    """
+
+    def __init__(self, proj_data: dict, proj_docs: str, md):
+        self.source_cache: Dict[str, ford.fortran_project.ParsedSource] = {}
+        self.build_number = 0
+        # Contents of each watched directory, as its modification time
+        # and lists of subdirectories and files
+        self._listings: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        self._configure(proj_data, proj_docs, md)
+
+    def _configure(self, proj_data: dict, proj_docs: str, md):
+        self.proj_data = proj_data
+        self.proj_data["incremental"] = True
+        self.proj_docs = proj_docs
+        self.md = md
+
+    @property
+    def output_dir(self):
+        return self.proj_data["output_dir"]
+
+    def build(self):
+        """Build the documentation, reporting rather than raising any
+        errors so that we can carry on watching"""
+        # Building modifies the settings, so work on a copy
+        proj_data = copy.deepcopy(self.proj_data)
+        ford.sourceform.namelist = ford.sourceform.NameSelector()
+        ford.utils._MACRO_DICT.clear()
+
+        f = StringIO() if proj_data["quiet"] else sys.stdout
+        try:
+            with ford.stdout_redirector(f):
+                ford.main(proj_data, self.proj_docs, self.md, self.source_cache)
+        except (Exception, SystemExit) as e:
+            if proj_data["dbg"]:
+                traceback.print_exc()
+            print(f"Error building documentation: {e}")
+        self.build_number += 1
+
+    def watched_files(self) -> Dict[str, int]:
+        """Return the modification times of all the files the
+        documentation is built from"""
+        paths = [self.proj_data["project_file"]]
+        exclude_dirs = {os.path.abspath(d) for d in self.proj_data["exclude_dir"]}
+        pending = [os.path.abspath(d) for d in self.proj_data["src_dir"]]
+        if self.proj_data["page_dir"] is not None:
+            pending.append(os.path.abspath(self.proj_data["page_dir"]))
+        while pending:
+            directory = pending.pop()
+            dirs, files = self._list_dir(directory)
+            pending.extend(d for d in dirs if d not in exclude_dirs)
+            paths.extend(files)
+        for parsed in self.source_cache.values():
+            paths.extend(parsed.included_files)
+
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[os.path.abspath(path)] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+        return mtimes
+
+    def _list_dir(self, directory: str) -> Tuple[List[str], List[str]]:
+        """Return the subdirectories and files in ``directory``, only
+        listing it again if it has changed since last time"""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._listings.pop(directory, None)
+            return [], []
+
+        listing = self._listings.get(directory)
+        if listing is None or listing[0] != mtime:
+            dirs, files = [], []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        (dirs if is_dir else files).append(entry.path)
+            except OSError:
+                pass
+            listing = self._listings[directory] = (mtime, dirs, files)
+        return listing[1], listing[2]
+
+    def update(self, changed: Set[str]):
+        """Rebuild the documentation after the files in ``changed``
+        have been modified, created or deleted"""
+        print(f"\nChanged: {', '.join(sorted(os.path.relpath(p) for p in changed))}")
+        if os.path.abspath(self.proj_data["project_file"]) in changed:
+            # Settings might have changed how everything gets parsed
+            try:
+                self._configure(*ford.initialize())
+            except (Exception, SystemExit) as e:
+                print(f"Error reading project file: {e}")
+                return
+            self.source_cache.clear()
+        else:
+            for filename, parsed in list(self.source_cache.items()):
+                dependencies = {filename, *parsed.included_files}
+                if {os.path.abspath(path) for path in dependencies} & changed:
+                    del self.source_cache[filename]
+        self.build()
+
+
+class ReloadingRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the output directory of ``watcher``, adding a script to
+    HTML pages which reloads them when a new build has finished"""
+
+    def __init__(self, *args, watcher: Watcher, **kwargs):
+        self.watcher = watcher
+        super().__init__(*args, directory=str(watcher.output_dir), **kwargs)
+
+    def do_GET(self):
+        if self.path.split("?")[0] == RELOAD_PATH:
+            self._send(str(self.watcher.build_number).encode(), "text/plain")
+            return
+
+        path = self.translate_path(self.path)
+        if self.path.endswith("/"):
+            path = os.path.join(path, "index.html")
+        if not (path.endswith(".html") and os.path.isfile(path)):
+            super().do_GET()
+            return
+
+        with open(path, "rb") as f:
+            html = f.read()
+        html = html.replace(b"</body>", RELOAD_SCRIPT.encode() + b"</body>", 1)
+        self._send(html, "text/html; charset=utf-8")
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(watcher: Watcher, port: int) -> http.server.ThreadingHTTPServer:
+    """Start serving the documentation on ``localhost:port`` in a
+    background thread"""
+    server = http.server.ThreadingHTTPServer(
+        ("localhost", port), partial(ReloadingRequestHandler, watcher=watcher)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def watch(proj_data: dict, proj_docs: str, md, interval: float = 1.0):
+    """Build the documentation, serve it, and rebuild it whenever the
+    project file, source files or pages change, until interrupted"""
+    watcher = Watcher(proj_data, proj_docs, md)
+    mtimes = watcher.watched_files()
+    watcher.build()
+
+    port = int(proj_data["watch_port"])
+    server = serve(watcher, port)
+    print(
+        f"\nServing documentation at http://localhost:{server.server_port}/index.html"
+        "\nWatching for changes, press Ctrl+C to stop"
+    )
+
+    try:
+        while True:
+            time.sleep(interval)
+            current = watcher.watched_files()
+            changed = {
+                path
+                for path in current.keys() | mtimes.keys()
+                if current.get(path) != mtimes.get(path)
+            }
+            if not changed:
+                continue
+            watcher.update(changed)
+            # Anything that changed during the build still has its old
+            # time here, so will get picked up on the next pass
+            mtimes = {**watcher.watched_files(), **current}
+    except KeyboardInterrupt:
+        print("\nStopping")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,28 @@
+import os
+
+from ford.cache import DiskCache, hash_key
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path, "test", max_size=250)
+    keys = [hash_key(i) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, b"x" * 100)
+        # Make sure the entries have distinct, increasing times
+        os.utime(cache._path(key), (i, i))
+
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get(keys[0]) == b"x" * 100
+    cache.prune()
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_prune_without_max_size(tmp_path):
+    cache = DiskCache(tmp_path, "test")
+    key = hash_key("a")
+    cache.put(key, b"x" * 1000)
+    cache.prune()
+    assert cache.get(key) == b"x" * 1000
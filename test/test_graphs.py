@@ -1,5 +1,6 @@
 from ford.fortran_project import Project
 from ford import DEFAULT_SETTINGS
+import ford.graphs
 from ford.graphs import graphviz_installed, GraphManager
 
 from copy import deepcopy
@@ -389,3 +390,310 @@ def test_graphs_as_table(tmp_path):
     assert node_names == expected_node_names
     assert num_arrows == len(expected_node_names)
     assert num_ws == len(expected_node_names)
+
+
+@pytest.mark.skipif(not graphviz_installed, reason="Requires graphviz")
+def test_render_svgs_batches(monkeypatch):
+    """Graphs in a batch should be rendered by one call to dot, and
+    each get their own SVG back"""
+    monkeypatch.setattr(ford.graphs, "GRAPHS_PER_BATCH", 2)
+    pipe = ford.graphs.graphviz.pipe
+    calls = []
+
+    def counting_pipe(*args, **kwargs):
+        calls.append(args)
+        return pipe(*args, **kwargs)
+
+    monkeypatch.setattr(ford.graphs.graphviz, "pipe", counting_pipe)
+
+    sources = [f'digraph "g{i}" {{ "node{i}" }}' for i in range(5)]
+    svgs = ford.graphs.render_svgs(sources, njobs=2)
+
+    assert len(calls) == 3
+    assert len(svgs) == 5
+    for i, svg in enumerate(svgs):
+        assert svg.count("<svg") == 1
+        assert f"node{i}" in svg
+
+
+@pytest.mark.skipif(not graphviz_installed, reason="Requires graphviz")
+def test_graph_cache(tmp_path, monkeypatch):
+    """Rendering the same graphs again should reuse the cached SVGs"""
+    data = """\
+    program foo
+      call bar
+    contains
+      subroutine bar
+      end subroutine bar
+    end program foo
+    """
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "test.f90").write_text(dedent(data))
+
+    settings = deepcopy(DEFAULT_SETTINGS)
+    settings["src_dir"] = [src_dir]
+    settings["graph"] = True
+
+    def make_graphs():
+        project = create_project(settings)
+        graphs = GraphManager(
+            "",
+            "",
+            graphdir="",
+            parentdir="..",
+            coloured_edges=True,
+            show_proc_parent=True,
+            cache_dir=tmp_path / "cache",
+        )
+        for item in project.procedures + project.programs:
+            graphs.register(item)
+        graphs.graph_all()
+        return graphs
+
+    first = make_graphs()
+    assert list((tmp_path / "cache" / "graphs").glob("*/*"))
+
+    def fail_render(sources, njobs=0):
+        assert not sources, "Graphs should have come from the cache"
+        return []
+
+    monkeypatch.setattr(ford.graphs, "render_svgs", fail_render)
+    second = make_graphs()
+
+    assert str(second.callgraph) == str(first.callgraph)
+
+
+@pytest.mark.skipif(not graphviz_installed, reason="Requires graphviz")
+def test_graphs_not_shown_are_not_rendered(tmp_path, monkeypatch):
+    data = """\
+    module foo
+    contains
+      subroutine lonely
+      end subroutine lonely
+    end module foo
+    """
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "test.f90").write_text(dedent(data))
+
+    settings = deepcopy(DEFAULT_SETTINGS)
+    settings["src_dir"] = [src_dir]
+    settings["graph"] = True
+    project = create_project(settings)
+
+    rendered = []
+
+    def record_render(sources, njobs=0):
+        rendered.extend(sources)
+        return ["<svg></svg>"] * len(sources)
+
+    monkeypatch.setattr(ford.graphs, "render_svgs", record_render)
+
+    graphs = GraphManager(
+        "", "", graphdir="", parentdir="..", coloured_edges=True, show_proc_parent=True
+    )
+    for item in project.procedures:
+        graphs.register(item)
+    graphs.graph_all()
+
+    (lonely,) = graphs.procedures
+    assert str(lonely.callsgraph) == ""
+    assert rendered == []
+    assert lonely.callsgraph._svg_src is None
+
+
+def test_graphs_built_in_workers(tmp_path):
+    """Building graphs in worker processes should give the same graphs,
+    made of this process's nodes"""
+    data = """\
+    module a
+      type :: base
+      end type base
+    end module a
+
+    module b
+      use a
+      type, extends(base) :: derived
+        type(base) :: component
+      end type derived
+    contains
+      subroutine one
+        call two
+      end subroutine one
+      subroutine two
+      end subroutine two
+    end module b
+
+    program foo
+      use b
+      call one
+    end program foo
+    """
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "test.f90").write_text(dedent(data))
+
+    settings = deepcopy(DEFAULT_SETTINGS)
+    settings["src_dir"] = [src_dir]
+    settings["graph"] = True
+
+    project = create_project(settings)
+
+    def make_graphs(njobs):
+        graphs = GraphManager(
+            "",
+            "",
+            graphdir="",
+            parentdir="..",
+            coloured_edges=True,
+            show_proc_parent=True,
+        )
+        for entity_list in [
+            project.types,
+            project.procedures,
+            project.modules,
+            project.programs,
+            project.files,
+        ]:
+            for item in entity_list:
+                graphs.register(item)
+        graphs.graph_all(njobs)
+        return graphs
+
+    serial = make_graphs(0)
+    serial_graphs = list(serial._entity_graphs())
+    parallel = make_graphs(2)
+    parallel_graphs = list(parallel._entity_graphs())
+    assert [graph.ident for graph in parallel_graphs] == [
+        graph.ident for graph in serial_graphs
+    ]
+
+    nodes = {
+        node.ident: node
+        for node in [
+            *parallel.data.modules.values(),
+            *parallel.data.types.values(),
+            *parallel.data.procedures.values(),
+            *parallel.data.programs.values(),
+            *parallel.data.sourcefiles.values(),
+        ]
+    }
+    for serial_graph, parallel_graph in zip(serial_graphs, parallel_graphs):
+        assert parallel_graph.dot.source == serial_graph.dot.source
+        assert parallel_graph.added == serial_graph.added
+        assert all(nodes[node.ident] is node for node in parallel_graph.added)
+    assert parallel.callgraph.dot.source == serial.callgraph.dot.source
+
+
+def test_graph_data_adjacency(tmp_path):
+    data = """\
+    module a
+      type :: base
+      end type base
+      type, extends(base) :: derived
+        type(base) :: first
+        type(base) :: second
+      end type derived
+    contains
+      subroutine zeta
+      end subroutine zeta
+      subroutine alpha
+      end subroutine alpha
+      subroutine caller
+        call zeta
+        call alpha
+      end subroutine caller
+    end module a
+    """
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "test.f90").write_text(dedent(data))
+
+    settings = deepcopy(DEFAULT_SETTINGS)
+    settings["src_dir"] = [src_dir]
+    settings["graph"] = True
+    project = create_project(settings)
+
+    graph_data = ford.graphs.GraphData("..", False, False)
+    for item in project.types + project.procedures:
+        graph_data.register(item)
+    graph_data.build_adjacency()
+
+    types = {node.name: node for node in graph_data.types.values()}
+    procedures = {node.name: node for node in graph_data.procedures.values()}
+
+    def names(nodes):
+        return [node.name for node in nodes]
+
+    # Multiple components of the same type make a single labelled edge
+    derived_components = graph_data.labelled_neighbours(types["derived"], "comp_types")
+    assert [(node.name, label) for node, label in derived_components] == [
+        ("base", "first, second")
+    ]
+    base_component_of = graph_data.labelled_neighbours(types["base"], "comp_of")
+    assert [(node.name, label) for node, label in base_component_of] == [
+        ("derived", "first, second")
+    ]
+    assert names(graph_data.neighbours(types["derived"], "ancestor")) == ["base"]
+    assert names(graph_data.neighbours(types["base"], "children")) == ["derived"]
+    assert graph_data.neighbours(types["base"], "ancestor") == []
+
+    # Neighbours are sorted
+    assert names(graph_data.neighbours(procedures["caller"], "calls")) == [
+        "alpha",
+        "zeta",
+    ]
+    assert names(graph_data.neighbours(procedures["zeta"], "called_by")) == ["caller"]
+
+
+def test_graph_data_node_added_after_adjacency(tmp_path):
+    """Making a graph for a new node after the adjacency lists have
+    been built should still work"""
+    data = """\
+    module a
+    contains
+      subroutine one
+        call two
+      end subroutine one
+      subroutine two
+      end subroutine two
+      subroutine three
+      end subroutine three
+    end module a
+    """
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "test.f90").write_text(dedent(data))
+
+    settings = deepcopy(DEFAULT_SETTINGS)
+    settings["src_dir"] = [src_dir]
+    settings["graph"] = True
+    project = create_project(settings)
+    procedures = {proc.name: proc for proc in project.procedures}
+
+    graph_data = ford.graphs.GraphData("..", False, False)
+    graph_data.register(procedures["one"])
+    calls_one = ford.graphs.CallsGraph(procedures["one"], graph_data)
+    assert sorted(node.name for node in calls_one.added) == ["one", "two"]
+
+    calls_three = ford.graphs.CallsGraph(procedures["three"], graph_data)
+    assert [node.name for node in calls_three.added] == ["three"]
+
+
+def test_graph_data_same_name_different_kinds():
+    """Nodes made from names alone of different kinds, but with the
+    same name, should be kept apart"""
+    graph_data = ford.graphs.GraphData("..", False, False)
+    user = graph_data.get_module_node("user")
+    caller = graph_data.get_procedure_node("caller", {})
+    module = graph_data.get_module_node("foo")
+    procedure = graph_data.get_procedure_node("foo", {})
+    assert module.number != procedure.number
+
+    graph_data.add_edge("uses", user, module)
+    graph_data.add_edge("calls", caller, procedure)
+    assert graph_data.neighbours(user, "uses") == [module]
+    assert graph_data.neighbours(caller, "calls") == [procedure]
+    assert isinstance(graph_data.neighbours(user, "uses")[0], ford.graphs.ModNode)
+    assert isinstance(graph_data.neighbours(caller, "calls")[0], ford.graphs.ProcNode)
@@ -0,0 +1,32 @@
+from ford.highlighting import CachedHighlighter, HighlightJob, highlight_fortran
+
+import ford.highlighting
+
+
+def test_highlight_fortran():
+    code = "program foo\nend program foo\n"
+    snippet = highlight_fortran(HighlightJob(code))
+    assert 'class="highlight"' in snippet
+    assert "ln-1" not in snippet
+
+    whole_file = highlight_fortran(HighlightJob(code, whole_file=True))
+    assert 'class="hl"' in whole_file
+    assert "ln-1" in whole_file
+
+
+def test_cached_highlighter(tmp_path, monkeypatch):
+    jobs = [HighlightJob("program foo\nend\n"), HighlightJob("x = 1\n", fixed=True)]
+    first = CachedHighlighter(tmp_path)
+    first.highlight_all(jobs + jobs, njobs=1)
+    results = [first.get(job) for job in jobs]
+    assert results == [highlight_fortran(job) for job in jobs]
+
+    def fail(job):
+        raise AssertionError(f"Highlighted {job}")
+
+    monkeypatch.setattr(ford.highlighting, "highlight_fortran", fail)
+    assert [first.highlight(job) for job in jobs] == results
+
+    second = CachedHighlighter(tmp_path)
+    second.highlight_all(jobs, njobs=1)
+    assert [second.get(job) for job in jobs] == results
@@ -0,0 +1,127 @@
+import os
+import sys
+from textwrap import dedent
+
+import ford
+
+import pytest
+
+
+PROJECT_FILE = """\
+    project: Incremental
+    src_dir: ./src
+    output_dir: ./doc
+    incremental: true
+    """
+
+MODULE_A = """\
+    module mod_a
+      !! {doc}
+    contains
+      subroutine sub_a()
+      end subroutine sub_a
+    end module mod_a
+    """
+
+MODULE_B = """\
+    module mod_b
+      use mod_a
+    contains
+      subroutine sub_b()
+        call sub_a()
+      end subroutine sub_b
+    end module mod_b
+    """
+
+MODULE_C = """\
+    module mod_c
+    contains
+      subroutine sub_c()
+      end subroutine sub_c
+    end module mod_c
+    """
+
+
+@pytest.fixture
+def incremental_project(tmp_path, monkeypatch, restore_macros, restore_nameselector):
+    src = tmp_path / "src"
+    src.mkdir()
+    (tmp_path / "doc.md").write_text(dedent(PROJECT_FILE))
+    (src / "mod_a.f90").write_text(dedent(MODULE_A.format(doc="First version")))
+    (src / "mod_b.f90").write_text(dedent(MODULE_B))
+    (src / "mod_c.f90").write_text(dedent(MODULE_C))
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["ford", "--quiet", "doc.md"])
+
+    def run_ford():
+        ford.sourceform.namelist = ford.sourceform.NameSelector()
+        ford.run()
+
+    return tmp_path, run_ford
+
+
+def _mark_old(*paths):
+    for path in paths:
+        os.utime(path, ns=(0, 0))
+
+
+def test_incremental_build(incremental_project):
+    path, run_ford = incremental_project
+    doc = path / "doc"
+    run_ford()
+
+    pages = {
+        "a": doc / "module/mod_a.html",
+        "b": doc / "module/mod_b.html",
+        "c": doc / "module/mod_c.html",
+        "sub_c": doc / "proc/sub_c.html",
+    }
+    assert all(page.exists() for page in pages.values())
+    assert (doc / ford.output.MANIFEST_FILE).exists()
+
+    # Nothing changed, so nothing should be rewritten
+    _mark_old(*pages.values())
+    run_ford()
+    assert all(page.stat().st_mtime_ns == 0 for page in pages.values())
+
+    # Only change the documentation of one module: pages for it and
+    # anything referring to it get rewritten, others are left alone
+    (path / "src/mod_a.f90").write_text(dedent(MODULE_A.format(doc="Second version")))
+    run_ford()
+    assert "Second version" in pages["a"].read_text()
+    assert pages["b"].stat().st_mtime_ns != 0
+    assert pages["c"].stat().st_mtime_ns == 0
+    assert pages["sub_c"].stat().st_mtime_ns == 0
+
+    # The search index should still cover every page
+    search = (doc / "tipuesearch/tipuesearch_content.js").read_text()
+    assert "Second version" in search
+    assert "sub_c" in search
+
+    # Removing a file removes its pages
+    (path / "src/mod_c.f90").unlink()
+    run_ford()
+    assert not pages["c"].exists()
+    assert not pages["sub_c"].exists()
+    assert pages["a"].exists()
+
+
+def test_incremental_build_included_markdown(incremental_project):
+    """Pages whose docstrings include a Markdown file are rewritten
+    when only the included file changes"""
+    path, run_ford = incremental_project
+    doc = path / "doc"
+    (path / "included.md").write_text("First included version")
+    (path / "src/mod_a.f90").write_text(dedent(MODULE_A.format(doc="{!included.md!}")))
+    run_ford()
+
+    page_a = doc / "module/mod_a.html"
+    page_c = doc / "module/mod_c.html"
+    assert "First included version" in page_a.read_text()
+
+    _mark_old(page_a, page_c)
+    (path / "included.md").write_text("Second included version")
+    run_ford()
+    assert "Second included version" in page_a.read_text()
+    assert page_c.stat().st_mtime_ns == 0
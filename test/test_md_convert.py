@@ -0,0 +1,100 @@
+from ford.md_convert import CachedMarkdown, Markdown
+
+import markdown
+
+
+class CountingMarkdown(Markdown):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.conversions = 0
+
+    def convert(self, source):
+        self.conversions += 1
+        return super().convert(source)
+
+
+def make_markdown():
+    return CountingMarkdown(
+        extensions=["markdown.extensions.meta", "markdown.extensions.extra"],
+        output_format="html",
+    )
+
+
+def test_cached_markdown():
+    md = make_markdown()
+    cached = CachedMarkdown(md)
+
+    text = "summary: Something\n\nSome *text*"
+    html = cached.reset().convert(text)
+    assert html == "<p>Some <em>text</em></p>"
+    assert cached.Meta == {"summary": ["Something"]}
+
+    # Changes to the metadata don't leak into the cache
+    cached.Meta["summary"] = "Changed"
+    assert cached.reset().convert(text) == html
+    assert cached.Meta == {"summary": ["Something"]}
+    assert md.conversions == 1
+
+    cached.reset().convert("Other text")
+    assert md.conversions == 2
+
+
+def test_cached_markdown_without_reset():
+    md = make_markdown()
+    cached = CachedMarkdown(md)
+
+    cached.convert("Some text")
+    cached.convert("Some text")
+    assert md.conversions == 2
+
+
+def test_cached_markdown_after_previous_text():
+    """Conversions following another since a reset are cached along
+    with it, and can still use its references"""
+    md = make_markdown()
+    cached = CachedMarkdown(md)
+    doc = "Some text\n\n[ref]: https://example.com"
+    link = '<p><a href="https://example.com">link</a></p>'
+
+    cached.reset().convert(doc)
+    assert cached.convert("[link][ref]") == link
+    assert md.conversions == 2
+
+    # Both come from the cache
+    cached.reset().convert(doc)
+    assert cached.convert("[link][ref]") == link
+    assert md.conversions == 2
+
+    # The converter has to catch up with the cached docstring first
+    cached.reset().convert(doc)
+    assert cached.convert("Another [link][ref]") == (
+        '<p>Another <a href="https://example.com">link</a></p>'
+    )
+    assert md.conversions == 4
+
+    # Without the docstring, the reference isn't defined
+    assert cached.reset().convert("[link][ref]") == "<p>[link][ref]</p>"
+
+
+def test_cached_markdown_on_disk(tmp_path):
+    text = "author: Someone\n\nSome *text*"
+    first = CachedMarkdown(make_markdown(), tmp_path)
+    html = first.reset().convert(text)
+    first.reset().convert("Some ${HOME}")
+
+    md = make_markdown()
+    second = CachedMarkdown(md, tmp_path)
+    assert second.reset().convert(text) == html
+    assert second.Meta == {"author": ["Someone"]}
+    assert md.conversions == 0
+
+    # Might depend on the environment, so not kept between runs
+    second.reset().convert("Some ${HOME}")
+    assert md.conversions == 1
+
+
+def test_cached_markdown_needs_known_config(tmp_path):
+    cached = CachedMarkdown(markdown.Markdown(), tmp_path)
+    cached.reset().convert("Some text")
+    assert cached.disk_cache is None
+    assert not list(tmp_path.iterdir())
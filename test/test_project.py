@@ -1,7 +1,13 @@
+import ford.fortran_project
+import ford.md_convert
+import ford.reader
+import ford.sourceform
+import ford.utils
 from ford.fortran_project import Project
 from ford import DEFAULT_SETTINGS
 from ford.utils import normalise_path
 
+import shutil
 from copy import deepcopy
 from itertools import chain
 
@@ -1014,3 +1020,341 @@ def test_submodule_procedure_issue_446(copy_fortran_file):
     submodproc = module.descendants[0].modprocedures[0]
 
     assert interface.procedure.module == submodproc
+
+
+def test_parallel_parsing(tmp_path):
+    """Check that parsing in parallel gives the same project as parsing serially"""
+
+    src = tmp_path / "src"
+    src.mkdir()
+    for i in range(4):
+        with open(src / f"mod{i}.f90", "w") as f:
+            f.write(
+                f"module mod{i}\ncontains\nsubroutine sub{i}\nend subroutine\nend module"
+            )
+
+    settings = deepcopy(DEFAULT_SETTINGS)
+    settings["src_dir"] = [src]
+    settings["parallel"] = 1
+    serial_project = Project(settings)
+    settings["parallel"] = 2
+    parallel_project = Project(settings)
+
+    serial_files = [f.path for f in serial_project.files]
+    parallel_files = [f.path for f in parallel_project.files]
+    assert parallel_files == serial_files
+    assert [m.name for m in parallel_project.modules] == [
+        m.name for m in serial_project.modules
+    ]
+    # Entities should share the project settings, not get a copy each
+    assert parallel_project.modules[0].settings is settings
+    assert parallel_project.modules[0].subroutines[0].settings is settings
+
+
+def test_parse_cache(tmp_path, monkeypatch):
+    """Check that unchanged files are loaded from the parse cache, and
+    that changing a file or something it includes invalidates it"""
+
+    src = tmp_path / "src"
+    src.mkdir()
+    with open(src / "mod.f90", "w") as f:
+        f.write("module mod\ninclude 'sub.inc'\nend module")
+    with open(src / "sub.inc", "w") as f:
+        f.write("contains\nsubroutine sub1\nend subroutine")
+
+    settings = deepcopy(DEFAULT_SETTINGS)
+    settings["src_dir"] = [src]
+    settings["cache_dir"] = tmp_path / "cache"
+    first_project = Project(settings)
+    assert first_project.files[0].included_files == [str(src / "sub.inc")]
+
+    # The second time around, we shouldn't parse anything
+    parsed_files = []
+    original_read_fortran_file = ford.fortran_project._read_fortran_file
+
+    def read_fortran_file(args):
+        parsed_files.append(args[0])
+        return original_read_fortran_file(args)
+
+    monkeypatch.setattr(ford.fortran_project, "_read_fortran_file", read_fortran_file)
+
+    cached_project = Project(settings)
+    assert parsed_files == []
+    assert cached_project.modules[0].name == "mod"
+    assert cached_project.modules[0].subroutines[0].name == "sub1"
+    assert cached_project.modules[0].settings is settings
+
+    with open(src / "sub.inc", "w") as f:
+        f.write("contains\nsubroutine sub2\nend subroutine")
+
+    changed_project = Project(settings)
+    assert parsed_files == [str(src / "mod.f90")]
+    assert changed_project.modules[0].subroutines[0].name == "sub2"
+
+    # Changing a parse-relevant setting should also invalidate the cache
+    parsed_files.clear()
+    settings["lower"] = True
+    Project(settings)
+    assert parsed_files == [str(src / "mod.f90")]
+
+
+def test_preprocess_cache(tmp_path, monkeypatch):
+    """Check that preprocessor output is cached, and that changing a
+    header it includes invalidates it"""
+
+    src = tmp_path / "src"
+    src.mkdir()
+    with open(src / "mod.F90", "w") as f:
+        f.write('#include "name.h"\nmodule MOD_NAME\nend module')
+    with open(src / "name.h", "w") as f:
+        f.write("#define MOD_NAME first\n")
+
+    settings = deepcopy(DEFAULT_SETTINGS)
+    settings["src_dir"] = [src]
+    settings["cache_dir"] = tmp_path / "cache"
+    settings["extensions"] = ["F90"]
+    settings["preprocessor"] = ["cpp", "-traditional-cpp", "-E"]
+
+    preprocessed_files = []
+    original_preprocess = ford.reader.preprocess
+
+    def preprocess(filename, *args):
+        preprocessed_files.append(filename)
+        return original_preprocess(filename, *args)
+
+    monkeypatch.setattr(ford.reader, "preprocess", preprocess)
+
+    assert Project(settings).modules[0].name == "first"
+    assert preprocessed_files == [str(src / "mod.F90")]
+
+    # Without a parse cache entry, the file is parsed again, but the
+    # preprocessor output comes from the cache
+    preprocessed_files.clear()
+    shutil.rmtree(tmp_path / "cache" / "parse")
+    assert Project(settings).modules[0].name == "first"
+    assert preprocessed_files == []
+
+    with open(src / "name.h", "w") as f:
+        f.write("#define MOD_NAME second\n")
+    shutil.rmtree(tmp_path / "cache" / "parse")
+    assert Project(settings).modules[0].name == "second"
+    assert preprocessed_files == [str(src / "mod.F90")]
+
+
+def test_duplicate_module_names(copy_fortran_file, capsys):
+    data = """\
+    module Dup
+    end module Dup
+
+    module dup
+    end module dup
+
+    program prog
+      use DUP
+    end program prog
+    """
+
+    settings = copy_fortran_file(data)
+    settings["warn"] = True
+    project = create_project(settings)
+
+    assert "Found multiple modules named 'dup'" in capsys.readouterr().out
+    used_module = list(project.programs[0].uses)[0]
+    assert used_module is project.modules[0]
+
+
+def test_sub_links(copy_fortran_file):
+    data = """\
+    module linked_mod
+      type :: linked_type
+        integer :: component
+      end type linked_type
+    contains
+      subroutine linked_sub
+      end subroutine linked_sub
+    end module linked_mod
+    """
+
+    settings = copy_fortran_file(data)
+    project = create_project(settings)
+    project.make_links()
+
+    def link(text):
+        return BeautifulSoup(ford.utils.sub_links(text, project), "html.parser").a
+
+    module_link = link("[[Linked_Mod]]")
+    assert module_link.text == "linked_mod"
+    assert module_link["href"].endswith("module/linked_mod.html")
+
+    assert link("[[linked_sub(proc)]]")["href"].endswith("proc/linked_sub.html")
+    assert link("[[linked_sub(module)]]").get("href") is None
+
+    component_link = link("[[linked_type:component(variable)]]")
+    assert component_link.text == "component"
+    assert component_link["href"].endswith("type/linked_type.html#variable-component")
+
+    # Unknown children fall back to the parent's page
+    missing_child = link("[[linked_type:missing]]")
+    assert missing_child["href"].endswith("type/linked_type.html")
+
+    assert link("[[missing]]").get("href") is None
+    assert ford.utils.sub_links("[[linked_mod(nonsense)]]", project) == (
+        "[[linked_mod(nonsense)]]"
+    )
+
+
+def test_call_resolution(copy_fortran_file):
+    data = """\
+    subroutine external_sub
+    end subroutine external_sub
+
+    subroutine shadowed
+    end subroutine shadowed
+
+    module caller_mod
+    contains
+      subroutine shadowed
+      end subroutine shadowed
+
+      subroutine caller
+        call external_sub
+        call shadowed
+        call unknown_sub
+      end subroutine caller
+    end module caller_mod
+    """
+
+    settings = copy_fortran_file(data)
+    project = create_project(settings)
+
+    module = project.modules[0]
+    external_sub, top_level_shadowed = project.files[0].subroutines
+    module_shadowed, caller = module.subroutines
+    assert caller.calls[0] is external_sub
+    assert caller.calls[1] is module_shadowed
+    assert caller.calls[1] is not top_level_shadowed
+    assert caller.calls[2] == "unknown_sub"
+
+
+def test_scope_chaining(copy_fortran_file):
+    data = """\
+    module mod_a
+      type :: thing
+      end type thing
+      integer :: value
+    end module mod_a
+
+    module mod_b
+      type :: thing
+      end type thing
+    end module mod_b
+
+    module user_mod
+      use mod_a
+      use mod_b
+    contains
+      subroutine first
+        type :: local_t
+        end type local_t
+      end subroutine first
+
+      subroutine second
+      end subroutine second
+    end module user_mod
+    """
+
+    settings = copy_fortran_file(data)
+    project = create_project(settings)
+
+    mod_a, mod_b, user_mod = project.modules
+    first, second = user_mod.subroutines
+
+    # The last USE statement takes precedence
+    assert user_mod.all_types["thing"] is mod_b.types[0]
+    assert user_mod.all_vars["value"] is mod_a.variables[0]
+    assert second.all_types["thing"] is mod_b.types[0]
+    # Names local to a procedure aren't visible to its host or siblings
+    assert "local_t" in first.all_types
+    assert "local_t" not in user_mod.all_types
+    assert "local_t" not in second.all_types
+    # Nothing leaks back into the USEd modules
+    assert "value" not in mod_b.all_vars
+
+
+def test_parallel_markdown(copy_fortran_file):
+    data = """\
+    module foo
+      !! author: Someone
+      !! summary: A module
+      !!
+      !! Some *documentation*
+      integer :: x
+      !! The same documentation
+      integer :: y
+      !! The same documentation
+    contains
+      subroutine sub(a)
+        !! A subroutine with a [footnote][^1]
+        !!
+        !! [^1]: The footnote
+        integer, intent(in) :: a
+        !! Argument
+      end subroutine sub
+    end module foo
+    """
+
+    settings = copy_fortran_file(data)
+
+    def convert(parallel):
+        md = ford.md_convert.Markdown(
+            extensions=[
+                "markdown.extensions.meta",
+                "markdown.extensions.codehilite",
+                "markdown.extensions.extra",
+            ],
+            output_format="html5",
+            extension_configs={},
+        )
+        ford.sourceform.namelist = ford.sourceform.NameSelector()
+        project = Project(dict(settings, parallel=parallel))
+        project.markdown(md, "..")
+        module = project.modules[0]
+        return [
+            (entity.doc, entity.meta)
+            for entity in (module, *module.variables, *module.subroutines)
+            + tuple(module.subroutines[0].args)
+        ]
+
+    serial = convert(1)
+    assert "<em>documentation</em>" in serial[0][0]
+    assert serial[0][1]["author"] == "Someone"
+    assert convert(2) == serial
+
+
+def test_summary_uses_docstring_references(copy_fortran_file):
+    """Reference-style links defined in the docstring can be used in
+    the summary, even when the docstring's conversion is cached"""
+    data = """\
+    module foo
+    contains
+      subroutine one
+        !! summary: See [the docs][docs]
+        !!
+        !! [docs]: https://example.com/docs
+      end subroutine one
+      subroutine two
+        !! summary: See [the docs][docs]
+        !!
+        !! [docs]: https://example.com/docs
+      end subroutine two
+    end module foo
+    """
+
+    settings = copy_fortran_file(data)
+    project = create_project(settings)
+
+    for subroutine in project.modules[0].subroutines:
+        assert (
+            '<a href="https://example.com/docs">the docs</a>'
+            in subroutine.meta["summary"]
+        )
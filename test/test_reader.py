@@ -6,10 +6,13 @@ Created on Tue Mar 17 20:21:05 2020
 """
 
 import glob
+import os
 import re
+import textwrap
 
 import ford.reader as reader
-from ford.reader import _contains_unterminated_string
+from ford.fixed2free2 import convertToFree
+from ford.reader import _comment_start, _contains_unterminated_string
 import pytest
 
 from conftest import gfortran_is_not_installed
@@ -122,6 +125,124 @@ def test_unknown_include(copy_fortran_file):
     assert lines == expected
 
 
+def test_nested_includes(tmp_path):
+    """Check included files are spliced in the right place, including
+    any they include themselves"""
+
+    (tmp_path / "outer.inc").write_text(
+        "integer :: a\ninclude 'inner.inc'\ninteger :: b\n"
+    )
+    (tmp_path / "inner.inc").write_text("!! Documentation\ninteger :: c\n")
+    (tmp_path / "empty.inc").write_text("")
+    filename = tmp_path / "test.f90"
+    filename.write_text(
+        "program test\n"
+        "include 'outer.inc'; integer :: d\n"
+        "include 'empty.inc'\n"
+        "end program test\n"
+    )
+
+    source = reader.FortranReader(str(filename), docmark="!")
+    assert next(source) == "program test"
+    assert next(source) == "integer :: a"
+    source.pass_back("integer :: a")
+    assert list(source) == [
+        "integer :: a",
+        "!! Documentation",
+        "integer :: c",
+        "integer :: b",
+        "integer :: d",
+        "end program test",
+    ]
+    assert source.included_files == {
+        str(tmp_path / name) for name in ["outer.inc", "inner.inc", "empty.inc"]
+    }
+
+
+def test_include_cache(tmp_path):
+    """Check included files are shared between readers using the same
+    cache, and read again if they change"""
+
+    header = tmp_path / "header.inc"
+    header.write_text("integer :: a\n")
+    for name in ["one.f90", "two.f90"]:
+        (tmp_path / name).write_text(f"program {name[:3]}\ninclude 'header.inc'\nend\n")
+
+    cache = reader.IncludeCache()
+    one = list(reader.FortranReader(str(tmp_path / "one.f90"), include_cache=cache))
+    assert one == ["program one", "integer :: a", "end"]
+
+    # Replace the include file's reader so we can see if it's used
+    cache.find("header.inc", [str(tmp_path)])
+    original_reader = reader.FortranReader
+    opened = []
+
+    class RecordingReader(original_reader):
+        def __init__(self, filename, *args, **kwargs):
+            opened.append(filename)
+            super().__init__(filename, *args, **kwargs)
+
+    reader.FortranReader = RecordingReader
+    try:
+        two = reader.FortranReader(str(tmp_path / "two.f90"), include_cache=cache)
+        assert list(two) == ["program two", "integer :: a", "end"]
+        assert opened == [str(tmp_path / "two.f90")]
+        assert two.included_files == {str(header)}
+
+        header.write_text("integer :: b\n")
+        os.utime(header, ns=(0, 0))
+        two = reader.FortranReader(str(tmp_path / "two.f90"), include_cache=cache)
+        assert list(two) == ["program two", "integer :: b", "end"]
+        assert opened[-1] == str(header)
+    finally:
+        reader.FortranReader = original_reader
+
+
+def test_statement_span(tmp_path):
+    """Check where each statement was read from is recorded, following
+    any preprocessor line markers"""
+
+    filename = tmp_path / "test.F90"
+    filename.write_text(textwrap.dedent(f"""\
+            # 1 "{filename}"
+            program foo
+            # 1 "other.h" 1
+            integer :: x
+            # 3 "{filename}" 2
+              call bar(1, &
+                       2) ! comment
+
+            end program foo
+            """))
+    source = reader.FortranReader(str(filename))
+    spans = {line: source.statement_span for line in source}
+    assert spans == {
+        "program foo": (str(filename), 1, 1),
+        "integer :: x": ("other.h", 1, 1),
+        "call bar(1, 2)": (str(filename), 3, 4),
+        "end program foo": (str(filename), 6, 6),
+    }
+
+
+def test_statement_span_include(tmp_path):
+    """Check lines from included files know where they came from, even
+    when they come from the cache"""
+
+    header = tmp_path / "header.inc"
+    header.write_text("\ninteger :: a\n")
+    main = tmp_path / "main.f90"
+    main.write_text("program foo\ninclude 'header.inc'\ninclude 'header.inc'\nend\n")
+
+    source = reader.FortranReader(str(main))
+    spans = [(line, source.statement_span) for line in source]
+    assert spans == [
+        ("program foo", (str(main), 1, 1)),
+        ("integer :: a", (str(header), 2, 2)),
+        ("integer :: a", (str(header), 2, 2)),
+        ("end", (str(main), 4, 4)),
+    ]
+
+
 def test_unterminated_strings():
     """Check the utility function works"""
     assert _contains_unterminated_string(""" bad "quote """)
@@ -139,6 +260,16 @@ def test_unterminated_strings():
     assert not _contains_unterminated_string(""" good 'quote"' """)
 
 
+def test_comment_start():
+    """Check the utility function works"""
+    assert _comment_start("x = 1") == -1
+    assert _comment_start("x = 1 ! comment") == 6
+    assert _comment_start("x = '!' ! comment") == 8
+    assert _comment_start('x = "it\'s !" ! comment') == 13
+    assert _comment_start("x = 'it''s !' ! comment") == 14
+    assert _comment_start("x = 'unterminated ! string") == -1
+
+
 def test_multiline_string(copy_fortran_file):
     """Check that we can continue string literals including exclamation
     marks over multiple lines. Issue #320"""
@@ -217,3 +348,33 @@ def test_preprocessor_warning(copy_fortran_file):
         )
     )
     assert "foo" in lines
+
+
+def test_fixed_form_conversion():
+    data = """\
+C     A comment
+      PROGRAM TEST
+   10 X = 1 +
+     &    2
+!$OMP PARALLEL DO
+!$OMP&PRIVATE(I)
+* Another comment
+      Y = 'a very long string which goes beyond the end of column seventy-two'
+     1    // 'b'
+#ifdef FOO
+      END
+"""
+
+    assert list(convertToFree(data.splitlines(True))) == [
+        "!     A comment\n",
+        "PROGRAM TEST\n",
+        "10 X = 1 + &\n",
+        "    2\n",
+        "!$OMP PARALLEL DO &\n",
+        "!$OMP PRIVATE(I)\n",
+        "! Another comment\n",
+        "Y = 'a very long string which goes beyond the end of column sevent &    !y-two'\n",
+        "    // 'b'\n",
+        "#ifdef FOO\n",
+        "END\n",
+    ]
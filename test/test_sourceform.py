@@ -4,10 +4,13 @@ from ford.sourceform import (
     parse_type,
     ParsedType,
     line_to_variables,
+    mask_strings,
+    unmask_strings,
 )
 from ford import DEFAULT_SETTINGS
 
 from copy import deepcopy
+import textwrap
 from dataclasses import dataclass, field
 from typing import Union, List, Optional
 
@@ -1067,6 +1070,59 @@ def test_markdown_source_settings(parse_fortran_file):
     assert "with_source" in subroutine.src
 
 
+def test_markdown_source_span(parse_fortran_file):
+    """Check that the source shown for entities is the lines they were
+    read from"""
+
+    data = """\
+    module foo
+    contains
+      !> Some docs
+      pure subroutine with_source(a, &
+                                  b)  ! comment
+        !! more docs
+        integer, intent(in) :: a, b
+      end subroutine with_source ! last
+    end module foo
+    """
+
+    md = markdown.Markdown(extensions=["markdown.extensions.meta"])
+
+    fortran_file = parse_fortran_file(data, source=True, predocmark=">")
+    subroutine = fortran_file.modules[0].subroutines[0]
+    path = fortran_file.path
+    assert subroutine.source_span == (path, 4, 8)
+    assert fortran_file.modules[0].source_span == (path, 1, 9)
+    assert subroutine.args[0].source_span == (path, 7, 7)
+
+    subroutine.markdown(md, None)
+    source = "".join(textwrap.dedent(data).splitlines(keepends=True)[3:8])
+    assert subroutine.source_code == source
+    assert "with_source" in subroutine.src
+
+
+def test_source_file_lazy_source(copy_fortran_file):
+    """Check the source of files is only kept if it will be shown, and
+    only highlighted when asked for"""
+
+    data = """\
+    program foo
+    end program foo
+    """
+    filename = copy_fortran_file(data)
+    settings = deepcopy(DEFAULT_SETTINGS)
+
+    shown = FortranSourceFile(str(filename), settings)
+    assert shown._raw_src is not None
+    assert shown._src is None
+    assert "foo" in shown.src
+
+    hidden = FortranSourceFile(str(filename), settings, incl_src=False)
+    assert hidden._raw_src is None
+    assert hidden._src is None
+    assert hidden.raw_src == shown.raw_src
+
+
 @pytest.mark.parametrize(
     ["snippet", "expected_error", "expected_name"],
     (
@@ -1589,3 +1645,56 @@ def test_generic_bound_procedure(parse_fortran_file):
     expected_names = sorted(["no_colon", "colon", "operator(+)"])
     bound_proc_names = sorted([proc.name for proc in fortran_type.boundprocs])
     assert bound_proc_names == expected_names
+
+
+def test_mask_strings():
+    line = """print '(A,"x")', "it's", 'a''b', x"""
+    masked, strings = mask_strings(line)
+    assert masked == 'print "0", "1", "2", x'
+    assert strings == ["""'(A,"x")'""", '"it\'s"', "'a''b'"]
+    assert unmask_strings(masked, strings) == line
+    # Backslashes aren't treated as escapes
+    assert unmask_strings('"0"', ["'a\\b'"]) == "'a\\b'"
+
+
+def test_mask_strings_many_strings():
+    """Lines with lots of strings should round-trip through masking"""
+    line = ", ".join(f"'string {i}'" for i in range(5000))
+    masked, strings = mask_strings(line)
+
+    assert masked == ", ".join(f'"{i}"' for i in range(5000))
+    assert strings == [f"'string {i}'" for i in range(5000)]
+    assert unmask_strings(masked, strings) == line
+
+
+def test_statement_classifier(parse_fortran_file):
+    """Statements whose keyword isn't first, or runs into the next
+    word, should still be recognised"""
+    data = """\
+    module foo
+      doubleprecision :: a
+      mytype :: b
+      integer, parameter :: c = 1
+    contains
+      pure recursive integer function f(x) result(y)
+        integer, intent(in) :: x
+        named: block
+          call g(x)
+        end block named
+    10  format (i5)
+        y = x
+      endfunction f
+      subroutine g(x)
+        integer :: x
+      end subroutine
+    endmodule foo
+    """
+
+    fortran_file = parse_fortran_file(data, extra_vartypes=["mytype"])
+    module = fortran_file.modules[0]
+    assert [var.name for var in module.variables] == ["a", "b", "c"]
+    assert module.variables[2].parameter
+    assert [func.name for func in module.functions] == ["f"]
+    assert module.functions[0].retvar.name == "y"
+    assert module.functions[0].calls == ["g"]
+    assert [sub.name for sub in module.subroutines] == ["g"]
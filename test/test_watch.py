@@ -0,0 +1,80 @@
+import os
+import sys
+import urllib.request
+from textwrap import dedent
+
+import ford
+import ford.watch
+
+import pytest
+
+MODULE = """\
+    module mod_{name}
+      !! {doc}
+    end module mod_{name}
+    """
+
+
+@pytest.fixture
+def watcher(tmp_path, monkeypatch, restore_macros, restore_nameselector):
+    src = tmp_path / "src"
+    src.mkdir()
+    (tmp_path / "doc.md").write_text("project: Watched\nsrc_dir: ./src\n")
+    (src / "mod_a.f90").write_text(dedent(MODULE.format(name="a", doc="First a")))
+    (src / "mod_b.f90").write_text(dedent(MODULE.format(name="b", doc="First b")))
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["ford", "--quiet", "doc.md"])
+    watcher = ford.watch.Watcher(*ford.initialize())
+    watcher.build()
+    return watcher
+
+
+def test_watcher_rebuilds_changed_files(watcher, tmp_path):
+    page_a = tmp_path / "doc/module/mod_a.html"
+    assert "First a" in page_a.read_text()
+    assert watcher.build_number == 1
+    parsed_b = watcher.source_cache[str(tmp_path / "src/mod_b.f90")].data
+
+    before = watcher.watched_files()
+    mod_a = tmp_path / "src/mod_a.f90"
+    mod_a.write_text(dedent(MODULE.format(name="a", doc="Second a")))
+    os.utime(mod_a, ns=(0, 0))
+    after = watcher.watched_files()
+    changed = {path for path in after if after[path] != before.get(path)}
+    assert changed == {str(mod_a)}
+
+    watcher.update(changed)
+    assert watcher.build_number == 2
+    assert "Second a" in page_a.read_text()
+    # Unchanged files aren't parsed again
+    assert watcher.source_cache[str(tmp_path / "src/mod_b.f90")].data is parsed_b
+
+
+def test_watched_files_new_and_removed(watcher, tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir()
+    before = watcher.watched_files()
+
+    mod_c = src / "sub/mod_c.f90"
+    mod_c.write_text(dedent(MODULE.format(name="c", doc="First c")))
+    (src / "mod_b.f90").unlink()
+    after = watcher.watched_files()
+    assert str(mod_c) in after
+    assert str(src / "mod_b.f90") in before
+    assert str(src / "mod_b.f90") not in after
+
+
+def test_server_injects_reload_script(watcher):
+    server = ford.watch.serve(watcher, 0)
+    try:
+        url = f"http://localhost:{server.server_port}"
+        with urllib.request.urlopen(f"{url}/module/mod_a.html") as response:
+            assert ford.watch.RELOAD_PATH in response.read().decode()
+        with urllib.request.urlopen(f"{url}{ford.watch.RELOAD_PATH}") as response:
+            assert response.read().decode() == str(watcher.build_number)
+        with urllib.request.urlopen(f"{url}/css/pygments.css") as response:
+            assert ford.watch.RELOAD_PATH not in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()